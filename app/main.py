@@ -1,10 +1,101 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.mongodb import mongo
 from app.routers.character import router as character_router
+from app.routers.book import router as book_router
+from app.routers.health import router as health_router, storage_state
+from app.routers.admin import router as admin_router
+from app.routers.auth import router as auth_router
+from app.services.prompts.prompt_registry import prompt_registry, PROMPT_WATCH
+from app.services.character.description_cache import description_cache
+from app.services.character.schema_validator import validator_registry
+from app.services.vision.provider import init_vision_provider
+from app.services.image.preprocess import shutdown_executor
+from app.services.auth.password_hasher import password_hasher
+from app.services.book.job_store import job_store
+from app.services.repository.indexes import index_manager
+from app.services.book.pipeline import job_pool
+from app.services.observability.profiler import ProfilingMiddleware
+from app.services.observability.timing import TimingMiddleware
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-app.include_router(character_router)
\ No newline at end of file
+STORAGE_BOOTSTRAP_RETRY_SECONDS = float(os.getenv("STORAGE_BOOTSTRAP_RETRY_SECONDS", "1"))
+STORAGE_BOOTSTRAP_MAX_RETRY_SECONDS = float(os.getenv("STORAGE_BOOTSTRAP_MAX_RETRY_SECONDS", "60"))
+
+
+async def bootstrap_storage() -> None:
+    """
+    Create the declared indexes and resume book jobs in the background.
+
+    Runs after startup has completed so a slow or unreachable database never
+    delays the worker boot; ``/readyz`` reports ``starting`` until it is done.
+    A failed attempt is logged, recorded for ``/readyz`` and retried with
+    exponential backoff (``STORAGE_BOOTSTRAP_RETRY_SECONDS`` doubling up to
+    ``STORAGE_BOOTSTRAP_MAX_RETRY_SECONDS``) until it succeeds; book jobs
+    submitted meanwhile wait in the worker pool's queue.
+    """
+    delay = STORAGE_BOOTSTRAP_RETRY_SECONDS
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await asyncio.to_thread(index_manager.ensure)
+            await description_cache.ensure_indexes()
+            await job_store.ensure_indexes()
+            await job_pool.start()
+            storage_state.update(bootstrapped=True, error=None, attempts=attempt)
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            storage_state.update(error=str(e), attempts=attempt)
+            logger.exception("storage bootstrap failed (attempt %d); retrying in %.0fs", attempt, delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, STORAGE_BOOTSTRAP_MAX_RETRY_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan: compile prompt templates and the character schema
+    validator once at startup and, in dev mode (``PROMPT_WATCH=1``), watch
+    the templates and the schema for changes, reloading both together. The vision provider's capability detection
+    also runs here, once. The MongoDB client is created without waiting for
+    the server; index creation and resuming unfinished book jobs run in the
+    background (see :func:`bootstrap_storage`). On shutdown the workers are
+    stopped and the client is closed.
+    """
+    prompt_registry.compile_all()
+    validator_registry.load()
+    init_vision_provider()
+    mongo.open()
+    bootstrap = asyncio.create_task(bootstrap_storage(), name="storage-bootstrap")
+    if PROMPT_WATCH:
+        prompt_registry.start_watcher(hooks=(validator_registry.refresh,))
+    yield
+    bootstrap.cancel()
+    await asyncio.gather(bootstrap, return_exceptions=True)
+    await job_pool.stop()
+    prompt_registry.stop_watcher()
+    shutdown_executor()
+    password_hasher.shutdown()
+    await mongo.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(TimingMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+app.include_router(character_router)
+app.include_router(book_router)
+app.include_router(health_router)
+app.include_router(admin_router)
+app.include_router(auth_router, prefix="/auth")
@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Literal
+
+class BookRequest(BaseModel):
+    """
+    Pydantic schema for the book parameters of ``POST /books`` (README section 2).
+    """
+    num_pages: int
+    target_age: Literal["<1", "1", "2", "3"]
+    theme: str = Field(min_length=1, max_length=200)
+    style: str = Field(min_length=1, max_length=200)
+    guardian_consent: bool = False
+
+    @field_validator("num_pages")
+    @classmethod
+    def _num_pages_divisible_by_four(cls, value: int) -> int:
+        if value not in (4, 8, 12, 16):
+            raise ValueError("num_pages must be one of 4, 8, 12, 16")
+        return value
@@ -1,21 +1,25 @@
 
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal
 
 class CharacterCreate(BaseModel):
     """
     Pydantic schema for creating a character, matching the JSON schema.
+
+    Section contents are validated against ``character.json`` before they get
+    here (see ``app.services.character.schema_validator``); sections the
+    validator had to drop are simply absent.
     """
-    meta: Optional[Dict[str, Any]]
-    general: Optional[Dict[str, Any]]
-    head: Optional[Dict[str, Any]]
-    hair: Optional[Dict[str, Any]]
-    skin: Optional[Dict[str, Any]]
-    face: Optional[Dict[str, Any]]
-    measurements_and_proportions: Optional[Dict[str, Any]]
-    pose_and_landmarks: Optional[Dict[str, Any]]
-    clothing_and_accessories: Optional[Dict[str, Any]]
-    annotations: Optional[List[Dict[str, Any]]]
+    meta: Optional[Dict[str, Any]] = None
+    general: Optional[Dict[str, Any]] = None
+    head: Optional[Dict[str, Any]] = None
+    hair: Optional[Dict[str, Any]] = None
+    skin: Optional[Dict[str, Any]] = None
+    face: Optional[Dict[str, Any]] = None
+    measurements_and_proportions: Optional[Dict[str, Any]] = None
+    pose_and_landmarks: Optional[Dict[str, Any]] = None
+    clothing_and_accessories: Optional[Dict[str, Any]] = None
+    annotations: Optional[List[Dict[str, Any]]] = None
 
 class CharacterRead(CharacterCreate):
     """
@@ -25,3 +29,12 @@ class CharacterRead(CharacterCreate):
 
     class Config:
         orm_mode = True
+
+
+class PersonMetadata(BaseModel):
+    """
+    Per-person metadata supplied alongside a photo (see README section 2).
+    """
+    name: str
+    declared_age: int = Field(ge=0)
+    role: Literal["adult", "child"]
@@ -6,4 +6,21 @@ class User(BaseModel):
     hashed_password: str | None = None
     oauth_provider: str | None = None
     oauth_id: str | None = None
-    full_name: str | None = None
\ No newline at end of file
+    full_name: str | None = None
+
+class SignupRequest(BaseModel):
+    """What a client may set at signup; ids and OAuth identities are server-assigned."""
+    email: str
+    # The plain text password; the field keeps its historical name.
+    hashed_password: str | None = None
+    full_name: str | None = None
+
+class Credentials(BaseModel):
+    email: str
+    password: str
+
+class AuthenticatedUser(BaseModel):
+    id: str
+    email: str
+    name: str | None = None
+    expires_at: int
@@ -1,11 +1,35 @@
 """
 MongoDB connection utility for the kid_book_generator project.
+
+The client is created lazily and owned by the application lifespan
+(:meth:`MongoResource.open` / :meth:`MongoResource.close`); importing this
+module never touches the network. ``MongoClient`` itself connects in the
+background, so neither import nor startup waits for the database.
+
+The module-level ``*_collection`` names are lazy handles: they resolve the
+real ``Collection`` on first attribute access and keep working across a
+close/reopen of the client, so services can bind them at import time.
+Request handlers use the async client (``AsyncMongoClient``) through the
+repositories in :mod:`app.services.repository`; the sync client remains for
+background and startup work that already runs in threads.
+
+Pool sizing is configured through the environment (``MONGODB_MAX_POOL_SIZE``,
+``MONGODB_MIN_POOL_SIZE``, ``MONGODB_WAIT_QUEUE_TIMEOUT_MS``). Pool activity
+is tracked by a CMAP listener and reported by :meth:`MongoResource.stats`,
+which backs the ``/healthz`` and ``/readyz`` endpoints.
 """
 
-from pymongo import MongoClient, errors
-from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
+import asyncio
+import logging
 import os
+import threading
+
+from dotenv import load_dotenv
+import pymongo
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from pymongo.server_api import ServerApi
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,26 +38,260 @@ MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 MONGODB_USER = os.getenv("MONGODB_USER", "default_user")
 MONGODB_PASS = os.getenv("MONGODB_PASS", "default_pass")
 MONGODB_DB = os.getenv("MONGODB_DB", "kid_book_db")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_READY_TIMEOUT_MS = int(os.getenv("MONGODB_READY_TIMEOUT_MS", "1000"))
 
 if not MONGODB_URI:
     raise RuntimeError("MONGODB_URI is not set in the environment variables.")
 
-try:
-    client = MongoClient(
-        MONGODB_URI,
-        username=MONGODB_USER,
-        password=MONGODB_PASS,
-        server_api=ServerApi("1"),
-        connectTimeoutMS=5000,
-        serverSelectionTimeoutMS=5000
-    )
-    # Attempt to ping the server to check connection
-    client.admin.command('ping')
-    db = client[MONGODB_DB]
-    # Collections
-    characters_collection = db["characters"]
-    users_collection = db["users"]
-except errors.ServerSelectionTimeoutError as e:
-    raise RuntimeError(f"Could not connect to MongoDB: {e}")
-except Exception as e:
-    raise RuntimeError(f"MongoDB connection error: {e}")
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters fed by PyMongo's CMAP events.
+
+    ``in_use`` is the number of checked-out connections, ``waiting`` the
+    number of operations currently waiting for one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {
+                "open": 0,
+                "in_use": 0,
+                "waiting": 0,
+                "created": 0,
+                "closed": 0,
+                "checkout_failures": 0,
+                "pool_clears": 0,
+            }
+
+    def _add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(pool_clears=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._add(in_use=-1)
+
+
+class MongoResource:
+    """Lazily created, lifespan-managed ``MongoClient``.
+
+    Args:
+        uri: Connection string.
+        database: Name of the application database.
+        max_pool_size: ``maxPoolSize`` per server.
+        min_pool_size: ``minPoolSize`` per server.
+        wait_queue_timeout_ms: ``waitQueueTimeoutMS``; how long an operation
+            may wait for a free pooled connection before failing.
+    """
+
+    def __init__(
+        self,
+        uri: str = MONGODB_URI,
+        database: str = MONGODB_DB,
+        max_pool_size: int = MONGODB_MAX_POOL_SIZE,
+        min_pool_size: int = MONGODB_MIN_POOL_SIZE,
+        wait_queue_timeout_ms: int = MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    ):
+        self.uri = uri
+        self.database = database
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.wait_queue_timeout_ms = wait_queue_timeout_ms
+        self.pool = PoolStats()
+        self._client: MongoClient | None = None
+        self._async_client: AsyncMongoClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> MongoClient:
+        """The client, created on first use. Creating it does no I/O."""
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+                client = self._client
+        return client
+
+    @property
+    def async_client(self) -> AsyncMongoClient:
+        """The async client, created on first use. Shares the pool settings and counters.
+
+        An ``AsyncMongoClient`` is bound to the event loop it was created on;
+        used from another loop (e.g. a second ``asyncio.run``) it is replaced.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        client = self._async_client
+        if client is None or (loop is not None and self._async_loop is not loop):
+            with self._lock:
+                if self._async_client is not None and loop is not None and self._async_loop is not loop:
+                    logger.warning("MongoDB async client used from another event loop; creating a new one")
+                    self._async_client = None
+                if self._async_client is None:
+                    self._async_client = self._connect(AsyncMongoClient)
+                    self._async_loop = loop
+                client = self._async_client
+        return client
+
+    def _options(self) -> dict:
+        return dict(
+            username=MONGODB_USER,
+            password=MONGODB_PASS,
+            server_api=ServerApi("1"),
+            connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            maxPoolSize=self.max_pool_size,
+            minPoolSize=self.min_pool_size,
+            waitQueueTimeoutMS=self.wait_queue_timeout_ms,
+            event_listeners=[self.pool],
+        )
+
+    def _connect(self, client_class=MongoClient):
+        if self._client is None and self._async_client is None:
+            self.pool.reset()
+        logger.info(
+            "creating MongoDB %s (maxPoolSize=%d, minPoolSize=%d)",
+            client_class.__name__, self.max_pool_size, self.min_pool_size,
+        )
+        return client_class(self.uri, **self._options())
+
+    @property
+    def is_open(self) -> bool:
+        return self._client is not None or self._async_client is not None
+
+    @property
+    def db(self):
+        return self.client[self.database]
+
+    def collection(self, name: str):
+        """Return the ``Collection`` called ``name`` in the application database."""
+        return self.db[name]
+
+    def async_collection(self, name: str):
+        """Return the ``AsyncCollection`` called ``name`` in the application database."""
+        return self.async_client[self.database][name]
+
+    def open(self) -> None:
+        """Create the client if needed. Called from the application lifespan."""
+        self.client
+
+    def close(self) -> None:
+        """Close the sync client and its pool; the next use creates a new one."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+            logger.info("closed MongoDB client")
+
+    async def aclose(self) -> None:
+        """Close both clients. Called from the application lifespan."""
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.close()
+            logger.info("closed MongoDB async client")
+        self.close()
+
+    def ping(self, timeout_ms: int = MONGODB_READY_TIMEOUT_MS) -> None:
+        """Round-trip to the server, bounded by ``timeout_ms``.
+
+        Raises:
+            PyMongoError: If the server cannot be reached in time.
+        """
+        with pymongo.timeout(timeout_ms / 1000):
+            self.client.admin.command("ping")
+
+    def stats(self) -> dict:
+        """Configuration and live counters of the connection pool."""
+        return {
+            "open": self.is_open,
+            "max_pool_size": self.max_pool_size,
+            "min_pool_size": self.min_pool_size,
+            "wait_queue_timeout_ms": self.wait_queue_timeout_ms,
+            **self.pool.snapshot(),
+        }
+
+
+class LazyCollection:
+    """Stand-in for a ``Collection`` that is looked up on every use.
+
+    Attribute access is forwarded to ``resource.collection(name)`` (or
+    ``resource.async_collection(name)`` with ``asynchronous=True``), so the
+    handle can be created at import time and survives a client reconnect.
+    """
+
+    def __init__(self, resource: MongoResource, name: str, asynchronous: bool = False):
+        self._resource = resource
+        self._name = name
+        self._resolve = resource.async_collection if asynchronous else resource.collection
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(self._name), attr)
+
+    def __getitem__(self, key):
+        return self._resolve(self._name)[key]
+
+    def __repr__(self) -> str:
+        return f"LazyCollection({self._resource.database}.{self._name})"
+
+
+mongo = MongoResource()
+
+# Collections
+characters_collection = LazyCollection(mongo, "characters")
+users_collection = LazyCollection(mongo, "users")
+books_collection = LazyCollection(mongo, "books", asynchronous=True)
+book_images_collection = LazyCollection(mongo, "book_images", asynchronous=True)
+book_assets_collection = LazyCollection(mongo, "book_assets", asynchronous=True)
+
@@ -0,0 +1,35 @@
+import asyncio
+from fastapi import APIRouter, Depends
+from fastapi.responses import FileResponse
+from app.services.observability.profiler import profiler, require_profile_admin
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_profile_admin)])
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    Lists the stored request profiles, newest first.
+
+    Requires an ``X-Profile-Token`` signed for ``admin``.
+
+    Returns:
+        dict: ``profiles``, one summary per stored profile (id, method,
+        path, route, status, duration and sample count), and the profiler
+        counters.
+    """
+    return {"profiles": await asyncio.to_thread(profiler.list), "stats": profiler.stats()}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """
+    Downloads one profile in the collapsed-stack format.
+
+    The file can be passed to ``flamegraph.pl`` or opened in speedscope.
+
+    Raises:
+        HTTPException: 404 if the profile does not exist.
+    """
+    path = profiler.path(profile_id)
+    return FileResponse(path, media_type="text/plain", filename=path.name)
@@ -1,29 +1,48 @@
-from fastapi import APIRouter
-from app.models.user_schema import User
+from fastapi import APIRouter, Depends
+from app.models.user_schema import AuthenticatedUser, Credentials, SignupRequest
 from app.services.auth.oauth import oauth
-from passlib.context import CryptContext
+from app.services.auth.login_service import authenticate_user
 from app.services.auth.signup_service import create_user
+from app.services.auth.tokens import require_user, token_service
 from app.services.auth.oauth_service import google_authorize_redirect, google_authorize_callback
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
 @router.post("/signup")
-async def signup(user: User):
+async def signup(user: SignupRequest):
     """
     Endpoint for user signup.
 
     Args:
-        user (User): The user data.
+        user (SignupRequest): The email, password and optional full name.
+
+    Returns:
+        dict: The created user with an assigned ID, plus an access token.
+    """
+    return token_service.session((await create_user(user)).model_dump())
+
+@router.post("/login")
+async def login(credentials: Credentials):
+    """
+    Endpoint for email and password login.
+
+    Args:
+        credentials (Credentials): The email and plain text password.
+
+    Returns:
+        dict: The authenticated user, plus an access token.
+    """
+    return token_service.session((await authenticate_user(credentials.email, credentials.password)).model_dump())
+
+@router.get("/me")
+async def me(user: AuthenticatedUser = Depends(require_user)):
+    """
+    Endpoint returning the caller identified by the bearer access token.
 
     Returns:
-        User: The created user with an assigned ID.
+        AuthenticatedUser: The token's user id, email, name and expiry.
     """
-    return create_user(user)
+    return user
 
 @router.get("/oauth/google")
 async def google_oauth():
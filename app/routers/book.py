@@ -0,0 +1,144 @@
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from app.models.book_schema import BookRequest
+from app.models.user_schema import AuthenticatedUser
+from app.services.auth.tokens import require_user
+from app.services.book.job_store import job_store, serialize_job
+from app.services.book.pipeline import job_pool
+from app.services.character.character_service import parse_people_metadata, MAX_BATCH_PEOPLE
+from app.services.http.admission import take_quota
+from app.services.image.preprocess import preprocess_image_async
+from app.services.upload.ingest import ingest_form
+
+router = APIRouter()
+
+BOOK_UPLOAD_OPENAPI = {
+    "parameters": [
+        {
+            "name": "Idempotency-Key",
+            "in": "header",
+            "required": False,
+            "schema": {"type": "string"},
+            "description": "Retries with the same key return the original job instead of creating a new one.",
+        }
+    ],
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}, "maxItems": MAX_BATCH_PEOPLE},
+                        "people": {"type": "string", "description": "JSON array of {name, declared_age, role}, one per file."},
+                        "num_pages": {"type": "integer", "enum": [4, 8, 12, 16]},
+                        "target_age": {"type": "string", "enum": ["<1", "1", "2", "3"]},
+                        "theme": {"type": "string"},
+                        "style": {"type": "string"},
+                        "guardian_consent": {"type": "boolean"},
+                    },
+                    "required": ["files", "people", "num_pages", "target_age", "theme", "style"],
+                }
+            }
+        },
+    },
+}
+
+
+@router.post("/books", status_code=202, openapi_extra=BOOK_UPLOAD_OPENAPI)
+async def create_book_route(request: Request, user: AuthenticatedUser = Depends(require_user)):
+    """
+    Queues a book job and returns immediately.
+
+    Photos are pre-processed and stored so the job can be retried or resumed
+    without the client; the pipeline (extract -> plan -> render) then runs on
+    the in-process worker pool. Poll ``GET /books/{id}`` for progress; only
+    the submitting user can. A new job costs one quota token per photo; its
+    model calls later take the admission controller's priority path. A retry
+    with a known ``Idempotency-Key`` is answered before the upload is read
+    and costs nothing.
+
+    Args:
+        request (Request): The incoming multipart request.
+        user (AuthenticatedUser): The caller; owns the job.
+
+    Returns:
+        dict: The job id and status (202), or the existing job (200) when the
+        ``Idempotency-Key`` was already used.
+
+    Raises:
+        HTTPException: If the request is invalid, 401 without a valid bearer
+            token, 409 if another user's job holds the ``Idempotency-Key``,
+            or 429 if the caller's quota is exhausted.
+    """
+    idempotency_key = request.headers.get("idempotency-key")
+    if idempotency_key:
+        existing = await job_store.find_by_idempotency_key(idempotency_key, user.id)
+        if existing is not None:
+            return JSONResponse(status_code=200, content=jsonable_encoder(serialize_job(existing)))
+
+    form = None
+    try:
+        form = await ingest_form(request, max_files=MAX_BATCH_PEOPLE)
+        uploads = [u for u in form.files if u.field_name == "files"]
+        people = parse_people_metadata(form.fields.get("people"), len(uploads))
+        try:
+            book = BookRequest.model_validate({k: v for k, v in form.fields.items() if k in BookRequest.model_fields})
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid book parameters: {e}")
+        if any(p.role == "child" for p in people) and not book.guardian_consent:
+            raise HTTPException(status_code=422, detail="Guardian consent is required to process photos of children")
+        await take_quota(request, len(uploads))
+
+        # Images are stored under the job's id, so pick it before creating the job.
+        job_id = ObjectId()
+        for upload in uploads:
+            prepared = await preprocess_image_async(upload.file)
+            await job_store.save_image(job_id, upload.sha256, prepared.data, prepared.mime_type)
+
+        job, created = await job_store.create(
+            {
+                **book.model_dump(),
+                "people": [p.model_dump() for p in people],
+                "image_hashes": [u.sha256 for u in uploads],
+            },
+            owner_id=user.id,
+            idempotency_key=idempotency_key,
+            job_id=job_id,
+        )
+        if not created:
+            await job_store.delete_images(job_id)
+            return JSONResponse(status_code=200, content=jsonable_encoder(serialize_job(job)))
+        job_pool.submit(job["_id"])
+        return {"id": str(job["_id"]), "status": job["status"]}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    finally:
+        if form is not None:
+            form.close()
+
+
+@router.get("/books/{book_id}")
+async def get_book_route(book_id: str, user: AuthenticatedUser = Depends(require_user)):
+    """
+    Returns one of the caller's book jobs: status, progress, per-stage
+    timings and results.
+
+    Args:
+        book_id (str): The job id returned by ``POST /books``.
+        user (AuthenticatedUser): The caller.
+
+    Returns:
+        dict: The job state.
+
+    Raises:
+        HTTPException: 401 without a valid bearer token, 404 if the job does
+            not exist or belongs to another user.
+    """
+    return serialize_job(await job_store.get(book_id, user.id))
+
@@ -1,33 +1,332 @@
 
 
-from fastapi import APIRouter, UploadFile, HTTPException, File
-from app.services.character.character_service import get_character_description
-from app.services.character.character_crud import create_character
-from app.models.character_schema import CharacterCreate
+import asyncio
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from app.services.character.character_service import (
+    get_cached_description,
+    get_character_description_cached,
+    parse_people_metadata,
+    store_description,
+    stream_character_description,
+    MAX_BATCH_PEOPLE,
+)
+from app.services.character.character_crud import create_character, create_characters, get_character, list_characters, MAX_PAGE_SIZE
+from app.services.http.admission import admission_controller, admit, content_cost, take_quota
+from app.services.http.disconnect import cancel_on_disconnect
+from app.services.observability.timing import span
+from app.services.upload.ingest import ingest_form, ingest_upload, IngestedUpload, UPLOAD_OPENAPI
+from app.models.character_schema import CharacterCreate, PersonMetadata
+from app.models.user_schema import AuthenticatedUser
+from app.services.auth.tokens import optional_user, require_user
 
 router = APIRouter()
 
-@router.post("/character")
-async def character_route(file: UploadFile = File(...)):
+# README design decision 2: descriptions below this confidence need review.
+REVIEW_CONFIDENCE_THRESHOLD = 0.6
+
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}, "maxItems": MAX_BATCH_PEOPLE},
+                        "people": {
+                            "type": "string",
+                            "description": "JSON array of {name, declared_age, role} objects, one per file, in the same order.",
+                        },
+                    },
+                    "required": ["files", "people"],
+                }
+            }
+        },
+    }
+}
+
+@router.post("/character", openapi_extra=UPLOAD_OPENAPI)
+async def character_route(request: Request, user: AuthenticatedUser | None = Depends(optional_user)):
     """
     Analyzes an image of a person and saves the structured JSON response to MongoDB.
 
+    The image is sent as multipart form field ``file``. It is streamed from
+    the request in chunks: oversized or non-image uploads are rejected before
+    the body is fully read, and large uploads are spooled to disk.
+
+    Descriptions are cached by image hash and prompt version; when the same
+    photo was already described, the model call is skipped. The model call
+    is awaited without blocking the event loop and is cancelled if the client
+    disconnects.
+
+    The request counts against the caller's quota and must get an admission
+    slot before the upload is read.
+
     Args:
-        file (UploadFile): The image file to analyze.
+        request (Request): The incoming multipart request.
+        user (AuthenticatedUser | None): The caller, if a bearer token was
+            sent; owns the saved characters.
 
     Returns:
         dict: The inserted character document (with _id).
 
     Raises:
-        HTTPException: If there is an error processing the image or communicating with the Gemini API.
+        HTTPException: 429 if the caller's quota is exhausted, 503 if the
+            server is saturated, or if there is an error processing the image
+            or communicating with the Gemini API.
+    """
+    upload = None
+    try:
+        async with admit(request):
+            with span("upload"):
+                upload = await ingest_upload(request)
+            response = await cancel_on_disconnect(request, get_character_description_cached(upload.file, upload.sha256))
+            character_in = CharacterCreate(**response)
+            with span("db_insert"):
+                db_character = await create_character(character_in, image_hash=upload.sha256, owner_id=user and user.id)
+            return db_character
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    finally:
+        if upload is not None:
+            upload.close()
+
+
+@router.post("/characters/batch", openapi_extra=BATCH_UPLOAD_OPENAPI)
+async def character_batch_route(request: Request, user: AuthenticatedUser | None = Depends(optional_user)):
+    """
+    Analyzes up to four photos of a family in one request.
+
+    Files are sent as repeated multipart field ``files`` and the per-person
+    metadata as a JSON array in field ``people`` (same order). Extractions run
+    concurrently, so wall-clock time is roughly that of the slowest photo.
+    Failures are reported per item; all successful descriptions are saved
+    with a single insert_many. The request holds one admission slot; its
+    quota cost is estimated from ``Content-Length`` (one token per started
+    ``ADMISSION_BYTES_PER_UNIT``, at most one per photo) and charged once,
+    after admission and before the upload is read.
+
+    Args:
+        request (Request): The incoming multipart request.
+        user (AuthenticatedUser | None): The caller, if a bearer token was
+            sent; owns the saved characters.
+
+    Returns:
+        dict: ``results``, one entry per file in input order, each with
+        ``status`` ``"ok"`` and the inserted ``character``, or ``"error"``
+        with ``status_code`` and ``detail``.
+
+    Raises:
+        HTTPException: If the request itself is invalid, the quota is
+            exhausted (429), the server is saturated (503) or saving fails.
     """
+    form = None
     try:
-        image_content = await file.read()
-        response = get_character_description(image_content)
-        character_in = CharacterCreate(**response)
-        db_character = create_character(character_in)
-        return db_character
+        async with admit(request, content_cost(request, MAX_BATCH_PEOPLE)):
+            with span("upload"):
+                form = await ingest_form(request, max_files=MAX_BATCH_PEOPLE)
+            uploads = [u for u in form.files if u.field_name == "files"]
+            people = parse_people_metadata(form.fields.get("people"), len(uploads))
+
+            async def _extract(upload: IngestedUpload) -> CharacterCreate:
+                response = await get_character_description_cached(upload.file, upload.sha256)
+                return CharacterCreate(**response)
+
+            outcomes = await cancel_on_disconnect(
+                request, asyncio.gather(*[_extract(u) for u in uploads], return_exceptions=True)
+            )
+
+        results: list[dict] = []
+        to_insert: list[tuple[int, CharacterCreate, PersonMetadata, str]] = []
+        for index, (person, upload, outcome) in enumerate(zip(people, uploads, outcomes)):
+            result = {"index": index, "name": person.name}
+            if isinstance(outcome, HTTPException):
+                result.update(status="error", status_code=outcome.status_code, detail=outcome.detail)
+            elif isinstance(outcome, BaseException):
+                result.update(status="error", status_code=500, detail=f"Unexpected error: {str(outcome)}")
+            else:
+                result["status"] = "ok"
+                to_insert.append((index, outcome, person, upload.sha256))
+            results.append(result)
+
+        with span("db_insert"):
+            inserted = await create_characters(
+                [c for _, c, _, _ in to_insert],
+                [p for _, _, p, _ in to_insert],
+                image_hashes=[h for _, _, _, h in to_insert],
+                owner_id=user and user.id,
+            )
+        for (index, _, _, _), document in zip(to_insert, inserted):
+            results[index]["character"] = document
+        return {"results": results}
     except HTTPException as e:
         raise e
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    finally:
+        if form is not None:
+            form.close()
+
+
+def _sse(event: str, data) -> str:
+    """
+    Formats one server-sent event with a JSON payload.
+    """
+    payload = json.dumps(jsonable_encoder(data), separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that runs ``on_close`` once the response is finished.
+
+    The body generator's ``finally`` does not run when the client goes away
+    before iteration starts, so the admission slot and the upload are
+    released here instead.
+    """
+
+    def __init__(self, *args, on_close, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+
+
+async def _replay_sections(description: dict):
+    """
+    Yields the sections of an already complete (cached) description.
+    """
+    for item in description.items():
+        yield item
+
+
+@router.post("/character/stream", openapi_extra=UPLOAD_OPENAPI)
+async def character_stream_route(request: Request, user: AuthenticatedUser | None = Depends(optional_user)):
+    """
+    Streaming variant of ``/character`` that sends server-sent events.
+
+    Events, in order:
+
+    - ``section``: ``{"key", "value"}`` for each top-level section as soon as
+      the model has produced it (``meta`` first, then ``head``, ``hair``, ...).
+    - ``confidence``: ``{"confidence_overall", "needs_review"}`` right after
+      ``meta`` arrives, so the review UI can decide early.
+    - ``character``: ``{"_id"}`` of the persisted document, last.
+    - ``error``: ``{"status_code", "detail"}`` if anything fails after the
+      stream has started.
+
+    Upload validation, quota (429) and admission (503) errors are returned as
+    regular HTTP errors before the stream starts; the quota is charged once
+    the admission slot is granted, and the slot is held until the response
+    ends (or the client goes away).
+
+    Args:
+        request (Request): The incoming multipart request.
+        user (AuthenticatedUser | None): The caller, if a bearer token was
+            sent; owns the saved characters.
+
+    Returns:
+        StreamingResponse: The ``text/event-stream`` response.
+    """
+    await admission_controller.acquire()
+    try:
+        await take_quota(request)
+        with span("upload"):
+            upload = await ingest_upload(request)
+    except BaseException:
+        admission_controller.release()
+        raise
+
+    async def events():
+        try:
+            cached_description = await get_cached_description(upload.sha256)
+            cached = cached_description is not None
+            if cached:
+                sections = _replay_sections(cached_description)
+            else:
+                sections = stream_character_description(upload.file)
+            description = {}
+            async for key, value in sections:
+                description[key] = value
+                yield _sse("section", {"key": key, "value": value})
+                if key == "meta" and isinstance(value, dict) and "confidence_overall" in value:
+                    confidence = value["confidence_overall"]
+                    needs_review = not isinstance(confidence, (int, float)) or confidence < REVIEW_CONFIDENCE_THRESHOLD
+                    yield _sse("confidence", {"confidence_overall": confidence, "needs_review": needs_review})
+            if not cached:
+                await store_description(upload.sha256, description)
+            with span("db_insert"):
+                db_character = await create_character(CharacterCreate(**description), image_hash=upload.sha256, owner_id=user and user.id)
+            yield _sse("character", {"_id": db_character["_id"]})
+        except HTTPException as e:
+            yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            yield _sse("error", {"status_code": 500, "detail": f"Unexpected error: {str(e)}"})
+
+    def close():
+        upload.close()
+        admission_controller.release()
+
+    return _AdmittedStreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        on_close=close,
+    )
+
+
+def _json(body) -> Response:
+    """
+    Returns an already JSON-ready body without FastAPI's response encoding pass.
+    """
+    return Response(content=json.dumps(body, separators=(",", ":")), media_type="application/json")
+
+
+@router.get("/characters")
+async def list_characters_route(
+    fields: str | None = Query(None, description="Comma-separated fields, e.g. 'meta,general'; '*' for all."),
+    cursor: str | None = Query(None, description="next_cursor from the previous page."),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    image_sha256: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    user: AuthenticatedUser = Depends(require_user),
+):
+    """
+    Lists the caller's characters, newest first, with cursor pagination.
+
+    Requires a bearer token; characters are those created with the caller's
+    token. Only the requested fields are read from MongoDB and returned (by default
+    ``meta``, ``general``, ``person`` and ``created_at``).
+
+    Returns:
+        Response: ``{"items": [...], "next_cursor": str | null}``.
+    """
+    page = await list_characters(user.id, fields, cursor, limit, image_sha256, created_after, created_before)
+    return _json(page)
+
+
+@router.get("/characters/{character_id}")
+async def get_character_route(
+    character_id: str,
+    fields: str | None = Query(None, description="Comma-separated fields; all by default."),
+    user: AuthenticatedUser = Depends(require_user),
+):
+    """
+    Returns one of the caller's stored characters.
+
+    Raises:
+        HTTPException: 401 without a valid bearer token, 404 if the character
+            does not exist or belongs to another user.
+    """
+    return _json(await get_character(character_id, user.id, fields))
@@ -0,0 +1,85 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pymongo.errors import PyMongoError
+from app.mongodb import mongo, MONGODB_READY_TIMEOUT_MS
+from app.services.auth.password_hasher import password_hasher
+from app.services.character.schema_validator import validator_registry
+from app.services.gemini.resilience import resilience_stats
+from app.services.http.admission import admission_controller
+from app.services.http.quotas import quota_store
+from app.services.observability.metrics import registry
+from app.services.observability.profiler import profiler
+
+router = APIRouter()
+
+# Saturation signals worth alerting on, read at scrape time.
+registry.gauge("admission_in_flight", "Requests holding an admission slot.", lambda: admission_controller.stats()["in_flight"])
+registry.gauge("admission_queued", "Requests waiting for an admission slot.", lambda: admission_controller.stats()["queued"])
+registry.gauge("password_hasher_queued", "Hash and verify calls waiting for a worker.", lambda: password_hasher.stats()["queued"])
+registry.gauge("provider_breaker_open", "1 while the provider circuit breaker rejects calls.", lambda: resilience_stats()["breaker"]["state"] != "closed")
+
+# Set by the application lifespan once index creation and job recovery ran.
+storage_state = {"bootstrapped": False, "error": None, "attempts": 0}
+
+
+@router.get("/healthz")
+async def healthz():
+    """
+    Liveness probe. Never touches the database.
+
+    Returns:
+        dict: ``status``, the MongoDB pool configuration and counters, the
+        password hashing queue depth and latencies, the admission and
+        quota counters, the provider retry, hedging and circuit breaker
+        counters, the character validation and repair counters, and the
+        request profiler counters.
+    """
+    return {
+        "status": "ok",
+        "mongo": mongo.stats(),
+        "password_hasher": password_hasher.stats(),
+        "admission": admission_controller.stats(),
+        "quotas": quota_store.stats(),
+        "provider": resilience_stats(),
+        "character_validation": validator_registry.stats(),
+        "profiler": profiler.stats(),
+    }
+
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness probe: pings MongoDB with a short deadline.
+
+    Returns:
+        JSONResponse: 200 when the database answers and startup storage work
+        has finished, 503 otherwise. The body carries the ping latency and
+        the pool stats either way.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    body = {"status": "ready", "mongo": None, "storage": dict(storage_state)}
+    try:
+        await asyncio.to_thread(mongo.ping, MONGODB_READY_TIMEOUT_MS)
+        body["ping_ms"] = round((loop.time() - started) * 1000, 1)
+    except PyMongoError as e:
+        body["status"] = "unavailable"
+        body["error"] = str(e)
+    if not storage_state["bootstrapped"] and body["status"] == "ready":
+        body["status"] = "starting"
+    body["mongo"] = mongo.stats()
+    return JSONResponse(body, status_code=200 if body["status"] == "ready" else 503)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint.
+
+    Returns:
+        PlainTextResponse: Stage and request latency histograms, model token
+        usage, parse path counters and saturation gauges, in the text
+        exposition format.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,47 @@
+"""
+Service for handling password login.
+"""
+
+from fastapi import HTTPException
+from app.models.user_schema import User
+from app.services.auth.password_hasher import password_hasher
+from app.services.repository.repositories import user_repository
+
+async def authenticate_user(email: str, password: str) -> User:
+    """
+    Checks an email and password against the stored user.
+
+    The bcrypt check runs in the password hasher's thread pool. When the
+    stored hash was made with an outdated cost factor, it is replaced by a
+    fresh hash of the (now verified) password. Unknown emails are checked
+    against a throwaway hash so they cost the same as a wrong password.
+
+    Args:
+        email (str): The user's email.
+        password (str): The plain text password.
+
+    Raises:
+        HTTPException: 401 if the email is unknown or the password does not
+            match, 503 if the password hashing pool is saturated.
+
+    Returns:
+        User: The authenticated user.
+    """
+    document = await user_repository.find_by_email(email)
+    if not document or not document.get("hashed_password"):
+        await password_hasher.verify_dummy(password)
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+
+    ok, new_hash = await password_hasher.verify(password, document["hashed_password"])
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash is not None:
+        await user_repository.set_password_hash(document["_id"], new_hash)
+
+    return User(
+        id=str(document["_id"]),
+        email=document["email"],
+        oauth_provider=document.get("oauth_provider"),
+        oauth_id=document.get("oauth_id"),
+        full_name=document.get("full_name"),
+    )
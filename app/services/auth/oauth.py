@@ -1,6 +1,89 @@
-from authlib.integrations.starlette_client import OAuth
+"""
+Google OAuth client.
+
+Google's discovery document and signing keys (JWKS) are cached in-process by
+:class:`CachedOpenIDApp`, so verifying an ID token normally costs no network
+call. Both expire after a TTL (``GOOGLE_DISCOVERY_TTL``, ``GOOGLE_JWKS_TTL``);
+an ID token signed with a key that is not in the cached set forces a JWKS
+refresh (Google rotates keys), at most once per
+``GOOGLE_JWKS_MIN_REFRESH_INTERVAL`` so tokens with unknown key ids cannot
+make every request hit Google.
+"""
+
+import asyncio
+import os
+import time
+from authlib.integrations.starlette_client import OAuth, StarletteOAuth2App
 from starlette.config import Config
 
+GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+GOOGLE_DISCOVERY_TTL = float(os.getenv("GOOGLE_DISCOVERY_TTL", "86400"))
+GOOGLE_JWKS_TTL = float(os.getenv("GOOGLE_JWKS_TTL", "3600"))
+GOOGLE_JWKS_MIN_REFRESH_INTERVAL = float(os.getenv("GOOGLE_JWKS_MIN_REFRESH_INTERVAL", "60"))
+
+
+class CachedOpenIDApp(StarletteOAuth2App):
+    """Starlette OAuth app whose discovery document and JWKS expire.
+
+    Authlib loads both once and keeps them for the life of the process; this
+    subclass reloads them after their TTL and rate-limits the forced JWKS
+    refresh that Authlib does when a token's key id is unknown. Concurrent
+    refreshes are collapsed into one fetch.
+    """
+
+    discovery_ttl = GOOGLE_DISCOVERY_TTL
+    jwks_ttl = GOOGLE_JWKS_TTL
+    min_refresh_interval = GOOGLE_JWKS_MIN_REFRESH_INTERVAL
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._refresh_lock = asyncio.Lock()
+        self.cache_stats = {"discovery_fetches": 0, "jwks_fetches": 0, "key_miss_refreshes": 0, "key_miss_throttled": 0}
+
+    async def load_server_metadata(self):
+        if not self._server_metadata_url:
+            return self.server_metadata
+        loaded_at = self.server_metadata.get("_loaded_at")
+        if loaded_at is not None and time.time() - loaded_at > self.discovery_ttl:
+            del self.server_metadata["_loaded_at"]
+        if "_loaded_at" not in self.server_metadata:
+            async with self._refresh_lock:
+                if "_loaded_at" not in self.server_metadata:
+                    self.cache_stats["discovery_fetches"] += 1
+                    await super().load_server_metadata()
+        return self.server_metadata
+
+    async def fetch_jwk_set(self, force=False):
+        metadata = await self.load_server_metadata()
+        fetched_at = metadata.get("_jwks_loaded_at", 0.0)
+        age = time.time() - fetched_at
+        if "jwks" in metadata and not force and age <= self.jwks_ttl:
+            return metadata["jwks"]
+        async with self._refresh_lock:
+            fetched_at = self.server_metadata.get("_jwks_loaded_at", 0.0)
+            age = time.time() - fetched_at
+            if "jwks" in self.server_metadata:
+                if force and age < self.min_refresh_interval:
+                    # Refreshed moments ago (possibly by a concurrent request).
+                    self.cache_stats["key_miss_throttled"] += 1
+                    return self.server_metadata["jwks"]
+                if not force and age <= self.jwks_ttl:
+                    return self.server_metadata["jwks"]
+            if force:
+                self.cache_stats["key_miss_refreshes"] += 1
+            self.cache_stats["jwks_fetches"] += 1
+            # Fetched here rather than through super(), which would reload
+            # the metadata and so re-enter the lock.
+            if not metadata.get("jwks_uri"):
+                raise RuntimeError('Missing "jwks_uri" in metadata')
+            async with self._get_session() as client:
+                resp = await client.request("GET", metadata["jwks_uri"], withhold_token=True)
+                resp.raise_for_status()
+                jwk_set = resp.json()
+            self.server_metadata.update(jwks=jwk_set, _jwks_loaded_at=time.time())
+            return jwk_set
+
+
 # Load environment variables
 config = Config(".env")
 
@@ -11,10 +94,12 @@ oauth.register(
     name='google',
     client_id=config('GOOGLE_CLIENT_ID'),
     client_secret=config('GOOGLE_CLIENT_SECRET'),
+    client_cls=CachedOpenIDApp,
+    server_metadata_url=GOOGLE_DISCOVERY_URL,
     access_token_url='https://accounts.google.com/o/oauth2/token',
     authorize_url='https://accounts.google.com/o/oauth2/auth',
     api_base_url='https://www.googleapis.com/oauth2/v1/',
     client_kwargs={
         'scope': 'openid email profile'
     }
-)
\ No newline at end of file
+)
@@ -3,7 +3,8 @@ Service for handling Google OAuth authentication.
 """
 
 from app.services.auth.oauth import oauth
-from app.mongodb import users_collection
+from app.services.auth.tokens import token_service
+from app.services.repository.repositories import user_repository
 
 async def google_authorize_redirect(request, redirect_uri: str):
     """
@@ -20,27 +21,28 @@ async def google_authorize_redirect(request, redirect_uri: str):
 
 async def google_authorize_callback(token: dict):
     """
-    Handles the Google OAuth callback and retrieves user information.
+    Handles the Google OAuth callback, finds or creates the user and issues
+    an access token.
+
+    The ID token is verified against Google's cached signing keys, and the
+    user is read or created in a single database round trip. Later requests
+    authenticate with the returned access token alone.
 
     Args:
         token (dict): The OAuth token.
 
     Returns:
-        dict: The user information.
+        dict: The user information plus ``access_token``, ``token_type`` and
+        ``expires_in``.
     """
     nonce = "test_nonce"  # Mock nonce for testing purposes
     user_info = await oauth.google.parse_id_token(token, nonce)
 
-    user = users_collection.find_one({"email": user_info["email"]})
-    if not user:
-        user = {
-            "email": user_info["email"],
-            "oauth_provider": "google",
-            "oauth_id": user_info["sub"],
-            "full_name": user_info["name"],
-            "avatar_url": user_info["picture"]
-        }
-        result = users_collection.insert_one(user)
-        user["id"] = str(result.inserted_id)
-
-    return user
\ No newline at end of file
+    user = await user_repository.get_or_create(user_info["email"], {
+        "oauth_provider": "google",
+        "oauth_id": user_info["sub"],
+        "full_name": user_info["name"],
+        "avatar_url": user_info["picture"]
+    })
+    user["id"] = str(user.pop("_id"))
+    return token_service.session(user)
@@ -0,0 +1,192 @@
+"""Password hashing off the event loop.
+
+bcrypt is slow on purpose (hundreds of milliseconds at the default cost), so
+hashing inline in an ``async`` handler stalls every other request on the
+worker. :class:`PasswordHasher` runs hash and verify calls in a small
+dedicated thread pool (the bcrypt C extension releases the GIL) and bounds
+how many may wait for it: beyond ``PASSWORD_HASH_MAX_PENDING`` queued calls,
+new ones are rejected with ``503`` and ``Retry-After`` instead of piling up.
+
+The cost factor is configurable (``PASSWORD_BCRYPT_ROUNDS``). Hashes made
+with another cost still verify, and :meth:`PasswordHasher.verify` returns a
+replacement hash for them so callers can upgrade stored hashes on login.
+
+This is the only ``CryptContext`` in the application.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.services.observability.profiler import propagate
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+
+class PasswordHasher:
+    """Bounded thread pool around a bcrypt ``CryptContext``.
+
+    Args:
+        rounds: bcrypt cost factor for new hashes.
+        workers: Threads hashing concurrently.
+        max_pending: Calls allowed to wait for a thread; further calls are
+            rejected with ``503``.
+    """
+
+    def __init__(
+        self,
+        rounds: int = PASSWORD_BCRYPT_ROUNDS,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self._executor: ThreadPoolExecutor | None = None
+        self._dummy_hash: str | None = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._stats = {
+            "hashed": 0,
+            "verified": 0,
+            "verify_failures": 0,
+            "rehashed": 0,
+            "rejected": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._queued + self._in_flight >= self.workers + self.max_pending:
+                self._stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many concurrent password operations, retry shortly",
+                    headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+                )
+            self._queued += 1
+
+    async def _run(self, func, *args):
+        self._admit()
+        submitted = time.perf_counter()
+        state = {"started": False, "abandoned": False}
+
+        def _job():
+            with self._lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+                self._queued -= 1
+                self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._in_flight -= 1
+                    wait_ms = (started - submitted) * 1000
+                    run_ms = (finished - started) * 1000
+                    self._stats["total_wait_ms"] += wait_ms
+                    self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+                    self._stats["total_ms"] += run_ms
+                    self._stats["max_ms"] = max(self._stats["max_ms"], run_ms)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), propagate(_job))
+        except asyncio.CancelledError:
+            # The caller went away: drop the job if it has not started yet.
+            with self._lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self._queued -= 1
+            raise
+
+    async def hash(self, password: str) -> str:
+        """Return the bcrypt hash of ``password``.
+
+        Raises:
+            HTTPException: 503 if too many calls are already waiting.
+        """
+        hashed = await self._run(self.context.hash, password)
+        with self._lock:
+            self._stats["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """Check ``password`` against a stored hash.
+
+        Returns:
+            tuple[bool, str | None]: Whether it matches, and a new hash to
+            store when it matches but was made with outdated settings (e.g. a
+            different cost factor), else ``None``.
+
+        Raises:
+            HTTPException: 503 if too many calls are already waiting.
+        """
+        ok, new_hash = await self._run(self.context.verify_and_update, password, hashed)
+        with self._lock:
+            self._stats["verified"] += 1
+            if not ok:
+                self._stats["verify_failures"] += 1
+            if new_hash is not None:
+                self._stats["rehashed"] += 1
+        return ok, new_hash
+
+    async def verify_dummy(self, password: str) -> None:
+        """Run a verify that always fails, at the cost of a real one.
+
+        Login calls this for unknown emails so they take as long as a wrong
+        password and response times do not reveal which accounts exist. The
+        throwaway hash is made on first use with the current cost factor.
+
+        Raises:
+            HTTPException: 503 if too many calls are already waiting.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = await self._run(self.context.hash, os.urandom(16).hex())
+        await self.verify(password, self._dummy_hash)
+
+    def stats(self) -> dict:
+        """Queue depth, throughput and latency of hash/verify calls."""
+        with self._lock:
+            stats = dict(self._stats, queued=self._queued, in_flight=self._in_flight)
+        calls = stats["hashed"] + stats["verified"]
+        stats["avg_ms"] = stats["total_ms"] / calls if calls else 0.0
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / calls if calls else 0.0
+        stats.update(rounds=self.rounds, workers=self.workers, max_pending=self.max_pending)
+        return stats
+
+    def shutdown(self) -> None:
+        """Stop the pool; queued calls are cancelled."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
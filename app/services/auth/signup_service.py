@@ -2,47 +2,44 @@
 Service for handling user signup.
 """
 
+from bson import ObjectId
 from fastapi import HTTPException
-from passlib.context import CryptContext
-from app.models.user_schema import User
-from app.mongodb import users_collection
+from app.models.user_schema import SignupRequest, User
+from app.services.auth.password_hasher import password_hasher
+from app.services.repository.repositories import DuplicateRecord, user_repository
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    """
-    Hashes a plain text password using bcrypt.
-
-    Args:
-        password (str): The plain text password.
-
-    Returns:
-        str: The hashed password.
-    """
-    return pwd_context.hash(password)
-
-def create_user(user: User) -> User:
+async def create_user(signup: SignupRequest) -> User:
     """
     Creates a new user in the database.
 
     Args:
-        user (User): The user data.
+        signup (SignupRequest): The email, plain text password and full name.
 
     Raises:
-        HTTPException: If the email is already registered.
+        HTTPException: If the email is already registered, or 503 if the
+            password hashing pool is saturated.
 
     Returns:
         User: The created user with an assigned ID.
     """
-    existing_user = users_collection.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    if user.hashed_password:
-        user.hashed_password = hash_password(user.hashed_password)
-
+    # Uniqueness is enforced by the users.email index; no read-before-write.
+    # The user is inserted before the password is hashed, so a taken email
+    # is rejected without spending a bcrypt slot on it.
+    user = User(email=signup.email, full_name=signup.full_name)
     user_dict = user.model_dump()
     user_dict.pop("id", None)
-    result = users_collection.insert_one(user_dict)
-    user.id = str(result.inserted_id)
-    return user
\ No newline at end of file
+    try:
+        user.id = await user_repository.insert(user_dict)
+    except DuplicateRecord:
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    if signup.hashed_password:
+        # bcrypt runs in the hasher's thread pool, off the event loop.
+        try:
+            user.hashed_password = await password_hasher.hash(signup.hashed_password)
+            await user_repository.set_password_hash(ObjectId(user.id), user.hashed_password)
+        except BaseException:
+            # Do not leave a password-less account holding the email.
+            await user_repository.delete(ObjectId(user.id))
+            raise
+    return user
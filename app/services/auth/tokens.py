@@ -0,0 +1,182 @@
+"""Stateless access tokens.
+
+After signup, password login or Google login the client receives a signed
+access token (an HS256 JWT). :func:`require_user` checks it with a single
+HMAC and a clock comparison, so authenticated endpoints need neither a
+database round trip nor a network call per request.
+
+The signing key comes from ``AUTH_TOKEN_SECRET``. Keys listed in
+``AUTH_TOKEN_PREVIOUS_SECRETS`` (comma separated) are still accepted for
+verification, so the secret can be rotated without logging everyone out.
+Without ``AUTH_TOKEN_SECRET`` a random key is generated at startup: tokens
+then stop working on restart and are not shared between worker processes.
+
+Being stateless, a token stays valid until it expires
+(``AUTH_TOKEN_TTL_SECONDS``); keep the lifetime short.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Any
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.models.user_schema import AuthenticatedUser
+
+logger = logging.getLogger(__name__)
+
+AUTH_TOKEN_SECRET = os.getenv("AUTH_TOKEN_SECRET", "")
+AUTH_TOKEN_PREVIOUS_SECRETS = [s for s in os.getenv("AUTH_TOKEN_PREVIOUS_SECRETS", "").split(",") if s]
+AUTH_TOKEN_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", "3600"))
+AUTH_TOKEN_ISSUER = os.getenv("AUTH_TOKEN_ISSUER", "kid_book_generator")
+AUTH_TOKEN_LEEWAY_SECONDS = int(os.getenv("AUTH_TOKEN_LEEWAY_SECONDS", "30"))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _dumps(value: dict) -> bytes:
+    return json.dumps(value, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+# The only header ever issued; anything else (e.g. ``alg: none``) is rejected
+# by comparing the encoded header as a whole.
+_HEADER = _b64encode(_dumps({"alg": "HS256", "typ": "JWT"}))
+
+
+def _invalid(detail: str = "Invalid access token") -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+class TokenService:
+    """Issues and verifies HS256 access tokens.
+
+    Args:
+        secret: Signing key.
+        previous_secrets: Older keys still accepted when verifying.
+        ttl_seconds: Token lifetime.
+        issuer: ``iss`` claim issued and required.
+        leeway_seconds: Allowed clock skew when checking expiry.
+    """
+
+    def __init__(
+        self,
+        secret: str = AUTH_TOKEN_SECRET,
+        previous_secrets: list[str] = AUTH_TOKEN_PREVIOUS_SECRETS,
+        ttl_seconds: int = AUTH_TOKEN_TTL_SECONDS,
+        issuer: str = AUTH_TOKEN_ISSUER,
+        leeway_seconds: int = AUTH_TOKEN_LEEWAY_SECONDS,
+    ):
+        if not secret:
+            logger.warning("AUTH_TOKEN_SECRET is not set; using a random per-process key")
+            secret = secrets.token_urlsafe(32)
+        self._keys = [k.encode("utf-8") for k in [secret, *previous_secrets]]
+        self.ttl_seconds = ttl_seconds
+        self.issuer = issuer
+        self.leeway_seconds = leeway_seconds
+
+    def _sign(self, signing_input: str, key: bytes) -> bytes:
+        return hmac.new(key, signing_input.encode("ascii"), hashlib.sha256).digest()
+
+    def issue(self, user_id: str, email: str, **claims: Any) -> str:
+        """Return a signed token for the user.
+
+        Args:
+            user_id: Stored as ``sub``.
+            email: Stored as ``email``.
+            **claims: Extra claims (e.g. ``name``).
+        """
+        now = int(time.time())
+        payload = {**claims, "sub": user_id, "email": email, "iss": self.issuer, "iat": now, "exp": now + self.ttl_seconds}
+        signing_input = f"{_HEADER}.{_b64encode(_dumps(payload))}"
+        return f"{signing_input}.{_b64encode(self._sign(signing_input, self._keys[0]))}"
+
+    def verify(self, token: str) -> dict[str, Any]:
+        """Check the signature, issuer and expiry of a token and return its claims.
+
+        Raises:
+            HTTPException: 401 if the token is malformed, forged or expired.
+        """
+        # Tokens are base64url text; anything else would fail in compare_digest
+        # or the ASCII encode of the signing input rather than as a 401.
+        if not token.isascii():
+            raise _invalid()
+        try:
+            header, payload, signature = token.split(".")
+            signature_bytes = _b64decode(signature)
+        except ValueError:
+            raise _invalid()
+        if not hmac.compare_digest(header, _HEADER):
+            raise _invalid()
+        signing_input = f"{header}.{payload}"
+        if not any(hmac.compare_digest(self._sign(signing_input, key), signature_bytes) for key in self._keys):
+            raise _invalid()
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            raise _invalid()
+        if not isinstance(claims, dict) or claims.get("iss") != self.issuer or "sub" not in claims:
+            raise _invalid()
+        if not isinstance(claims.get("exp"), int) or claims["exp"] + self.leeway_seconds < time.time():
+            raise _invalid("Access token expired")
+        return claims
+
+    def session(self, user: dict[str, Any]) -> dict[str, Any]:
+        """Return ``user`` (without its password hash) plus a fresh access token.
+
+        Args:
+            user: The user's public fields; must include ``id`` and ``email``.
+        """
+        body = {k: v for k, v in user.items() if k not in ("hashed_password", "_id")}
+        extra = {"name": user["full_name"]} if user.get("full_name") else {}
+        body.update(
+            access_token=self.issue(str(user["id"]), user["email"], **extra),
+            token_type="bearer",
+            expires_in=self.ttl_seconds,
+        )
+        return body
+
+
+token_service = TokenService()
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def require_user(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> AuthenticatedUser:
+    """
+    FastAPI dependency returning the caller identified by the bearer token.
+
+    Verification is local (signature and expiry only); MongoDB is not read.
+
+    Raises:
+        HTTPException: 401 if the token is missing or invalid.
+    """
+    if credentials is None:
+        raise _invalid("Not authenticated")
+    claims = token_service.verify(credentials.credentials)
+    return AuthenticatedUser(id=claims["sub"], email=claims["email"], name=claims.get("name"), expires_at=claims["exp"])
+
+
+async def optional_user(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> AuthenticatedUser | None:
+    """
+    Like :func:`require_user`, but ``None`` when no bearer token is sent.
+
+    Raises:
+        HTTPException: 401 if a token is sent and it is invalid.
+    """
+    if credentials is None:
+        return None
+    return await require_user(credentials)
@@ -0,0 +1,233 @@
+"""Parallel per-page illustration scheduler.
+
+A book has 4-16 pages and each page needs its own illustration. Rendering
+them one after another makes a 16-page book 16 serial model calls, while
+firing them all at once lets one large book starve everyone else. The
+scheduler sits between the two:
+
+- a global limit (``ILLUSTRATION_MAX_CONCURRENCY``) bounds in-flight calls
+  per process;
+- two priority lanes: ``preview`` (low resolution) pages are always
+  dispatched before ``final`` renders;
+- within a lane, books are served round-robin, one page at a time, so a
+  16-page book and a 4-page book progress at the same rate;
+- failed pages are retried individually with exponential backoff, without
+  holding a slot while they wait;
+- :meth:`IllustrationScheduler.render_pages` returns results in page order,
+  and can hand each page to a callback as soon as it is done.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.services.gemini.client import generate_illustration_async
+
+logger = logging.getLogger(__name__)
+
+ILLUSTRATION_MAX_CONCURRENCY = int(os.getenv("ILLUSTRATION_MAX_CONCURRENCY", "4"))
+ILLUSTRATION_MAX_ATTEMPTS = int(os.getenv("ILLUSTRATION_MAX_ATTEMPTS", "3"))
+ILLUSTRATION_RETRY_BASE_SECONDS = float(os.getenv("ILLUSTRATION_RETRY_BASE_SECONDS", "1.0"))
+ILLUSTRATION_PREVIEW_SIZE = int(os.getenv("ILLUSTRATION_PREVIEW_SIZE", "512"))
+ILLUSTRATION_FINAL_SIZE = int(os.getenv("ILLUSTRATION_FINAL_SIZE", "1536"))
+
+PREVIEW = "preview"
+FINAL = "final"
+LANES = (PREVIEW, FINAL)
+LANE_SIZES = {PREVIEW: ILLUSTRATION_PREVIEW_SIZE, FINAL: ILLUSTRATION_FINAL_SIZE}
+
+Renderer = Callable[[str, int], Awaitable[tuple[bytes, str]]]
+
+
+@dataclass
+class PageResult:
+    """Outcome of one page illustration.
+
+    Attributes:
+        page: Page number.
+        lane: ``preview`` or ``final``.
+        image: The image bytes, or ``None`` if every attempt failed.
+        mime_type: MIME type of ``image``.
+        attempts: Number of attempts made.
+        error: The last error message when ``image`` is ``None``.
+    """
+
+    page: int
+    lane: str
+    image: bytes | None = None
+    mime_type: str | None = None
+    attempts: int = 0
+    error: str | None = None
+
+
+@dataclass
+class _PageTask:
+    book_id: str
+    lane: str
+    page: int
+    prompt: str
+    future: asyncio.Future
+    attempts: int = 0
+    result: PageResult = field(init=False)
+
+    def __post_init__(self):
+        self.result = PageResult(page=self.page, lane=self.lane)
+
+
+async def _default_renderer(prompt: str, size: int) -> tuple[bytes, str]:
+    return await generate_illustration_async(prompt, size)
+
+
+class IllustrationScheduler:
+    """Fan out page illustrations with lanes, fairness and per-page retries.
+
+    Args:
+        renderer: Coroutine function ``(prompt, size) -> (bytes, mime_type)``.
+        max_concurrency: Global bound on in-flight renders.
+        max_attempts: Attempts per page before giving up on it.
+        retry_base_seconds: Base of the exponential backoff between attempts.
+    """
+
+    def __init__(
+        self,
+        renderer: Renderer = _default_renderer,
+        max_concurrency: int = ILLUSTRATION_MAX_CONCURRENCY,
+        max_attempts: int = ILLUSTRATION_MAX_ATTEMPTS,
+        retry_base_seconds: float = ILLUSTRATION_RETRY_BASE_SECONDS,
+    ):
+        self.renderer = renderer
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self._lanes: dict[str, OrderedDict[str, deque[_PageTask]]] = {lane: OrderedDict() for lane in LANES}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._dispatcher is None or self._dispatcher.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._running = set()
+            self._dispatcher = loop.create_task(self._dispatch(), name="illustration-dispatcher")
+
+    def queued(self) -> dict[str, int]:
+        """Return the number of queued pages per lane."""
+        return {lane: sum(len(q) for q in books.values()) for lane, books in self._lanes.items()}
+
+    async def render_pages(
+        self,
+        book_id: str,
+        pages: list[dict],
+        lane: str = FINAL,
+        on_page: Callable[[PageResult], Awaitable[None]] | None = None,
+    ) -> list[PageResult]:
+        """Render every page of a book in ``lane`` and wait for all of them.
+
+        Args:
+            book_id: Identifies the book for fairness.
+            pages: Dicts with ``page`` and ``image_prompt``.
+            lane: ``preview`` or ``final``.
+            on_page: Awaited with each result as soon as its page is done,
+                in completion order.
+
+        Returns:
+            list[PageResult]: One result per page, in page order. Pages that
+            failed every attempt carry an ``error`` instead of an image.
+        """
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane!r}")
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        tasks = [
+            _PageTask(book_id=book_id, lane=lane, page=p["page"], prompt=p["image_prompt"], future=loop.create_future())
+            for p in sorted(pages, key=lambda p: p["page"])
+        ]
+        for task in tasks:
+            self._enqueue(task)
+
+        async def _deliver(task: _PageTask) -> PageResult:
+            result = await task.future
+            if on_page is not None:
+                await on_page(result)
+            return result
+
+        try:
+            return list(await asyncio.gather(*[_deliver(t) for t in tasks]))
+        finally:
+            self._drop_book(book_id, lane)
+
+    def _enqueue(self, task: _PageTask) -> None:
+        books = self._lanes[task.lane]
+        books.setdefault(task.book_id, deque()).append(task)
+        self._wakeup.set()
+
+    def _drop_book(self, book_id: str, lane: str) -> None:
+        queue = self._lanes[lane].pop(book_id, None)
+        for task in queue or ():
+            if not task.future.done():
+                task.future.cancel()
+
+    def _next_task(self) -> _PageTask | None:
+        for lane in LANES:
+            books = self._lanes[lane]
+            while books:
+                book_id, queue = next(iter(books.items()))
+                task = queue.popleft()
+                # Rotate the book to the back of the lane for round-robin.
+                books.pop(book_id)
+                if queue:
+                    books[book_id] = queue
+                if not task.future.done():
+                    return task
+        return None
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._slots.acquire()
+            task = self._next_task()
+            while task is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                task = self._next_task()
+            running = asyncio.create_task(self._run(task))
+            self._running.add(running)
+            running.add_done_callback(self._running.discard)
+
+    async def _run(self, task: _PageTask) -> None:
+        task.attempts += 1
+        task.result.attempts = task.attempts
+        try:
+            image, mime_type = await self.renderer(task.prompt, LANE_SIZES[task.lane])
+        except asyncio.CancelledError:
+            self._slots.release()
+            raise
+        except Exception as e:
+            self._slots.release()
+            task.result.error = str(getattr(e, "detail", None) or e)
+            if task.attempts >= self.max_attempts or task.future.done():
+                logger.warning("page %s of book %s failed after %d attempts: %s", task.page, task.book_id, task.attempts, task.result.error)
+                if not task.future.done():
+                    task.future.set_result(task.result)
+                return
+            await asyncio.sleep(self.retry_base_seconds * 2 ** (task.attempts - 1))
+            if not task.future.done():
+                self._enqueue(task)
+            return
+        self._slots.release()
+        task.result.image = image
+        task.result.mime_type = mime_type
+        task.result.error = None
+        if not task.future.done():
+            task.future.set_result(task.result)
+
+
+illustration_scheduler = IllustrationScheduler()
@@ -0,0 +1,306 @@
+"""Persistent job state for the book pipeline.
+
+Every ``POST /books`` request becomes one document in the ``books``
+collection. The document records the request, the overall status and
+progress, per-stage timings and the outputs of completed stages, so a job can
+be resumed from its first unfinished stage after a restart.
+
+Job lifecycle::
+
+    queued -> running -> succeeded
+                      -> failed
+
+Workers claim a job atomically (``queued`` -> ``running``) and refresh
+``heartbeat_at`` while it runs (:meth:`JobStore.heartbeat`).
+:meth:`JobStore.recover`, run at startup and periodically by the worker
+pool, returns running jobs whose heartbeat is older than
+``JOB_LEASE_SECONDS`` to the queue.
+
+Input images belong to one job: they are stored under ``(job_id,
+image_sha256)``, deleted by the pipeline once described or when the job
+fails, and expire after ``JOB_IMAGE_TTL_SECONDS`` in any case (e.g. for jobs
+that never run).
+
+All methods are coroutines on PyMongo's async API, so the pipeline and the
+``/books`` handlers never block the event loop on the database.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.mongodb import books_collection, book_images_collection, book_assets_collection
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_IMAGE_TTL_SECONDS = int(os.getenv("JOB_IMAGE_TTL_SECONDS", str(24 * 3600)))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _object_id(job_id: str) -> ObjectId:
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail="Book not found")
+
+
+class JobStore:
+    """MongoDB-backed store for book jobs and their input images.
+
+    Args:
+        collection: The ``books`` ``AsyncCollection``.
+        images_collection: Collection holding pre-processed input images,
+            keyed by job id and the SHA-256 of the original upload.
+        assets_collection: Collection holding generated page illustrations.
+    """
+
+    def __init__(self, collection, images_collection, assets_collection=None):
+        self.collection = collection
+        self.images_collection = images_collection
+        self.assets_collection = assets_collection
+
+    async def ensure_indexes(self) -> None:
+        """Create the indexes the store relies on."""
+        await self.collection.create_index("idempotency_key", unique=True, sparse=True)
+        await self.collection.create_index([("status", 1), ("created_at", 1)])
+        await self.images_collection.create_index([("job_id", 1), ("image_sha256", 1)], unique=True)
+        await self.images_collection.create_index("created_at", expireAfterSeconds=JOB_IMAGE_TTL_SECONDS)
+        if self.assets_collection is not None:
+            await self.assets_collection.create_index([("book_id", 1), ("kind", 1), ("page", 1)], unique=True)
+
+    async def find_by_idempotency_key(self, idempotency_key: str, owner_id: str) -> dict | None:
+        """Return ``owner_id``'s job created with ``idempotency_key``, or ``None``.
+
+        Raises:
+            HTTPException: 409 if another user's job holds the key.
+        """
+        job = await self.collection.find_one({"idempotency_key": idempotency_key})
+        if job is not None and job.get("owner_id") != owner_id:
+            raise HTTPException(status_code=409, detail="Conflicting idempotency key")
+        return job
+
+    async def create(
+        self,
+        request: dict,
+        owner_id: str,
+        idempotency_key: str | None = None,
+        job_id: ObjectId | None = None,
+    ) -> tuple[dict, bool]:
+        """Insert a new queued job, or return the one with the same idempotency key.
+
+        Args:
+            request: The validated book request.
+            owner_id: The submitting user's id; only they can read the job.
+            idempotency_key: The client's ``Idempotency-Key``, if any.
+            job_id: Id for the new job, when its images were saved under it
+                before the job was created.
+
+        Returns:
+            tuple[dict, bool]: The job document and whether it was created.
+
+        Raises:
+            HTTPException: 409 if another user's job holds the idempotency key.
+        """
+        now = _now()
+        job = {
+            "status": QUEUED,
+            "progress": 0.0,
+            "current_stage": None,
+            "stages": {},
+            "completed_stages": [],
+            "request": request,
+            "owner_id": owner_id,
+            "result": {},
+            "attempts": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "heartbeat_at": None,
+        }
+        if job_id is not None:
+            job["_id"] = job_id
+        if idempotency_key:
+            job["idempotency_key"] = idempotency_key
+        try:
+            result = await self.collection.insert_one(job)
+        except DuplicateKeyError:
+            existing = await self.find_by_idempotency_key(idempotency_key, owner_id)
+            if existing is None:
+                raise HTTPException(status_code=409, detail="Conflicting idempotency key")
+            return existing, False
+        except PyMongoError as e:
+            raise HTTPException(status_code=500, detail=f"MongoDB operation error: {str(e)}")
+        job["_id"] = result.inserted_id
+        return job, True
+
+    async def get(self, job_id: str, owner_id: str) -> dict:
+        """Return ``owner_id``'s job ``job_id``.
+
+        Raises:
+            HTTPException: 404 if it does not exist or belongs to another user.
+        """
+        job = await self.collection.find_one({"_id": _object_id(job_id), "owner_id": owner_id})
+        if job is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return job
+
+    async def claim(self, job_id: ObjectId, worker_id: str) -> dict | None:
+        """Atomically move a queued job to running; ``None`` if someone else has it."""
+        now = _now()
+        return await self.collection.find_one_and_update(
+            {"_id": job_id, "status": QUEUED},
+            {
+                "$set": {"status": RUNNING, "worker_id": worker_id, "heartbeat_at": now, "updated_at": now},
+                "$inc": {"attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def pending_ids(self) -> list[ObjectId]:
+        """Return the ids of queued jobs, oldest first."""
+        cursor = self.collection.find({"status": QUEUED}, {"_id": 1}).sort("created_at", 1)
+        return [doc["_id"] async for doc in cursor]
+
+    async def recover(self, lease_seconds: int = JOB_LEASE_SECONDS) -> int:
+        """Requeue running jobs whose worker stopped heartbeating.
+
+        Returns:
+            int: The number of jobs requeued.
+        """
+        cutoff = _now() - timedelta(seconds=lease_seconds)
+        result = await self.collection.update_many(
+            {"status": RUNNING, "heartbeat_at": {"$lt": cutoff}},
+            {"$set": {"status": QUEUED, "updated_at": _now()}},
+        )
+        return result.modified_count
+
+    async def heartbeat(self, job_id: ObjectId, worker_id: str) -> bool:
+        """Extend the lease on a running job; ``False`` if this worker lost it."""
+        now = _now()
+        result = await self.collection.update_one(
+            {"_id": job_id, "status": RUNNING, "worker_id": worker_id},
+            {"$set": {"heartbeat_at": now, "updated_at": now}},
+        )
+        return result.matched_count == 1
+
+    async def stage_started(self, job_id: ObjectId, stage: str) -> None:
+        now = _now()
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {
+                "current_stage": stage,
+                f"stages.{stage}.status": RUNNING,
+                f"stages.{stage}.started_at": now,
+                "heartbeat_at": now,
+                "updated_at": now,
+            }},
+        )
+
+    async def stage_finished(self, job_id: ObjectId, stage: str, output: dict, duration_ms: float, progress: float) -> None:
+        """Record a completed stage and merge its output into ``result``."""
+        now = _now()
+        update = {
+            f"stages.{stage}.status": SUCCEEDED,
+            f"stages.{stage}.finished_at": now,
+            f"stages.{stage}.duration_ms": round(duration_ms, 1),
+            "progress": progress,
+            "heartbeat_at": now,
+            "updated_at": now,
+        }
+        for key, value in output.items():
+            update[f"result.{key}"] = value
+        await self.collection.update_one({"_id": job_id}, {"$set": update, "$addToSet": {"completed_stages": stage}})
+
+    async def release(self, job_id: ObjectId) -> None:
+        """Return a running job to the queue (e.g. on shutdown)."""
+        await self.collection.update_one(
+            {"_id": job_id, "status": RUNNING},
+            {"$set": {"status": QUEUED, "current_stage": None, "updated_at": _now()}},
+        )
+
+    async def finish(self, job_id: ObjectId) -> None:
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {"status": SUCCEEDED, "current_stage": None, "progress": 1.0, "updated_at": _now()}},
+        )
+
+    async def fail(self, job_id: ObjectId, stage: str, error: str) -> None:
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {
+                "status": FAILED,
+                f"stages.{stage}.status": FAILED,
+                f"stages.{stage}.error": error,
+                "error": error,
+                "updated_at": _now(),
+            }},
+        )
+
+    async def save_image(self, job_id: ObjectId, image_hash: str, data: bytes, mime_type: str) -> None:
+        """Store a pre-processed input image of ``job_id`` (deduplicated by hash within the job)."""
+        await self.images_collection.update_one(
+            {"job_id": job_id, "image_sha256": image_hash},
+            {"$setOnInsert": {"data": data, "mime_type": mime_type, "created_at": _now()}},
+            upsert=True,
+        )
+
+    async def load_image(self, job_id: ObjectId, image_hash: str) -> bytes | None:
+        doc = await self.images_collection.find_one({"job_id": job_id, "image_sha256": image_hash})
+        return None if doc is None else doc["data"]
+
+    async def delete_images(self, job_id: ObjectId) -> None:
+        """Delete the input images of ``job_id``; other jobs' copies are kept."""
+        await self.images_collection.delete_many({"job_id": job_id})
+
+    async def record_preview(self, job_id: ObjectId, page: int, asset_id: str) -> None:
+        """Publish a page preview on the job before its render stage finishes."""
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {f"result.previews.{page}": asset_id, "updated_at": _now()}},
+        )
+
+    async def save_asset(self, book_id: ObjectId, kind: str, page: int, data: bytes, mime_type: str) -> str:
+        """Store (or replace) a page illustration; returns the asset id.
+
+        Assets are keyed on ``(book_id, kind, page)`` so re-running the render
+        stage after a restart overwrites instead of duplicating.
+        """
+        doc = await self.assets_collection.find_one_and_update(
+            {"book_id": book_id, "kind": kind, "page": page},
+            {"$set": {"data": data, "mime_type": mime_type, "created_at": _now()}},
+            upsert=True,
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return str(doc["_id"])
+
+
+def serialize_job(job: dict) -> dict:
+    """Return the public view of a job document."""
+    return {
+        "id": str(job["_id"]),
+        "status": job["status"],
+        "progress": job.get("progress", 0.0),
+        "current_stage": job.get("current_stage"),
+        "stages": job.get("stages", {}),
+        "result": job.get("result", {}),
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at"),
+    }
+
+
+job_store = JobStore(books_collection, book_images_collection, book_assets_collection)
@@ -0,0 +1,270 @@
+"""In-process book job pipeline.
+
+Jobs created by ``POST /books`` are executed by a small pool of asyncio
+workers running inside the web process. Each job runs the stages in
+:data:`STAGES` in order (extract -> plan -> render); after every stage its
+output, timing and the overall progress are persisted through the
+:class:`~app.services.book.job_store.JobStore`, so a restarted process
+resumes each job from its first unfinished stage.
+
+While a job runs its worker renews the lease every
+``JOB_HEARTBEAT_SECONDS``; every ``JOB_RECOVER_INTERVAL_SECONDS`` the pool
+requeues jobs whose lease expired (their worker died) and picks up queued
+jobs, including ones submitted to another process. Stages must therefore be
+safe to run again: each one writes its results idempotently.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable
+
+from app.models.character_schema import CharacterCreate, PersonMetadata
+from app.services.book.job_store import JobStore, job_store
+from app.services.book.illustration_scheduler import illustration_scheduler, PageResult, PREVIEW, FINAL
+from app.services.character.character_crud import create_characters
+from app.services.character.character_service import get_character_description_cached
+from app.services.http.admission import admission_controller
+
+logger = logging.getLogger(__name__)
+
+BOOK_WORKERS = int(os.getenv("BOOK_WORKERS", "2"))
+BOOK_RETAIN_IMAGES = os.getenv("BOOK_RETAIN_IMAGES", "0") == "1"
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_RECOVER_INTERVAL_SECONDS = float(os.getenv("JOB_RECOVER_INTERVAL_SECONDS", "60"))
+
+Stage = Callable[[dict, JobStore], Awaitable[dict]]
+
+
+async def extract_stage(job: dict, store: JobStore) -> dict:
+    """Describe every person in the book and save their characters.
+
+    The job was accepted (and charged) already, so its model calls take the
+    admission controller's priority path instead of competing with new
+    requests. Characters are upserted on ``(book_id, image_sha256)``, so a
+    job resumed after the insert but before the stage was recorded does not
+    save them twice. The job's input images are deleted once described
+    (README design decision 5) unless ``BOOK_RETAIN_IMAGES=1``.
+    """
+    request = job["request"]
+    hashes: list[str] = request["image_hashes"]
+    people = [PersonMetadata(**p) for p in request["people"]]
+
+    async def _describe(image_hash: str) -> CharacterCreate:
+        # A missing image is only fatal on a description cache miss.
+        data = await store.load_image(job["_id"], image_hash) or b""
+        async with admission_controller.slot(priority=True):
+            return CharacterCreate(**(await get_character_description_cached(data, image_hash)))
+
+    characters = await asyncio.gather(*[_describe(h) for h in hashes])
+    documents = await create_characters(list(characters), people, image_hashes=hashes, book_id=job["_id"])
+    if not BOOK_RETAIN_IMAGES:
+        await store.delete_images(job["_id"])
+    return {"character_ids": [d["_id"] for d in documents]}
+
+
+async def plan_stage(job: dict, store: JobStore) -> dict:
+    """Produce the page-by-page plan.
+
+    This is a template planner standing in for the Planner LLM: it emits one
+    entry per page with an image prompt built from the theme, style and
+    character names, so later stages have the right shape to work with.
+    """
+    request = job["request"]
+    num_pages = request["num_pages"]
+    names = ", ".join(p["name"] for p in request["people"])
+    pages = [
+        {
+            "page": number,
+            "text": "",
+            "image_prompt": f"{request['style']} children's book illustration about {request['theme']}, "
+                            f"featuring {names}, page {number} of {num_pages}",
+        }
+        for number in range(1, num_pages + 1)
+    ]
+    return {"pages": pages}
+
+
+async def render_stage(job: dict, store: JobStore) -> dict:
+    """Illustrate every page and assemble the book in page order.
+
+    Low-resolution previews are rendered first through the scheduler's
+    preview lane. Each one is stored and recorded under ``result.previews``
+    as soon as its page is done, so ``GET /books/{id}`` shows previews while
+    the rest of the book renders. A preview that fails is tolerated; a final
+    that fails every retry fails the stage.
+    """
+    book_id = job["_id"]
+    pages = job["result"].get("pages", [])
+    asset_ids: dict[str, dict[int, str]] = {PREVIEW: {}, FINAL: {}}
+
+    async def _store(lane: str, result: PageResult) -> None:
+        if result.image is None:
+            return
+        asset_id = await store.save_asset(book_id, lane, result.page, result.image, result.mime_type)
+        asset_ids[lane][result.page] = asset_id
+        if lane == PREVIEW:
+            await store.record_preview(book_id, result.page, asset_id)
+
+    assets: dict[str, list] = {}
+    for lane in (PREVIEW, FINAL):
+        results = await illustration_scheduler.render_pages(
+            str(book_id), pages, lane=lane, on_page=lambda r, lane=lane: _store(lane, r)
+        )
+        failed = [r for r in results if r.image is None]
+        if lane == FINAL and failed:
+            raise RuntimeError(f"Illustration failed for pages {[r.page for r in failed]}: {failed[0].error}")
+        assets[lane] = [{"page": r.page, "asset_id": asset_ids[lane].get(r.page)} for r in results]
+    return {"book": {"pages": [p["page"] for p in sorted(pages, key=lambda p: p["page"])], "assets": assets}}
+
+
+STAGES: list[tuple[str, Stage]] = [
+    ("extract", extract_stage),
+    ("plan", plan_stage),
+    ("render", render_stage),
+]
+
+
+class JobWorkerPool:
+    """Run queued book jobs on a fixed number of asyncio workers.
+
+    Args:
+        store: Where job state is persisted.
+        stages: ``(name, coroutine function)`` pairs run in order.
+        workers: Number of concurrent jobs per process.
+    """
+
+    def __init__(self, store: JobStore, stages: list[tuple[str, Stage]] = STAGES, workers: int = BOOK_WORKERS):
+        self.store = store
+        self.stages = stages
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # Jobs submitted before start() (e.g. while the storage bootstrap is
+        # still retrying) wait here and are carried over when it runs.
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._scheduled: set = set()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Requeue abandoned jobs, enqueue pending ones and start the workers.
+
+        Safe to call again after a failure; nothing is started until
+        recovery succeeds.
+        """
+        # A queue binds to the loop that first waits on it, so each start
+        # gets a fresh one holding whatever was submitted so far.
+        backlog = []
+        while not self._queue.empty():
+            backlog.append(self._queue.get_nowait())
+        self._queue = asyncio.Queue()
+        for job_id in backlog:
+            self._queue.put_nowait(job_id)
+        await self.recover()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"book-worker-{i}") for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover_loop(), name="book-recover"))
+
+    async def recover(self) -> None:
+        """Requeue jobs with an expired lease and schedule every queued job."""
+        requeued = await self.store.recover()
+        if requeued:
+            logger.info("requeued %d abandoned book jobs", requeued)
+        for job_id in await self.store.pending_ids():
+            self.submit(job_id)
+
+    async def _recover_loop(self) -> None:
+        while True:
+            await asyncio.sleep(JOB_RECOVER_INTERVAL_SECONDS)
+            try:
+                await self.recover()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("book job recovery failed")
+
+    async def stop(self) -> None:
+        """Cancel the workers; in-flight jobs are returned to the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id) -> None:
+        """Schedule ``job_id`` on this process' workers (once, however often it is submitted).
+
+        Before :meth:`start` the job is queued and runs once the workers start.
+        """
+        if job_id in self._scheduled:
+            return
+        if not self._tasks:
+            logger.info("book job %s queued until the worker pool starts", job_id)
+        self._scheduled.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._scheduled.discard(job_id)
+            try:
+                await self.run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("book job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await self.store.heartbeat(job_id, self.worker_id):
+                    logger.warning("book job %s: lease lost", job_id)
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("book job %s: heartbeat failed: %s", job_id, e)
+
+    async def run_job(self, job_id) -> None:
+        """Claim ``job_id`` and run its unfinished stages, renewing its lease meanwhile."""
+        job = await self.store.claim(job_id, self.worker_id)
+        if job is None:
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id), name=f"book-heartbeat-{job_id}")
+        try:
+            await self._run_stages(job_id, job)
+        finally:
+            heartbeat.cancel()
+
+    async def _run_stages(self, job_id, job: dict) -> None:
+        completed = set(job.get("completed_stages", []))
+        job.setdefault("result", {})
+        total = len(self.stages)
+        for index, (name, stage) in enumerate(self.stages):
+            if name in completed:
+                continue
+            await self.store.stage_started(job_id, name)
+            started = time.perf_counter()
+            try:
+                output = await stage(job, self.store)
+            except asyncio.CancelledError:
+                await self.store.release(job_id)
+                raise
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                logger.warning("book job %s failed in stage %s: %s", job_id, name, detail)
+                await self.store.fail(job_id, name, str(detail))
+                if not BOOK_RETAIN_IMAGES:
+                    # A failed job is not retried; its photos must not outlive it.
+                    await self.store.delete_images(job_id)
+                return
+            duration_ms = (time.perf_counter() - started) * 1000
+            await self.store.stage_finished(job_id, name, output, duration_ms, (index + 1) / total)
+            job["result"].update(output)
+        await self.store.finish(job_id)
+
+
+job_pool = JobWorkerPool(job_store)
@@ -1,30 +1,236 @@
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import Any
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from app.models.character_schema import CharacterCreate, PersonMetadata
+from app.services.character.compact_storage import expand_document, storage_document, storage_projection
+from app.services.repository.repositories import character_repository
 
+# Fields a client may project on reads: the description sections plus the
+# bookkeeping fields stored alongside them.
+READABLE_FIELDS = tuple(CharacterCreate.model_fields) + ("person", "image_sha256", "owner_id", "book_id", "created_at")
+# List views default to what a picker shows; a single read returns everything.
+LIST_DEFAULT_FIELDS = ("meta", "general", "person", "created_at")
+MAX_PAGE_SIZE = 100
 
-from fastapi import HTTPException
-from app.models.character_schema import CharacterCreate
-from app.mongodb import characters_collection
+
+def _stamp(character_dict: dict, image_hash: str | None, owner_id: str | None) -> dict:
+    """
+    Adds the indexed bookkeeping fields (see ``repository.indexes``).
+    """
+    character_dict["created_at"] = datetime.now(timezone.utc)
+    if image_hash is not None:
+        character_dict["image_sha256"] = image_hash
+    if owner_id is not None:
+        character_dict["owner_id"] = owner_id
+    return character_dict
 
 
-def create_character(character_data: CharacterCreate) -> dict:
+async def create_character(character_data: CharacterCreate, image_hash: str | None = None, owner_id: str | None = None) -> dict:
     """
     Insert a new character document into MongoDB.
 
     Args:
         character_data (CharacterCreate): Data for the new character.
+        image_hash (str | None): SHA-256 of the source photo.
+        owner_id (str | None): Id of the owning user, when the request was
+            authenticated.
 
     Returns:
         dict: The inserted character document (with _id).
 
+    Raises:
+        HTTPException: If the database operation fails (see
+            :func:`app.services.repository.repositories.db_errors`).
+    """
+    character_dict = _stamp(character_data.model_dump(exclude_unset=True), image_hash, owner_id)
+    character_dict["_id"] = await character_repository.insert(storage_document(character_dict))
+    return character_dict
+
+
+async def create_characters(
+    characters: list[CharacterCreate],
+    people: list[PersonMetadata] | None = None,
+    image_hashes: list[str] | None = None,
+    owner_id: str | None = None,
+    book_id: Any = None,
+) -> list[dict]:
+    """
+    Insert several character documents into MongoDB with a single insert_many.
+
+    Characters extracted for a book are upserted on ``(book_id,
+    image_sha256)`` instead, so re-running a book's extract stage returns
+    the characters saved the first time rather than inserting them again.
+
+    Args:
+        characters (list[CharacterCreate]): Data for the new characters.
+        people (list[PersonMetadata] | None): Optional per-person metadata,
+            aligned with ``characters`` and stored under ``person``.
+        image_hashes (list[str] | None): SHA-256 of each source photo,
+            aligned with ``characters``.
+        owner_id (str | None): Id of the owning user.
+        book_id (Any): Id of the book job the characters belong to; requires
+            ``image_hashes``.
+
+    Returns:
+        list[dict]: The inserted character documents (with _id), in input order.
+
     Raises:
         HTTPException: If the database operation fails.
     """
-    from pymongo.errors import PyMongoError
+    hashes = image_hashes or [None] * len(characters)
+    character_dicts = [_stamp(c.model_dump(exclude_unset=True), h, owner_id) for c, h in zip(characters, hashes)]
+    if people is not None:
+        for character_dict, person in zip(character_dicts, people):
+            character_dict["person"] = person.model_dump()
+    if book_id is not None:
+        for character_dict in character_dicts:
+            character_dict["book_id"] = book_id
+        inserted_ids = await character_repository.upsert_many(
+            [storage_document(d) for d in character_dicts], keys=("book_id", "image_sha256")
+        )
+    else:
+        inserted_ids = await character_repository.insert_many([storage_document(d) for d in character_dicts])
+    for character_dict, inserted_id in zip(character_dicts, inserted_ids):
+        character_dict["_id"] = inserted_id
+    return character_dicts
+
+
+def parse_fields(fields: str | None, default: tuple[str, ...] | None) -> dict[str, int] | None:
+    """
+    Turns a comma-separated ``fields`` query value into a Mongo projection.
+
+    Args:
+        fields (str | None): e.g. ``"meta,general"``; ``"*"`` for everything.
+        default (tuple[str, ...] | None): Fields used when ``fields`` is
+            empty; ``None`` means everything.
+
+    Returns:
+        dict[str, int] | None: The projection, or ``None`` for all fields.
+
+    Raises:
+        HTTPException: 422 for unknown field names.
+    """
+    if fields is not None and fields.strip() == "*":
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(default or ())
+    if not names:
+        return None
+    unknown = [n for n in names if n not in READABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields {unknown}; allowed: {list(READABLE_FIELDS)}")
+    return {n: 1 for n in names}
+
+
+def encode_cursor(character_id: ObjectId) -> str:
+    """
+    Encodes the last ``_id`` of a page as an opaque cursor.
+    """
+    return base64.urlsafe_b64encode(character_id.binary).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    """
+    Decodes a cursor produced by :func:`encode_cursor`.
+
+    Raises:
+        HTTPException: 422 if the cursor is malformed.
+    """
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+
+def serialize_character(document: dict[str, Any]) -> dict[str, Any]:
+    """
+    Returns the public, JSON-ready view of a stored character document.
+
+    Expects an expanded document (see ``compact_storage``). Only the
+    bookkeeping fields need converting (``_id``, ``created_at``);
+    the description sections are already plain JSON, so they are passed
+    through as stored instead of being re-validated by ``CharacterCreate``.
+    """
+    document = dict(document)
+    document["_id"] = str(document["_id"])
+    created_at = document.get("created_at")
+    if isinstance(created_at, datetime):
+        document["created_at"] = created_at.isoformat()
+    return document
+
+
+async def get_character(character_id: str, owner_id: str, fields: str | None = None) -> dict:
+    """
+    Reads one of a user's characters.
+
+    Args:
+        character_id (str): The character's ``_id``.
+        owner_id (str): The caller's user id; other users' characters are
+            reported as missing.
+        fields (str | None): Comma-separated fields to return (default: all).
+
+    Returns:
+        dict: The serialized character.
+
+    Raises:
+        HTTPException: 404 if it does not exist or belongs to someone else,
+            422 for unknown fields.
+    """
+    projection = parse_fields(fields, None)
     try:
-        character_dict = character_data.model_dump(exclude_unset=True)
-        result = characters_collection.insert_one(character_dict)
-        character_dict["_id"] = str(result.inserted_id)
-        return character_dict
-    except PyMongoError as e:
-        raise HTTPException(status_code=500, detail=f"MongoDB operation error: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Unexpected MongoDB error: {str(e)}")
+        oid = ObjectId(character_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail="Character not found")
+    document = await character_repository.get(oid, owner_id, storage_projection(projection))
+    if document is None:
+        raise HTTPException(status_code=404, detail="Character not found")
+    return serialize_character(expand_document(document))
+
+
+async def list_characters(
+    owner_id: str,
+    fields: str | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+    image_sha256: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+) -> dict:
+    """
+    Lists a user's characters newest first, one keyset page at a time.
+
+    Filters only use indexed fields (see ``repository.indexes``).
+
+    Args:
+        owner_id (str): Only characters of this user.
+        fields (str | None): Comma-separated fields to return (default:
+            ``LIST_DEFAULT_FIELDS``; ``"*"`` for all).
+        cursor (str | None): ``next_cursor`` of the previous page.
+        limit (int): Page size, at most ``MAX_PAGE_SIZE``.
+        image_sha256 (str | None): Only characters extracted from this photo.
+        created_after (datetime | None): Only characters created at or after.
+        created_before (datetime | None): Only characters created before.
+
+    Returns:
+        dict: ``items`` and ``next_cursor`` (``None`` on the last page).
+    """
+    projection = parse_fields(fields, LIST_DEFAULT_FIELDS)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query: dict[str, Any] = {"owner_id": owner_id}
+    if image_sha256 is not None:
+        query["image_sha256"] = image_sha256
+    created: dict[str, datetime] = {}
+    if created_after is not None:
+        created["$gte"] = created_after
+    if created_before is not None:
+        created["$lt"] = created_before
+    if created:
+        query["created_at"] = created
+    before_id = decode_cursor(cursor) if cursor else None
+    # One extra document tells whether another page exists.
+    documents = await character_repository.find_page(query, storage_projection(projection), before_id, limit + 1)
+    next_cursor = encode_cursor(documents[limit - 1]["_id"]) if len(documents) > limit else None
+    return {"items": [serialize_character(expand_document(d)) for d in documents[:limit]], "next_cursor": next_cursor}
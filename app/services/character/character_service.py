@@ -1,123 +1,232 @@
-from app.services.gemini.client import generate_text_from_image
+from app.services.gemini.client import generate_text_from_image_async, stream_text_from_image_async
 from fastapi import HTTPException
 import json
-from app.services.toon.toon_service import json_to_toon, toon_to_json
-import re
 import os
+from typing import Any, AsyncIterator, BinaryIO
+from pydantic import TypeAdapter, ValidationError
+from app.models.character_schema import PersonMetadata
+from app.services.toon.toon_service import ToonSectionAssembler, ToonStreamParser
+from app.services.prompts.prompt_registry import prompt_registry
+from app.services.image.preprocess import preprocess_image_async
+from app.services.character.description_cache import description_cache, cache_key
+from app.services.character.schema_validator import validator_registry
+from app.services.character.response_parser import parse_character_response
+from app.services.observability.timing import span
 
+# README section 2: up to 4 photos per book, at most 2 adults and 2 children.
+MAX_BATCH_PEOPLE = 4
+MAX_PER_ROLE = 2
+# Lines of prose a streamed TOON response may open with before its first
+# section; more than that and the output is treated as off-format.
+CHARACTER_STREAM_MAX_PREFACE = int(os.getenv("CHARACTER_STREAM_MAX_PREFACE", "3"))
 
-def get_character_description(image_file: bytes) -> dict:
+EXPECTED_KEYS = {
+    "meta",
+    "general",
+    "head",
+    "hair",
+    "skin",
+    "face",
+    "measurements_and_proportions",
+    "pose_and_landmarks",
+    "clothing_and_accessories",
+    "annotations",
+}
+
+
+async def get_character_description(image_file: bytes | BinaryIO) -> dict:
     """
     Gets a character description from an image using the Gemini API.
 
+    The upload is first oriented, downscaled and stripped of metadata in the
+    pre-processing worker pool. The model call is awaited on the async client,
+    so the event loop is never blocked for the duration of the round trip.
+
     Args:
-        image_file (bytes): The image file to analyze.
+        image_file (bytes | BinaryIO): The image to analyze, as bytes or a
+            seekable file such as a spooled upload.
 
     Returns:
         dict: The JSON response from Gemini.
     """
-    # Load the system prompt template and the canonical JSON schema. We'll
-    # include the schema converted to TOON in the system message to save
-    # tokens on both input and output.
-    prompt_template = ""
-    try:
-        with open("app/system_messages/character_prompt.txt", "r") as f:
-            prompt_template = f.read()
-    except Exception:
-        prompt_template = "You are an advanced AI model tasked with analyzing images of individuals. Respond in TOON format."
-
-    # Replace any {{TOON:<filename>}} placeholders in the template by loading
-    # the corresponding JSON file from app/json_schemas and converting it to
-    # TOON. This keeps the system message template small and allows schema
-    # edits in one place.
-    def _replace_toon_placeholders(template: str) -> str:
-        """Replace any {{TOON:<filename>}} placeholders with raw TOON strings.
-
-        The function loads the referenced JSON file from ``app/json_schemas``
-        and converts it to TOON using the canonical TOON service. If a
-        schema file cannot be loaded it emits an empty string for that
-        placeholder so the caller can still proceed.
-
-        Args:
-            template: The prompt template containing {{TOON:...}} markers.
-
-        Returns:
-            The template with placeholders replaced by TOON strings.
-        """
-        def _loader(match):
-            fname = match.group(1).strip()
-            schema_path = os.path.join("app", "json_schemas", fname)
-            try:
-                with open(schema_path, "r") as sf:
-                    obj = json.load(sf)
-                return json_to_toon(obj)
-            except Exception:
-                # If the schema file isn't available, replace with an empty
-                # placeholder but keep going — the caller may still proceed.
-                return ""
-
-        return re.sub(r"\{\{TOON:([^}]+)\}\}", _loader, template)
-
-    processed_template = _replace_toon_placeholders(prompt_template)
-
-    # Split the processed template into header (system message) and prompt
-    # (the user prompt) by looking for 'PROMPT:'. If not present, fall back
-    # to defaults.
-    if "PROMPT:" in processed_template:
-        header, after = processed_template.split("PROMPT:", 1)
-        system_message = header.strip()
-        prompt_body = after.strip()
-    else:
-        system_message = processed_template.strip()
-        prompt_body = "Analyze the provided image and extract the details about the person, responding ONLY in TOON format."
-
-    # Ask the model to reply in TOON and send the schema as a system message
-    prompt = prompt_body + "\n\nRespond ONLY in TOON format (compact key=value pairs, use `|` or newlines to separate)."
+    # The system message (with the schema converted to TOON) and the user
+    # prompt are compiled once by the prompt registry and reused here.
+    with span("prompt"):
+        compiled = prompt_registry.get("character")
+
+    prepared = await preprocess_image_async(image_file)
 
     try:
-        response_text = generate_text_from_image(prompt, image_file, system_message=system_message)
-        # The model may return fenced code blocks or either JSON or TOON.
-        response_text = response_text.strip()
-
-        # Try JSON first
-        try:
-            # strip possible fences
-            cleaned = response_text.replace("```json", "").replace("```", "").strip()
-            return json.loads(cleaned)
-        except Exception:
-            # Try to extract an embedded JSON block from the response
-            try:
-                start = response_text.find("{")
-                end = response_text.rfind("}")
-                if start != -1 and end != -1 and end > start:
-                    candidate = response_text[start:end+1]
-                    return json.loads(candidate)
-            except Exception:
-                pass
-
-            # Attempt to parse TOON; if it doesn't produce expected structured keys,
-            # raise an error to make the failure explicit.
-            try:
-                parsed = toon_to_json(response_text)
-                # basic validation: expect at least one of the top-level character keys
-                expected_keys = {
-                    "meta",
-                    "general",
-                    "head",
-                    "hair",
-                    "skin",
-                    "face",
-                    "measurements_and_proportions",
-                    "pose_and_landmarks",
-                    "clothing_and_accessories",
-                    "annotations",
-                }
-                if not expected_keys.intersection(parsed.keys()):
-                    raise ValueError("Parsed TOON does not contain expected character keys")
-                return parsed
-            except Exception as e2:
-                raise HTTPException(status_code=500, detail=f"Error parsing model response: {str(e2)}; raw={response_text}")
+        with span("model"):
+            response_text = await generate_text_from_image_async(compiled.prompt, prepared.data, system_message=compiled.system_message)
+        with span("parse"):
+            return parse_character_response(response_text)
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing response from Gemini: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error processing response from Gemini: {str(e)}")
+
+
+def _detect_response_format(head: str) -> str | None:
+    """
+    Decides from the start of a response whether it is JSON or TOON.
+
+    Returns ``None`` while there is not enough text to tell (only whitespace
+    or an unfinished code fence line).
+    """
+    head = head.lstrip()
+    if head.startswith("```"):
+        newline = head.find("\n")
+        if newline == -1:
+            return None
+        head = head[newline + 1:].lstrip()
+    if not head:
+        return None
+    return "json" if head[0] == "{" else "toon"
+
+
+async def stream_character_description(image_file: bytes | BinaryIO) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Streams a character description section by section as the model writes it.
+
+    TOON output is parsed incrementally and each top-level key (``meta``,
+    ``general``, ``head``, ...) is yielded as soon as its value is complete;
+    sections written as dotted paths (``meta.view=front``) are regrouped and
+    yielded once the next section starts.
+    A short preface before the first section (``Here is the description:``)
+    is skipped; if more than ``CHARACTER_STREAM_MAX_PREFACE`` lines come
+    before any section the output is off-format, so the generation is
+    abandoned instead of paid for in full.
+    Each section is validated against its part of ``character.json`` before
+    it is yielded; sections that cannot be repaired are skipped. JSON output
+    cannot be split safely mid-stream and is yielded once the response is
+    complete, through the regular parse chain.
+
+    Args:
+        image_file (bytes | BinaryIO): The image to analyze.
+
+    Yields:
+        tuple[str, Any]: ``(section, value)`` pairs.
+
+    Raises:
+        HTTPException: 502 if the output is off-format, or the errors of
+            :func:`parse_character_response`.
+    """
+    compiled = prompt_registry.get("character")
+    prepared = await preprocess_image_async(image_file)
+
+    validator = validator_registry.get()
+    parser = ToonStreamParser(expected_keys=EXPECTED_KEYS)
+    sections = ToonSectionAssembler()
+    parts: list[str] = []
+    response_format = None
+    emitted = False
+    stream = stream_text_from_image_async(compiled.prompt, prepared.data, system_message=compiled.system_message)
+    try:
+        async for chunk in stream:
+            parts.append(chunk)
+            if response_format is None:
+                response_format = _detect_response_format("".join(parts))
+                if response_format is None:
+                    continue
+                chunk = "".join(parts)
+            if response_format != "toon":
+                continue
+            completed = parser.feed(chunk)
+            if not emitted and not completed and parser.skipped > CHARACTER_STREAM_MAX_PREFACE:
+                raise HTTPException(status_code=502, detail="Model output is off-format (no character section); generation aborted")
+            emitted = emitted or bool(completed)
+            for key, value in sections.add(completed):
+                value, _ = validator.validate_section(key, value)
+                if value is not None:
+                    yield key, value
+        if response_format == "toon":
+            completed = parser.close()
+            emitted = emitted or bool(completed)
+            for key, value in sections.add(completed) + sections.close():
+                value, _ = validator.validate_section(key, value)
+                if value is not None:
+                    yield key, value
+        if not emitted:
+            for key, value in parse_character_response("".join(parts)).items():
+                yield key, value
+    finally:
+        await stream.aclose()
+
+
+async def get_cached_description(image_hash: str) -> dict | None:
+    """
+    Returns the cached description for an image under the current prompt version.
+
+    Args:
+        image_hash (str): Hex SHA-256 of the raw image bytes.
+
+    Returns:
+        dict | None: The cached description, or ``None`` on a miss.
+    """
+    return await description_cache.get(cache_key(image_hash, prompt_registry.get("character").version))
+
+
+async def store_description(image_hash: str, description: dict) -> None:
+    """
+    Caches a description for an image under the current prompt version.
+
+    Args:
+        image_hash (str): Hex SHA-256 of the raw image bytes.
+        description (dict): The character description.
+    """
+    await description_cache.set(cache_key(image_hash, prompt_registry.get("character").version), description)
+
+
+async def get_character_description_cached(image_file: bytes | BinaryIO, image_hash: str) -> dict:
+    """
+    Gets a character description, reusing a cached one for the same image.
+
+    Descriptions are cached by image hash and prompt version; when the same
+    photo was already described, the model call is skipped.
+
+    Args:
+        image_file (bytes | BinaryIO): The image to analyze.
+        image_hash (str): Hex SHA-256 of the raw image bytes.
+
+    Returns:
+        dict: The character description.
+    """
+    with span("cache_lookup"):
+        description = await get_cached_description(image_hash)
+    if description is None:
+        description = await get_character_description(image_file)
+        await store_description(image_hash, description)
+    return description
+
+
+_people_adapter = TypeAdapter(list[PersonMetadata])
+
+
+def parse_people_metadata(raw: str | None, file_count: int) -> list[PersonMetadata]:
+    """
+    Validates a JSON array of per-person metadata against the uploaded files.
+
+    Args:
+        raw (str | None): The JSON array sent by the client.
+        file_count (int): Number of photos the metadata must describe.
+
+    Returns:
+        list[PersonMetadata]: One entry per photo, in upload order.
+
+    Raises:
+        HTTPException: 422 if the metadata is malformed, does not match the
+            number of files, or exceeds the per-role limits.
+    """
+    if file_count == 0:
+        raise HTTPException(status_code=422, detail="At least one file is required")
+    try:
+        people = _people_adapter.validate_python(json.loads(raw or "[]"))
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid people metadata: {e}")
+    if len(people) != file_count:
+        raise HTTPException(status_code=422, detail=f"Got {file_count} files but metadata for {len(people)} people")
+    for role in ("adult", "child"):
+        if sum(p.role == role for p in people) > MAX_PER_ROLE:
+            raise HTTPException(status_code=422, detail=f"At most {MAX_PER_ROLE} people with role {role!r} are allowed")
+    return people
@@ -0,0 +1,274 @@
+"""Compact storage encoding for character documents.
+
+A stored description repeats every schema key, the ``null`` of every field
+the model could not see, and values equal to the schema default (e.g.
+``general.view: "front"``). Documents are therefore written in a versioned
+compact form:
+
+- ``null`` values and values equal to the ``character.json`` default are
+  dropped inside description sections;
+- rarely queried sections (``CHARACTER_COMPRESSED_SECTIONS``, by default
+  ``pose_and_landmarks`` and ``annotations``) are stored as zlib-compressed
+  JSON under ``_z.<section>``;
+- ``_v`` records the encoding version and ``_s`` the version (content
+  hash) of the schema the document was compacted with.
+
+:func:`expand_document` reverses this on read against that same schema
+(see ``ValidatorRegistry.schema``), so changing a default in
+``character.json`` does not change what older documents read back as:
+defaults come back, and nullable schema properties missing from a present
+object come back as ``null``. Version 1 documents, written before ``_s``
+existed, are expanded against the current schema. Bookkeeping fields (``_id``, ``person``, ``image_sha256``,
+``owner_id``, ``created_at``) are never touched, so filters and indexes work
+on compact documents as before. Documents without ``_v`` are returned as
+stored.
+
+Migrating existing documents and measuring the effect::
+
+    python -m app.services.character.compact_storage migrate [--dry-run]
+    python -m app.services.character.compact_storage report [--sample N]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import zlib
+from typing import Any
+
+import bson
+from bson import Binary
+
+from app.services.character.schema_validator import schema_version, validator_registry
+
+logger = logging.getLogger(__name__)
+
+STORAGE_VERSION = 2
+CHARACTER_COMPACT_STORAGE = os.getenv("CHARACTER_COMPACT_STORAGE", "1") == "1"
+CHARACTER_COMPRESSED_SECTIONS = tuple(
+    s.strip() for s in os.getenv("CHARACTER_COMPRESSED_SECTIONS", "pose_and_landmarks,annotations").split(",") if s.strip()
+)
+CHARACTER_COMPRESS_LEVEL = int(os.getenv("CHARACTER_COMPRESS_LEVEL", "6"))
+
+_MISSING = object()
+
+
+def _nullable(schema: dict) -> bool:
+    types = schema.get("type")
+    return types == "null" or (isinstance(types, list) and "null" in types)
+
+
+def _strip(value: Any, schema: dict) -> Any:
+    """Drop nulls and default values from ``value`` (recursively)."""
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        stripped = {}
+        for key, item in value.items():
+            sub = properties.get(key, {})
+            if item is None or ("default" in sub and item == sub["default"]):
+                continue
+            stripped[key] = _strip(item, sub)
+        return stripped
+    if isinstance(value, list):
+        items = schema.get("items", {})
+        return [_strip(item, items) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+def _restore(value: Any, schema: dict) -> Any:
+    """Put back the defaults and nulls that :func:`_strip` removed."""
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        restored = {key: _restore(item, properties.get(key, {})) for key, item in value.items()}
+        for key, sub in properties.items():
+            if key in restored:
+                continue
+            if "default" in sub:
+                restored[key] = sub["default"]
+            elif _nullable(sub):
+                restored[key] = None
+        return restored
+    if isinstance(value, list):
+        items = schema.get("items", {})
+        return [_restore(item, items) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+def _current_schema() -> dict:
+    return validator_registry.get().schema
+
+
+def compact_document(
+    document: dict[str, Any],
+    schema: dict | None = None,
+    compressed: tuple[str, ...] = CHARACTER_COMPRESSED_SECTIONS,
+) -> dict[str, Any]:
+    """Return the compact storage form of a character document.
+
+    Args:
+        document: The full document (sections plus bookkeeping fields).
+        schema: The character schema; the current one by default.
+        compressed: Sections to store compressed.
+    """
+    if schema is None:
+        schema = _current_schema()
+    sections = schema.get("properties", {})
+    compact: dict[str, Any] = {}
+    packed: dict[str, Binary] = {}
+    for key, value in document.items():
+        if key not in sections:
+            compact[key] = value
+            continue
+        if value is None:
+            continue
+        value = _strip(value, sections[key])
+        if key in compressed:
+            raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            packed[key] = Binary(zlib.compress(raw, CHARACTER_COMPRESS_LEVEL))
+        else:
+            compact[key] = value
+    if packed:
+        compact["_z"] = packed
+    compact["_v"] = STORAGE_VERSION
+    compact["_s"] = schema_version(schema)
+    return compact
+
+
+def expand_document(document: dict[str, Any], schema: dict | None = None) -> dict[str, Any]:
+    """Return the full form of a stored document (no-op for legacy documents).
+
+    Args:
+        document: The stored document.
+        schema: Expand against this schema instead of the one recorded in
+            the document's ``_s``.
+    """
+    if "_v" not in document:
+        return document
+    expanded = {k: v for k, v in document.items() if k not in ("_v", "_s", "_z")}
+    for key, blob in (document.get("_z") or {}).items():
+        expanded[key] = json.loads(zlib.decompress(bytes(blob)).decode("utf-8"))
+    if schema is None:
+        version = document.get("_s")
+        schema = validator_registry.schema(version) if version else _current_schema()
+        if schema is None:
+            # Restoring against another schema would invent defaults; return
+            # the sections as stored instead.
+            logger.warning("character %s uses unknown schema %s; defaults not restored", document.get("_id"), version)
+            return expanded
+    sections = schema.get("properties", {})
+    for key, value in expanded.items():
+        if key in sections:
+            expanded[key] = _restore(value, sections[key])
+    return expanded
+
+
+def storage_document(document: dict[str, Any]) -> dict[str, Any]:
+    """The form in which ``document`` is written, per ``CHARACTER_COMPACT_STORAGE``."""
+    return compact_document(document) if CHARACTER_COMPACT_STORAGE else document
+
+
+def storage_projection(projection: dict[str, int] | None) -> dict[str, int] | None:
+    """Rewrite a read projection so compressed sections are fetched too."""
+    if not projection:
+        return projection
+    mapped = dict(projection, _v=1, _s=1)
+    for key in projection:
+        if key in CHARACTER_COMPRESSED_SECTIONS:
+            mapped[f"_z.{key}"] = 1
+    return mapped
+
+
+def migrate(collection, batch_size: int = 500, dry_run: bool = False) -> dict[str, int]:
+    """Rewrite every document that is not yet in the current encoding.
+
+    Replacements are conditional on the document still being unconverted, so
+    the command can run next to live traffic and be resumed after a crash.
+
+    Args:
+        collection: The sync ``characters`` collection.
+        batch_size: Documents per ``bulk_write``.
+        dry_run: Only count and measure.
+
+    Returns:
+        ``documents``, ``bytes_before`` and ``bytes_after`` (BSON sizes).
+    """
+    from pymongo import ReplaceOne
+
+    totals = {"documents": 0, "bytes_before": 0, "bytes_after": 0}
+    pending: list = []
+    query = {"$or": [{"_v": {"$exists": False}}, {"_v": {"$lt": STORAGE_VERSION}}]}
+    for document in collection.find(query, batch_size=batch_size):
+        compact = compact_document(expand_document(document))
+        totals["documents"] += 1
+        totals["bytes_before"] += len(bson.encode(document))
+        totals["bytes_after"] += len(bson.encode(compact))
+        pending.append(ReplaceOne({"_id": document["_id"], "_v": document.get("_v", {"$exists": False})}, compact))
+        if len(pending) >= batch_size:
+            if not dry_run:
+                collection.bulk_write(pending, ordered=False)
+            pending = []
+    if pending and not dry_run:
+        collection.bulk_write(pending, ordered=False)
+    logger.info("compact storage migration: %s", totals)
+    return totals
+
+
+def size_report(collection, sample: int = 200) -> dict[str, Any]:
+    """Collection storage stats plus a sampled compact-vs-full comparison.
+
+    Args:
+        collection: The sync ``characters`` collection.
+        sample: Number of random documents to measure.
+    """
+    stats = collection.database.command("collStats", collection.name)
+    report: dict[str, Any] = {
+        "count": stats.get("count", 0),
+        "size_bytes": stats.get("size", 0),
+        "avg_obj_size_bytes": stats.get("avgObjSize", 0),
+        "storage_size_bytes": stats.get("storageSize", 0),
+        "total_index_size_bytes": stats.get("totalIndexSize", 0),
+        "compact_documents": collection.count_documents({"_v": STORAGE_VERSION}),
+    }
+    full = compact = 0
+    measured = 0
+    for document in collection.aggregate([{"$sample": {"size": sample}}]):
+        expanded = expand_document(document)
+        full += len(bson.encode(expanded))
+        compact += len(bson.encode(compact_document(expanded)))
+        measured += 1
+    report["sample"] = {
+        "documents": measured,
+        "avg_full_bytes": full / measured if measured else 0,
+        "avg_compact_bytes": compact / measured if measured else 0,
+        "ratio": compact / full if full else 0,
+    }
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.mongodb import mongo
+
+    parser = argparse.ArgumentParser(description="Compact storage for character documents.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="convert existing documents")
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    migrate_parser.add_argument("--dry-run", action="store_true")
+    report_parser = commands.add_parser("report", help="print storage sizes")
+    report_parser.add_argument("--sample", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    collection = mongo.collection("characters")
+    try:
+        if args.command == "migrate":
+            result = migrate(collection, args.batch_size, args.dry_run)
+        else:
+            result = size_report(collection, args.sample)
+    finally:
+        mongo.close()
+    print(json.dumps(result, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,160 @@
+"""Content-addressed cache for character descriptions.
+
+Implements design decision 6 ("Cache Character JSON") from the README. The
+same photo is often uploaded several times (retries, new books for the same
+kids, edits), and every upload would otherwise pay for a full model call.
+
+Entries are keyed on the SHA-256 of the image bytes plus the compiled
+prompt/schema version, so editing the prompt or ``character.json``
+naturally invalidates older descriptions. Lookups go through two tiers:
+
+1. an in-process LRU with TTL eviction (``cachetools.TTLCache``), and
+2. a persistent MongoDB collection with a TTL index on ``created_at``.
+
+Each tier tracks per-entry hit counters; in memory the counter lives in the
+cache entry, so it is evicted with it. The persistent tier is read and
+written through the async client, bounded by ``CHARACTER_CACHE_TIMEOUT_MS``,
+so a slow or unreachable database never blocks the event loop or delays a
+request by more than that. MongoDB errors never fail a request: the cache
+simply behaves as a miss.
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import pymongo
+from cachetools import TTLCache
+from pymongo.errors import PyMongoError
+
+from app.mongodb import LazyCollection, mongo
+
+logger = logging.getLogger(__name__)
+
+CHARACTER_CACHE_TTL_SECONDS = int(os.getenv("CHARACTER_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CHARACTER_CACHE_MAXSIZE = int(os.getenv("CHARACTER_CACHE_MAXSIZE", "256"))
+CHARACTER_CACHE_TIMEOUT_MS = int(os.getenv("CHARACTER_CACHE_TIMEOUT_MS", "250"))
+
+
+def hash_image(image: bytes) -> str:
+    """Return the hex SHA-256 digest of the raw image bytes."""
+    return hashlib.sha256(image).hexdigest()
+
+
+def cache_key(image_hash: str, version: str) -> str:
+    """Build the cache key from an image hash and a prompt/schema version."""
+    return f"{image_hash}:{version}"
+
+
+class DescriptionCache:
+    """Two-tier (memory + MongoDB) cache of character descriptions.
+
+    Args:
+        collection: The ``AsyncCollection`` backing the persistent tier, or
+            ``None`` to run memory-only.
+        ttl_seconds: Time-to-live for entries in both tiers.
+        maxsize: Maximum number of entries held in memory.
+        timeout_ms: Deadline for each persistent-tier round trip.
+    """
+
+    def __init__(
+        self,
+        collection=None,
+        ttl_seconds: int = CHARACTER_CACHE_TTL_SECONDS,
+        maxsize: int = CHARACTER_CACHE_MAXSIZE,
+        timeout_ms: int = CHARACTER_CACHE_TIMEOUT_MS,
+    ):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.timeout_ms = timeout_ms
+        # Entries are [description, hits].
+        self._memory: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+
+    async def ensure_indexes(self) -> None:
+        """Create the TTL index that expires persisted entries."""
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except PyMongoError as e:
+            logger.warning("could not create character cache TTL index: %s", e)
+
+    async def get(self, key: str) -> dict | None:
+        """Return a copy of the cached description for ``key``, or ``None``."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self.stats["memory_hits"] += 1
+                return copy.deepcopy(entry[0])
+
+        description = await self._get_persistent(key)
+        with self._lock:
+            if description is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["store_hits"] += 1
+            entry = self._memory.get(key)
+            self._memory[key] = [description, (entry[1] if entry else 0) + 1]
+        return copy.deepcopy(description)
+
+    async def set(self, key: str, description: dict) -> None:
+        """Store ``description`` under ``key`` in both tiers."""
+        stored = copy.deepcopy(description)
+        with self._lock:
+            entry = self._memory.get(key)
+            self._memory[key] = [stored, entry[1] if entry else 0]
+        if self.collection is None:
+            return
+        try:
+            with pymongo.timeout(self.timeout_ms / 1000):
+                await self.collection.update_one(
+                    {"_id": key},
+                    {
+                        "$set": {"description": stored, "created_at": datetime.now(timezone.utc)},
+                        "$setOnInsert": {"hits": 0},
+                    },
+                    upsert=True,
+                )
+        except PyMongoError as e:
+            logger.warning("character cache write failed: %s", e)
+
+    def hits(self, key: str) -> int:
+        """Return the in-process hit count for ``key`` (0 once it is evicted)."""
+        with self._lock:
+            entry = self._memory.get(key)
+        return entry[1] if entry else 0
+
+    def clear(self) -> None:
+        """Drop the in-process tier (the persistent tier is left untouched)."""
+        with self._lock:
+            self._memory.clear()
+
+    async def _get_persistent(self, key: str) -> dict | None:
+        if self.collection is None:
+            return None
+        try:
+            with pymongo.timeout(self.timeout_ms / 1000):
+                doc = await self.collection.find_one_and_update({"_id": key}, {"$inc": {"hits": 1}})
+        except PyMongoError as e:
+            logger.warning("character cache read failed: %s", e)
+            return None
+        if not doc:
+            return None
+        # MongoDB's TTL monitor runs about once a minute, so double check.
+        created_at = doc.get("created_at")
+        if created_at is not None:
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            if (datetime.now(timezone.utc) - created_at).total_seconds() > self.ttl_seconds:
+                return None
+        return doc.get("description")
+
+
+description_cache = DescriptionCache(LazyCollection(mongo, "character_cache", asynchronous=True))
@@ -0,0 +1,74 @@
+"""
+Decoding of raw model responses into character descriptions.
+
+Kept free of database and network imports so the parse chain can be used
+(and benchmarked) on its own.
+"""
+from fastapi import HTTPException
+import json
+from typing import Any
+from app.services.toon.toon_service import toon_to_json
+from app.services.character.schema_validator import validate_character
+from app.services.observability.metrics import registry
+
+# Which step of the parse chain decoded each response; a rising share of
+# "embedded_json" or "toon" means the model is drifting from the prompt.
+parse_paths = registry.counter("model_response_parse_total", "Model responses by the parse path that decoded them.", ("path",))
+
+
+def parse_character_response(response_text: str) -> dict:
+    """
+    Parses a model response into a character description.
+
+    The model may return fenced code blocks or either JSON or TOON, so the
+    parser tries plain JSON, then an embedded JSON block, then TOON. The
+    result is then validated against ``character.json``; invalid values are
+    coerced or stripped (see :mod:`app.services.character.schema_validator`).
+
+    Args:
+        response_text (str): The raw text returned by the model.
+
+    Returns:
+        dict: The parsed and validated character description.
+
+    Raises:
+        HTTPException: If none of the formats yields a character description.
+    """
+    return validate_character(_parse_response_text(response_text))
+
+
+def _parse_response_text(response_text: str) -> Any:
+    """
+    Decodes a model response as JSON or TOON, without validating it.
+    """
+    response_text = response_text.strip()
+
+    # Try JSON first
+    try:
+        # strip possible fences
+        cleaned = response_text.replace("```json", "").replace("```", "").strip()
+        parsed = json.loads(cleaned)
+        parse_paths.inc(path="json")
+        return parsed
+    except Exception:
+        pass
+
+    # Try to extract an embedded JSON block from the response
+    try:
+        start = response_text.find("{")
+        end = response_text.rfind("}")
+        if start != -1 and end != -1 and end > start:
+            candidate = response_text[start:end+1]
+            parsed = json.loads(candidate)
+            parse_paths.inc(path="embedded_json")
+            return parsed
+    except Exception:
+        pass
+
+    try:
+        parsed = toon_to_json(response_text)
+        parse_paths.inc(path="toon")
+        return parsed
+    except Exception as e2:
+        parse_paths.inc(path="failed")
+        raise HTTPException(status_code=500, detail=f"Error parsing model response: {str(e2)}; raw={response_text}")
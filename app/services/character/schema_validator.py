@@ -0,0 +1,420 @@
+"""Validation of model output against ``app/json_schemas/character.json``.
+
+The model is asked for output matching the canonical character schema, but
+nothing guarantees it complies. Descriptions are checked here at ingest,
+before they are cached or stored, with a ``jsonschema`` validator that is
+built (schema checked, references resolved) once per schema version and
+then reused for every request.
+
+Invalid values are repaired where the intent is unambiguous and dropped
+otherwise:
+
+- numbers sent as strings (``"0.8"``) are converted, out-of-range numbers
+  are clamped to the schema bounds;
+- enum values are matched ignoring case, surrounding spaces and ``_``/``-``;
+- colours are normalised to ``#rrggbb`` (``"a1b2c3"``, ``"#abc"``);
+- a missing ``meta.confidence_overall`` is set to 0 so the description is
+  flagged for review;
+- anything else that is invalid is replaced by ``null`` when the schema
+  allows it, or removed (a whole top-level section if need be).
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import HTTPException
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEMA_PATH = "app/json_schemas/character.json"
+# Every schema version that ever wrote documents, as ``character-<version>.json``;
+# stored characters are expanded against the schema they were written with.
+DEFAULT_SCHEMA_ARCHIVE = os.getenv("CHARACTER_SCHEMA_ARCHIVE", "app/json_schemas/archive")
+
+# Repairs can expose new errors (e.g. a coerced value that is still out of
+# range), so validation is repeated a few times before giving up on a section.
+MAX_REPAIR_PASSES = 3
+
+_STRIP = object()
+_HEX3 = re.compile(r"^#?([A-Fa-f0-9])([A-Fa-f0-9])([A-Fa-f0-9])$")
+_HEX6 = re.compile(r"^#?([A-Fa-f0-9]{6})$")
+
+
+@dataclass
+class ValidationReport:
+    """Outcome of validating one description.
+
+    Attributes:
+        valid: Whether the input was valid as received.
+        coerced: JSON paths (``"hair.length"``) whose value was repaired.
+        stripped: JSON paths that were set to ``null`` or removed.
+        elapsed_ms: Time spent validating and repairing.
+    """
+
+    valid: bool = True
+    coerced: list[str] = field(default_factory=list)
+    stripped: list[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+
+def schema_version(schema: dict) -> str:
+    """Return a short content hash identifying a schema."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _path(parts) -> str:
+    return ".".join(str(p) for p in parts) or "<root>"
+
+
+def _types(schema: dict) -> set[str]:
+    declared = schema.get("type", [])
+    return {declared} if isinstance(declared, str) else set(declared)
+
+
+def _normalise_enum(value: str) -> str:
+    return re.sub(r"[\s_\-]+", " ", value.strip().lower())
+
+
+def _coerce(value: Any, schema: dict, validator: str) -> Any:
+    """Return a repaired value for a failing keyword, or ``_STRIP``."""
+    types = _types(schema)
+    if validator == "type":
+        if isinstance(value, str):
+            text = value.strip()
+            if "null" in types and text.lower() in ("", "null", "none", "n/a", "unknown"):
+                return None
+            if types & {"number", "integer"}:
+                try:
+                    number = float(text)
+                except ValueError:
+                    return _STRIP
+                if "integer" in types and number.is_integer():
+                    return int(number)
+                return number if "number" in types else _STRIP
+            if "boolean" in types and text.lower() in ("true", "false", "yes", "no"):
+                return text.lower() in ("true", "yes")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and "string" in types:
+            return str(value)
+        return _STRIP
+    if validator in ("minimum", "maximum") and isinstance(value, (int, float)):
+        low = schema.get("minimum", value)
+        high = schema.get("maximum", value)
+        return min(max(value, low), high)
+    if validator == "enum" and isinstance(value, str):
+        wanted = _normalise_enum(value)
+        for option in schema["enum"]:
+            if isinstance(option, str) and _normalise_enum(option) == wanted:
+                return option
+        return _STRIP
+    if validator == "pattern" and isinstance(value, str):
+        text = value.strip()
+        match = _HEX6.match(text)
+        if match:
+            candidate = "#" + match.group(1).lower()
+        else:
+            match = _HEX3.match(text)
+            candidate = "#" + "".join(c * 2 for c in match.groups()).lower() if match else None
+        if candidate and re.search(schema["pattern"], candidate):
+            return candidate
+        return _STRIP
+    return _STRIP
+
+
+def _missing_default(schema: dict) -> Any:
+    """Value to fill in for a missing required property, or ``_STRIP``."""
+    if "default" in schema:
+        return copy.deepcopy(schema["default"])
+    if _types(schema) & {"number", "integer"} and "minimum" in schema:
+        # The only required number today is ``meta.confidence_overall``;
+        # its lowest value marks the description for review.
+        return schema["minimum"]
+    return _STRIP
+
+
+class CharacterValidator:
+    """Validates and repairs descriptions for one schema version.
+
+    Args:
+        schema: The character JSON schema.
+    """
+
+    def __init__(self, schema: dict):
+        Draft7Validator.check_schema(schema)
+        self.schema = schema
+        self.version = schema_version(schema)
+        self._validator = Draft7Validator(schema)
+        self._section_validators = {
+            key: Draft7Validator(sub) for key, sub in schema.get("properties", {}).items()
+        }
+        self._lock = threading.Lock()
+        self.stats = {
+            "validations": 0,
+            "invalid": 0,
+            "coerced": 0,
+            "stripped": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+        }
+
+    def validate(self, description: Any) -> tuple[dict, ValidationReport]:
+        """Validate a full description, repairing or dropping invalid parts.
+
+        Args:
+            description: The parsed model output.
+
+        Returns:
+            tuple[dict, ValidationReport]: A valid (repaired) copy of the
+            description and what was changed.
+
+        Raises:
+            HTTPException: 500 if the output is not an object at all.
+        """
+        started = time.perf_counter()
+        if not isinstance(description, dict):
+            raise HTTPException(status_code=500, detail=f"Model output is not an object: {type(description).__name__}")
+        report = ValidationReport()
+        cleaned = copy.deepcopy(description)
+        self._repair(self._validator, cleaned, [], report)
+        if not set(self.schema.get("properties", {})) & cleaned.keys():
+            self._record(report, started)
+            raise HTTPException(status_code=500, detail="Model output does not contain any character section")
+        self._record(report, started)
+        return cleaned, report
+
+    def validate_section(self, key: str, value: Any) -> tuple[Any, ValidationReport]:
+        """Validate one top-level section, e.g. as it arrives from a stream.
+
+        Args:
+            key: The section name (``"meta"``, ``"hair"``, ...).
+            value: The section value.
+
+        Returns:
+            tuple[Any, ValidationReport]: The repaired value, or ``None`` if
+            the section had to be dropped (or is not part of the schema).
+        """
+        started = time.perf_counter()
+        report = ValidationReport()
+        validator = self._section_validators.get(key)
+        if validator is None:
+            report.valid = False
+            report.stripped.append(key)
+            self._record(report, started)
+            return None, report
+        holder = {key: copy.deepcopy(value)}
+        self._repair(validator, holder, [key], report)
+        self._record(report, started)
+        return holder.get(key), report
+
+    def _repair(self, validator: Draft7Validator, holder: dict, prefix: list, report: ValidationReport) -> None:
+        """Repair ``holder`` (or ``holder[prefix[0]]`` for a section) in place."""
+        def target():
+            return holder[prefix[0]] if prefix else holder
+
+        for _ in range(MAX_REPAIR_PASSES):
+            if prefix and prefix[0] not in holder:
+                return
+            errors = list(validator.iter_errors(target()))
+            if not errors:
+                return
+            report.valid = False
+            # Deepest paths first, and later list items before earlier ones,
+            # so removing one element does not shift the paths of the others.
+            errors.sort(key=lambda e: [len(e.absolute_path)] + [p if isinstance(p, int) else 0 for p in e.absolute_path], reverse=True)
+            for error in errors:
+                self._fix(error, holder, prefix, report)
+
+        # Still invalid after repairs: drop whatever keeps failing.
+        if prefix:
+            if prefix[0] in holder and not validator.is_valid(holder[prefix[0]]):
+                del holder[prefix[0]]
+                report.stripped.append(prefix[0])
+            return
+        for error in list(validator.iter_errors(holder)):
+            if error.absolute_path and error.absolute_path[0] in holder:
+                del holder[error.absolute_path[0]]
+                report.stripped.append(str(error.absolute_path[0]))
+
+    def _fix(self, error: ValidationError, holder: dict, prefix: list, report: ValidationReport) -> None:
+        path = prefix + list(error.absolute_path)
+        container = _lookup(holder, path[:-1])
+        if path and container is _STRIP:
+            return
+        if error.validator == "required":
+            missing = re.match(r"'([^']+)' is a required property", error.message)
+            if not missing:
+                return
+            name = missing.group(1)
+            value = _missing_default(error.schema.get("properties", {}).get(name, {}))
+            if value is _STRIP:
+                self._strip(holder, path, error.schema, report)
+                return
+            target = _lookup(holder, path)
+            if isinstance(target, dict):
+                target[name] = value
+                report.coerced.append(_path(path + [name]))
+            return
+        if not path:
+            raise HTTPException(status_code=500, detail=f"Model output does not match the character schema: {error.message}")
+        try:
+            current = container[path[-1]]
+        except (KeyError, IndexError, TypeError):
+            return
+        value = _coerce(current, error.schema, error.validator)
+        if value is _STRIP:
+            self._strip(holder, path, error.schema, report)
+            return
+        container[path[-1]] = value
+        report.coerced.append(_path(path))
+
+    def _strip(self, holder: dict, path: list, schema: dict, report: ValidationReport) -> None:
+        if not path:
+            return
+        container = _lookup(holder, path[:-1])
+        if container is _STRIP:
+            return
+        if isinstance(container, dict) and "null" in _types(schema or {}):
+            container[path[-1]] = None
+        else:
+            try:
+                del container[path[-1]]
+            except (KeyError, IndexError, TypeError):
+                return
+        report.stripped.append(_path(path))
+
+    def _record(self, report: ValidationReport, started: float) -> None:
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats["validations"] += 1
+            self.stats["invalid"] += not report.valid
+            self.stats["coerced"] += len(report.coerced)
+            self.stats["stripped"] += len(report.stripped)
+            self.stats["total_ms"] += report.elapsed_ms
+            self.stats["max_ms"] = max(self.stats["max_ms"], report.elapsed_ms)
+        if not report.valid:
+            logger.info(
+                "character output repaired: coerced=%s stripped=%s (%.2f ms)",
+                report.coerced, report.stripped, report.elapsed_ms,
+            )
+
+
+def _lookup(document: Any, path: list) -> Any:
+    for part in path:
+        try:
+            document = document[part]
+        except (KeyError, IndexError, TypeError):
+            return _STRIP
+    return document
+
+
+class ValidatorRegistry:
+    """Caches one compiled :class:`CharacterValidator` per schema version.
+
+    Args:
+        schema_path: Path of the character JSON schema.
+        archive_dir: Directory of earlier schema versions, see
+            :meth:`schema`.
+    """
+
+    def __init__(self, schema_path: str = DEFAULT_SCHEMA_PATH, archive_dir: str = DEFAULT_SCHEMA_ARCHIVE):
+        self.schema_path = schema_path
+        self.archive_dir = archive_dir
+        self._validators: dict[str, CharacterValidator] = {}
+        self._current: CharacterValidator | None = None
+        self._mtime_ns: int | None = None
+        self._lock = threading.Lock()
+
+    def load(self) -> CharacterValidator:
+        """(Re)read the schema file and return the validator for its version.
+
+        A validator is only compiled the first time a given schema version
+        is seen; reloading an unchanged schema reuses it.
+        """
+        mtime_ns = os.stat(self.schema_path).st_mtime_ns
+        with open(self.schema_path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        version = schema_version(schema)
+        with self._lock:
+            validator = self._validators.get(version)
+            if validator is None:
+                validator = CharacterValidator(schema)
+                self._validators[version] = validator
+            self._current = validator
+            self._mtime_ns = mtime_ns
+        if not os.path.exists(self.archive_path(version)):
+            logger.warning("character schema %s is not archived in %s; documents written with it "
+                           "cannot be expanded after the schema changes", version, self.archive_dir)
+        return validator
+
+    def archive_path(self, version: str) -> str:
+        return os.path.join(self.archive_dir, f"character-{version}.json")
+
+    def schema(self, version: str) -> dict | None:
+        """Return the schema with ``version``, or ``None`` if it is unknown.
+
+        Versions loaded by this process are served from memory; others are
+        read once from ``archive_dir`` (and checked against their hash).
+        """
+        with self._lock:
+            validator = self._validators.get(version)
+        if validator is not None:
+            return validator.schema
+        try:
+            with open(self.archive_path(version), "r", encoding="utf-8") as f:
+                schema = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if schema_version(schema) != version:
+            logger.warning("archived character schema %s does not match its hash", version)
+            return None
+        with self._lock:
+            validator = self._validators.setdefault(version, CharacterValidator(schema))
+        return validator.schema
+
+    def refresh(self) -> bool:
+        """Reload the schema if the file changed on disk.
+
+        Returns:
+            bool: Whether the current schema version changed.
+        """
+        try:
+            if os.stat(self.schema_path).st_mtime_ns == self._mtime_ns:
+                return False
+        except OSError:
+            return False
+        previous = self._current
+        validator = self.load()
+        if validator is not previous:
+            logger.info("character schema reloaded version=%s", validator.version)
+        return validator is not previous
+
+    def get(self) -> CharacterValidator:
+        """Return the validator for the current schema, loading it lazily."""
+        return self._current or self.load()
+
+    def stats(self) -> dict:
+        """Validation metrics for the current schema version."""
+        validator = self.get()
+        stats = dict(validator.stats, version=validator.version)
+        stats["avg_ms"] = stats["total_ms"] / stats["validations"] if stats["validations"] else 0.0
+        return stats
+
+
+validator_registry = ValidatorRegistry()
+
+
+def validate_character(description: Any) -> dict:
+    """Validate and repair a parsed description with the current schema."""
+    cleaned, _ = validator_registry.get().validate(description)
+    return cleaned
@@ -1,8 +1,18 @@
 import google.generativeai as genai
+import asyncio
 import os
+from typing import AsyncIterator
 from fastapi import HTTPException
-from PIL import Image
-import io
+from app.services.vision.provider import get_vision_provider
+from app.services.gemini.resilience import illustration_calls, is_retryable, provider_breaker, text_calls
+
+# Global bound on concurrent in-flight model calls per worker process, and the
+# default deadline for a single call.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+
+_semaphore: asyncio.Semaphore | None = None
+_semaphore_loop: asyncio.AbstractEventLoop | None = None
 
 def configure_gemini():
     """
@@ -15,7 +25,10 @@ def configure_gemini():
 
 def generate_text_from_image(prompt: str, image: bytes, system_message: str | None = None) -> str:
     """
-    Generates text from a prompt and an image using the Gemini API.
+    Generates text from a prompt and an image, for synchronous callers.
+
+    This runs :func:`generate_text_from_image_async` on a private event loop
+    and therefore must not be called from async code.
 
     Args:
         prompt (str): The text prompt to send to the model.
@@ -24,36 +37,149 @@ def generate_text_from_image(prompt: str, image: bytes, system_message: str | No
     Returns:
         str: The generated text from the model.
     """
+    return asyncio.run(generate_text_from_image_async(prompt, image, system_message=system_message))
 
-    configure_gemini()
-    img = Image.open(io.BytesIO(image))
+def _get_semaphore() -> asyncio.Semaphore:
+    """
+    Returns the concurrency semaphore bound to the running event loop.
+
+    The semaphore is recreated when the loop changes (e.g. between test
+    clients) since asyncio primitives cannot be shared across loops.
+    """
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+async def generate_text_from_image_async(prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> str:
+    """
+    Generates text from a prompt and an image using the configured vision provider.
+
+    At most ``GEMINI_MAX_CONCURRENCY`` calls run at once per process; further
+    callers wait for a slot. The call is cancelled when the awaiting task is
+    cancelled (e.g. because the HTTP client disconnected).
+
+    Transient provider errors are retried with jittered backoff within the
+    deadline, slow calls may be hedged, and the provider circuit breaker
+    fails calls fast while the provider is unhealthy (see
+    :mod:`app.services.gemini.resilience`). Each attempt, hedges included,
+    holds its own concurrency slot.
+
+    Args:
+        prompt (str): The text prompt to send to the model.
+        image (bytes): The image to send to the model.
+        system_message (str | None): Optional system message.
+        timeout (float | None): Deadline in seconds, including the wait for a
+            concurrency slot. Defaults to ``GEMINI_TIMEOUT_SECONDS``.
+
+    Returns:
+        str: The generated text from the model.
+
+    Raises:
+        HTTPException: 504 if the deadline is exceeded, 503 if the circuit
+            breaker is open or transient errors persist.
+    """
+    timeout = GEMINI_TIMEOUT_SECONDS if timeout is None else timeout
+    provider = get_vision_provider()
+    semaphore = _get_semaphore()
+
+    async def attempt(remaining: float) -> str:
+        async with semaphore:
+            return await provider.generate(prompt, image, system_message=system_message, timeout=remaining)
+
+    # Each attempt is timed out by the caller, so a slow provider trips the
+    # breaker instead of surfacing as a cancellation.
+    return await text_calls.call(attempt, timeout, can_hedge=lambda: not semaphore.locked())
 
-    # Prefer using a chat-style API if available so we can send a real system
-    # message. Fall back to the older generate_content approach when not.
+async def stream_text_from_image_async(prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> AsyncIterator[str]:
+    """
+    Streams text from a prompt and an image as the model generates it.
+
+    Holds one concurrency slot for the lifetime of the stream. The deadline
+    covers the wait for a slot and the whole stream; closing the iterator
+    early abandons the generation. A partly delivered stream cannot be
+    retried, so streams only consult and feed the circuit breaker.
+
+    Args:
+        prompt (str): The text prompt to send to the model.
+        image (bytes): The image to send to the model.
+        system_message (str | None): Optional system message.
+        timeout (float | None): Deadline in seconds. Defaults to
+            ``GEMINI_TIMEOUT_SECONDS``.
+
+    Yields:
+        str: Chunks of generated text.
+
+    Raises:
+        HTTPException: 504 if the deadline is exceeded, 503 if the circuit
+            breaker is open.
+    """
+    timeout = GEMINI_TIMEOUT_SECONDS if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    provider = get_vision_provider()
+    provider_breaker.check()
+
+    semaphore = _get_semaphore()
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout)
+    except TimeoutError:
+        provider_breaker.release()
+        raise HTTPException(status_code=504, detail=f"Gemini call exceeded {timeout:.0f}s deadline")
+    except BaseException:
+        provider_breaker.release()
+        raise
+    stream = provider.generate_stream(prompt, image, system_message=system_message, timeout=timeout)
     try:
-        # Try to use a chat model if the library provides it.
-        if hasattr(genai, 'ChatModel'):
-            chat = genai.ChatModel('models/gemini-2.5-chat')
-            messages = []
-            if system_message:
-                messages.append({"role": "system", "content": system_message})
-            messages.append({"role": "user", "content": prompt})
-            # Some SDK versions accept images in a separate parameter; attempt a
-            # generic call and let the SDK raise if unsupported.
-            resp = chat.generate(messages=messages, image=img)
-            return getattr(resp, 'text', str(resp))
-    except Exception:
-        # ignore and fall back
-        pass
-
-    # Fallback: include the system message as a preface to the prompt. This
-    # isn't a true system role but keeps backward compatibility.
-    model = genai.GenerativeModel('models/gemini-2.5-flash')
-    combined = prompt
-    if system_message:
-        combined = f"SYSTEM:\n{system_message}\n---\n{prompt}"
-    response = model.generate_content([combined, img])
-    return response.text
+        while True:
+            remaining = deadline - loop.time()
+            try:
+                chunk = await asyncio.wait_for(anext(stream), max(remaining, 0))
+            except StopAsyncIteration:
+                provider_breaker.record_success()
+                return
+            except TimeoutError:
+                raise HTTPException(status_code=504, detail=f"Gemini call exceeded {timeout:.0f}s deadline")
+            except Exception as e:
+                if is_retryable(e):
+                    provider_breaker.record_failure()
+                raise
+            yield chunk
+    finally:
+        provider_breaker.release()
+        await stream.aclose()
+        semaphore.release()
+
+async def generate_illustration_async(prompt: str, size: int, timeout: float | None = None) -> tuple[bytes, str]:
+    """
+    Generates a page illustration using the configured provider.
+
+    Concurrency is bounded by the caller (see the illustration scheduler),
+    not by the text-extraction semaphore. Retries are the scheduler's too;
+    the call goes through the provider circuit breaker.
+
+    Args:
+        prompt (str): The image prompt.
+        size (int): Requested longest edge in pixels.
+        timeout (float | None): Deadline in seconds. Defaults to
+            ``GEMINI_TIMEOUT_SECONDS``.
+
+    Returns:
+        tuple[bytes, str]: The image bytes and MIME type.
+
+    Raises:
+        HTTPException: 504 if the deadline is exceeded, 503 if the circuit
+            breaker is open or the provider failed transiently.
+    """
+    timeout = GEMINI_TIMEOUT_SECONDS if timeout is None else timeout
+    provider = get_vision_provider()
+
+    async def attempt(remaining: float) -> tuple[bytes, str]:
+        return await provider.illustrate(prompt, size, timeout=remaining)
+
+    return await illustration_calls.call(attempt, timeout)
 
 def list_models():
     """
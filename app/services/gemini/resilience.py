@@ -0,0 +1,329 @@
+"""Retries, hedging and circuit breaking for provider calls.
+
+A single model call can fail transiently (rate limiting, ``503``, a dropped
+connection) or land in the slow tail. :class:`ResilientCaller` wraps each
+call with:
+
+- a timeout per attempt (``GEMINI_ATTEMPT_TIMEOUT_SECONDS``, by default
+  the rest of the deadline); an attempt that runs out of time counts as a
+  provider failure, and the last one becomes a ``504``;
+- retries with capped exponential backoff and full jitter
+  (``GEMINI_MAX_ATTEMPTS``, ``GEMINI_BACKOFF_BASE_SECONDS``,
+  ``GEMINI_BACKOFF_MAX_SECONDS``), only for errors that are worth retrying
+  (timeouts included) and only while the caller's deadline leaves room;
+- optional hedging (``GEMINI_HEDGE=1``): when an attempt has not answered
+  after the observed p95 latency, a duplicate request is sent and whichever
+  finishes first wins; the other is cancelled;
+- a :class:`CircuitBreaker` shared by all provider calls: after
+  ``GEMINI_BREAKER_FAILURE_THRESHOLD`` consecutive failures it rejects calls
+  with ``503`` for ``GEMINI_BREAKER_RESET_SECONDS``, then lets one probe
+  through.
+
+Every decision is counted; :func:`resilience_stats` returns the counters.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))
+# 0: each attempt may use whatever is left of the call's deadline.
+GEMINI_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT_SECONDS", "0"))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "0.5"))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "8"))
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0") == "1"
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_SECONDS", "1.0"))
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("GEMINI_BREAKER_FAILURE_THRESHOLD", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+_RETRYABLE = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether ``exc`` is a transient provider failure worth another attempt."""
+    if isinstance(exc, HTTPException):
+        return exc.status_code in (429, 503)
+    return isinstance(exc, _RETRYABLE)
+
+
+def backoff_delay(attempt: int, base: float = GEMINI_BACKOFF_BASE_SECONDS, cap: float = GEMINI_BACKOFF_MAX_SECONDS) -> float:
+    """Full-jitter backoff before retry number ``attempt`` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    ``closed`` lets every call through. ``failure_threshold`` failures in a
+    row open it: calls fail fast until ``reset_seconds`` have passed, after
+    which it is ``half_open`` and a single probe is let through; the probe's
+    outcome closes or re-opens it.
+
+    Args:
+        failure_threshold: Consecutive failures that open the breaker.
+        reset_seconds: How long the breaker stays open.
+    """
+
+    def __init__(self, failure_threshold: int = GEMINI_BREAKER_FAILURE_THRESHOLD, reset_seconds: float = GEMINI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def check(self) -> None:
+        """Raise if the breaker does not let a call through now.
+
+        Raises:
+            HTTPException: 503 with ``Retry-After`` while open.
+        """
+        if self.state == "open":
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                self._reject(remaining)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self._reject(self.reset_seconds)
+            self._probing = True
+
+    def _reject(self, retry_after: float) -> None:
+        self._stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Model provider is unavailable, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def release(self) -> None:
+        """End a call whose outcome says nothing about provider health."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self._stats["opened"] += 1
+                logger.warning("provider circuit breaker opened after %d failures", self._failures)
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return dict(self._stats, state=self.state, consecutive_failures=self._failures)
+
+
+class LatencyWindow:
+    """The last ``size`` successful call latencies, for percentile estimates."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> float | None:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    """Runs one kind of provider call with retries, hedging and the breaker.
+
+    Args:
+        name: Label used in logs and stats.
+        breaker: The circuit breaker to consult and feed.
+        max_attempts: Attempts per call, including the first.
+        attempt_timeout: Seconds one attempt may take, capped by the time
+            left before the deadline; 0 for no cap of its own.
+        hedge: Whether to send hedged duplicates in the slow tail.
+        hedge_min_samples: Latencies needed before hedging starts.
+        hedge_min_delay: Lower bound for the hedge delay, in seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        max_attempts: int = GEMINI_MAX_ATTEMPTS,
+        attempt_timeout: float = GEMINI_ATTEMPT_TIMEOUT_SECONDS,
+        hedge: bool = GEMINI_HEDGE,
+        hedge_min_samples: int = GEMINI_HEDGE_MIN_SAMPLES,
+        hedge_min_delay: float = GEMINI_HEDGE_MIN_DELAY_SECONDS,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = LatencyWindow()
+        self._stats = {
+            "calls": 0,
+            "attempts": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "retryable_errors": 0,
+            "timeouts": 0,
+            "deadline_exhausted": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+        }
+
+    def hedge_delay(self) -> float | None:
+        """Seconds after which to hedge, or ``None`` when hedging is off or unwarranted."""
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latencies.percentile(0.95))
+
+    async def _timed(self, fn: Callable[[float], Awaitable[T]], remaining: float) -> T:
+        self._stats["attempts"] += 1
+        if self.attempt_timeout > 0:
+            remaining = min(remaining, self.attempt_timeout)
+        started = time.monotonic()
+        # The attempt's own timeout raises TimeoutError here, where call() can
+        # count it, instead of arriving as a cancellation from the caller.
+        async with asyncio.timeout(max(remaining, 0)):
+            result = await fn(remaining)
+        self.latencies.add(time.monotonic() - started)
+        return result
+
+    async def _attempt(self, fn: Callable[[float], Awaitable[T]], remaining: float, can_hedge: Callable[[], bool]) -> T:
+        delay = self.hedge_delay()
+        if delay is None or delay >= remaining:
+            return await self._timed(fn, remaining)
+
+        primary = asyncio.ensure_future(self._timed(fn, remaining))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and can_hedge():
+                self._stats["hedges_sent"] += 1
+                tasks.add(asyncio.ensure_future(self._timed(fn, remaining - delay)))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    if not tasks:
+                        return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, fn: Callable[[float], Awaitable[T]], deadline: float, can_hedge: Callable[[], bool] = lambda: True) -> T:
+        """Run ``fn`` until it succeeds, fails for good or the deadline passes.
+
+        Args:
+            fn: Makes one attempt, given the seconds left before the deadline.
+            deadline: Seconds the whole call (all attempts and backoff) may take.
+            can_hedge: Checked before sending a hedged duplicate, e.g. whether
+                a concurrency slot is free.
+
+        Raises:
+            HTTPException: 503 if the circuit breaker is open, 503 if the
+                provider kept failing transiently, or 504 if the last attempt
+                timed out. Non-retryable errors are raised as they are.
+        """
+        self._stats["calls"] += 1
+        deadline_at = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            self.breaker.check()
+            attempt += 1
+            remaining = deadline_at - time.monotonic()
+            try:
+                result = await self._attempt(fn, remaining, can_hedge)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                timed_out = isinstance(e, TimeoutError)
+                if not timed_out and not is_retryable(e):
+                    self._stats["failures"] += 1
+                    self.breaker.release()
+                    raise
+                self._stats["timeouts" if timed_out else "retryable_errors"] += 1
+                self.breaker.record_failure()
+                delay = backoff_delay(attempt)
+                if attempt >= self.max_attempts or delay >= deadline_at - time.monotonic():
+                    self._stats["failures"] += 1
+                    if attempt < self.max_attempts:
+                        self._stats["deadline_exhausted"] += 1
+                    logger.warning("%s failed after %d attempts: %r", self.name, attempt, e)
+                    if timed_out:
+                        raise HTTPException(status_code=504, detail=f"Model provider call exceeded {deadline:.0f}s deadline")
+                    raise HTTPException(
+                        status_code=503,
+                        detail=f"Model provider failed after {attempt} attempts: {str(e)}",
+                        headers={"Retry-After": str(max(1, math.ceil(min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt))))},
+                    )
+                self._stats["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self._stats["successes"] += 1
+            return result
+
+    def stats(self) -> dict:
+        p50 = self.latencies.percentile(0.5)
+        p95 = self.latencies.percentile(0.95)
+        return dict(
+            self._stats,
+            latency_p50_ms=None if p50 is None else round(p50 * 1000, 1),
+            latency_p95_ms=None if p95 is None else round(p95 * 1000, 1),
+            hedge_delay_ms=None if self.hedge_delay() is None else round(self.hedge_delay() * 1000, 1),
+        )
+
+
+provider_breaker = CircuitBreaker()
+# Illustrations are retried per page by the illustration scheduler, so they
+# only get the breaker and the counters here.
+text_calls = ResilientCaller("generate", provider_breaker)
+illustration_calls = ResilientCaller("illustrate", provider_breaker, max_attempts=1, hedge=False)
+
+
+def resilience_stats() -> dict:
+    """Counters of the provider breaker and each call kind."""
+    return {
+        "breaker": provider_breaker.stats(),
+        "generate": text_calls.stats(),
+        "illustrate": illustration_calls.stats(),
+    }
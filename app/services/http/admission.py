@@ -0,0 +1,204 @@
+"""Admission control for the model-backed endpoints.
+
+When the model slows down, requests to ``/character`` would otherwise pile up
+without limit, each holding an upload buffer and a connection. The
+:class:`AdmissionController` lets at most ``ADMISSION_MAX_IN_FLIGHT``
+requests run at once; up to ``ADMISSION_MAX_QUEUE`` more wait, for at most
+``ADMISSION_QUEUE_TIMEOUT_SECONDS``. Anything beyond that is rejected at
+once with ``503`` and ``Retry-After``, before the upload is read.
+
+Priority callers (book jobs that were already accepted and queued) are
+served before waiting requests, are never rejected and do not time out:
+they represent work that is already paid for.
+
+:func:`admit` combines a slot from the controller with the per-user quota
+(:mod:`app.services.http.quotas`, ``429``). The quota is charged once, after
+the slot is granted, so requests shed with ``503`` cost nothing. Callers are
+identified by their access token when they send one, by client address
+otherwise.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import HTTPException, Request
+
+from app.services.auth.tokens import token_service
+from app.services.http.quotas import quota_store
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+# Multi-photo uploads are charged per started block of this many bytes.
+ADMISSION_BYTES_PER_UNIT = int(os.getenv("ADMISSION_BYTES_PER_UNIT", str(2 * 1024 * 1024)))
+
+
+class AdmissionController:
+    """Bounded in-flight limit with a short, bounded wait queue.
+
+    Slots are handed directly from a finishing request to the next waiter
+    (priority waiters first), so a waiter cannot be overtaken by a newcomer.
+
+    Args:
+        max_in_flight: Requests allowed to run at once.
+        max_queue: Non-priority requests allowed to wait for a slot.
+        queue_timeout: Seconds a non-priority request may wait.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: dict[bool, deque[asyncio.Future]] = {True: deque(), False: deque()}
+        self._stats = {
+            "admitted": 0,
+            "admitted_priority": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    def _overloaded(self, reason: str) -> HTTPException:
+        self._stats[f"rejected_{reason}"] += 1
+        return HTTPException(
+            status_code=503,
+            detail="Server is busy, retry shortly",
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+
+    def _admitted(self, priority: bool, started: float) -> None:
+        wait_ms = (time.perf_counter() - started) * 1000
+        self._stats["admitted_priority" if priority else "admitted"] += 1
+        self._stats["total_wait_ms"] += wait_ms
+        self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+
+    async def acquire(self, priority: bool = False) -> None:
+        """Wait for a slot; pair every successful call with :meth:`release`.
+
+        Raises:
+            HTTPException: 503 with ``Retry-After`` if the queue is full or
+                the wait times out (never for ``priority``).
+        """
+        started = time.perf_counter()
+        if self._in_flight < self.max_in_flight and not any(self._waiters.values()):
+            self._in_flight += 1
+            self._admitted(priority, started)
+            return
+        if not priority and len(self._waiters[False]) >= self.max_queue:
+            raise self._overloaded("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            if priority:
+                await waiter
+            else:
+                await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self.release()
+            else:
+                try:
+                    self._waiters[priority].remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._overloaded("timeout")
+            raise
+        self._admitted(priority, started)
+
+    def release(self) -> None:
+        """Give the slot to the next waiter, or free it."""
+        for priority in (True, False):
+            waiters = self._waiters[priority]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: bool = False) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        """Current occupancy plus admission and rejection counters."""
+        admitted = self._stats["admitted"] + self._stats["admitted_priority"]
+        return dict(
+            self._stats,
+            in_flight=self._in_flight,
+            queued=len(self._waiters[False]),
+            queued_priority=len(self._waiters[True]),
+            avg_wait_ms=self._stats["total_wait_ms"] / admitted if admitted else 0.0,
+            max_in_flight=self.max_in_flight,
+            max_queue=self.max_queue,
+        )
+
+
+admission_controller = AdmissionController()
+
+
+def request_subject(request: Request) -> str:
+    """The quota key of a request: the token's user id, else the client address."""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            return f"user:{token_service.verify(token)['sub']}"
+        except HTTPException:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def take_quota(request: Request, cost: float = 1) -> None:
+    """Charge ``cost`` to the caller's quota.
+
+    Raises:
+        HTTPException: 429 if the quota is exhausted.
+    """
+    await quota_store.take(request_subject(request), cost)
+
+
+def content_cost(request: Request, max_cost: int, bytes_per_unit: int = ADMISSION_BYTES_PER_UNIT) -> int:
+    """Quota cost of a multi-photo upload, estimated before the body is read.
+
+    One unit per started ``bytes_per_unit`` of ``Content-Length``, between 1
+    and ``max_cost``; ``max_cost`` when the length is unknown (chunked bodies).
+    """
+    content_length = request.headers.get("content-length", "")
+    if not content_length.isdigit():
+        return max_cost
+    return max(1, min(max_cost, -(-int(content_length) // bytes_per_unit)))
+
+
+@asynccontextmanager
+async def admit(request: Request, cost: float = 1) -> AsyncIterator[None]:
+    """Hold an admission slot for the block, charging the caller's quota once admitted.
+
+    Raises:
+        HTTPException: 503 if the server is saturated, 429 if the quota is
+            exhausted.
+    """
+    async with admission_controller.slot():
+        await take_quota(request, cost)
+        yield
@@ -0,0 +1,39 @@
+"""Helpers for tying long-running work to the lifetime of an HTTP request."""
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_interval: float = DISCONNECT_POLL_SECONDS) -> T:
+    """Await ``awaitable`` and cancel it if the client goes away first.
+
+    Args:
+        request: The incoming request whose connection is watched.
+        awaitable: The work to run (typically a model call).
+        poll_interval: How often to check the connection, in seconds.
+
+    Returns:
+        The result of ``awaitable``.
+
+    Raises:
+        HTTPException: 499 if the client disconnected before the work finished.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
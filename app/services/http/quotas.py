@@ -0,0 +1,121 @@
+"""Per-user request quotas for the model-backed endpoints.
+
+Each caller has a token bucket (``QUOTA_BURST`` tokens, refilled at
+``QUOTA_REFILL_PER_MINUTE``) stored in the ``rate_limits`` collection, so
+the quota holds across worker processes and restarts. A request takes its
+cost from the bucket in one atomic ``findOneAndUpdate`` whose pipeline
+refills the bucket from the server clock (``$$NOW``) and only subtracts
+when enough tokens are left; an empty bucket answers ``429`` with the
+seconds until the cost is available again as ``Retry-After``.
+
+The check is bounded by ``QUOTA_TIMEOUT_MS``. When the database cannot
+answer in time the request is let through: quotas protect against runaway
+cost, not against a database outage, and failing closed would turn one into
+the other. Idle buckets are removed by a TTL index on ``updated_at``.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+from typing import Any
+
+import pymongo
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app.mongodb import LazyCollection, mongo
+
+logger = logging.getLogger(__name__)
+
+QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "1") == "1"
+QUOTA_BURST = float(os.getenv("QUOTA_BURST", "20"))
+QUOTA_REFILL_PER_MINUTE = float(os.getenv("QUOTA_REFILL_PER_MINUTE", "10"))
+QUOTA_TIMEOUT_MS = int(os.getenv("QUOTA_TIMEOUT_MS", "250"))
+
+
+def refill(tokens: float, elapsed_seconds: float, capacity: float, rate_per_second: float) -> float:
+    """Tokens in a bucket after ``elapsed_seconds`` of refilling (the pipeline's arithmetic)."""
+    return min(capacity, tokens + max(elapsed_seconds, 0.0) * rate_per_second)
+
+
+def take_pipeline(cost: float, capacity: float, rate_per_second: float) -> list[dict[str, Any]]:
+    """Update pipeline that refills a bucket and takes ``cost`` tokens if available.
+
+    Leaves ``granted`` on the document to tell whether the tokens were taken.
+    """
+    elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+    refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, rate_per_second]}]}]}
+    return [
+        {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+        {"$set": {"granted": {"$gte": ["$tokens", cost]}}},
+        {"$set": {"tokens": {"$cond": ["$granted", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+    ]
+
+
+class QuotaStore:
+    """Token buckets keyed by caller, persisted in MongoDB.
+
+    Args:
+        collection: The ``rate_limits`` ``AsyncCollection`` (or stand-in).
+        capacity: Bucket size, i.e. the allowed burst.
+        refill_per_minute: Tokens added back per minute.
+        timeout_ms: Deadline for the database round trip.
+        enabled: When ``False`` every request is allowed without a lookup.
+    """
+
+    def __init__(
+        self,
+        collection,
+        capacity: float = QUOTA_BURST,
+        refill_per_minute: float = QUOTA_REFILL_PER_MINUTE,
+        timeout_ms: int = QUOTA_TIMEOUT_MS,
+        enabled: bool = QUOTA_ENABLED,
+    ):
+        self.collection = collection
+        self.capacity = capacity
+        self.rate_per_second = refill_per_minute / 60
+        self.timeout_ms = timeout_ms
+        self.enabled = enabled
+        self._stats = {"granted": 0, "limited": 0, "store_errors": 0}
+
+    async def take(self, subject: str, cost: float = 1) -> None:
+        """Take ``cost`` tokens from ``subject``'s bucket.
+
+        Raises:
+            HTTPException: 429 with ``Retry-After`` if the bucket is empty.
+        """
+        if not self.enabled or cost <= 0:
+            return
+        try:
+            with pymongo.timeout(self.timeout_ms / 1000):
+                bucket = await self.collection.find_one_and_update(
+                    {"_id": subject},
+                    take_pipeline(cost, self.capacity, self.rate_per_second),
+                    projection={"tokens": 1, "granted": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+        except PyMongoError as e:
+            self._stats["store_errors"] += 1
+            logger.warning("quota check for %s skipped: %s", subject, e)
+            return
+        if bucket.get("granted"):
+            self._stats["granted"] += 1
+            return
+        self._stats["limited"] += 1
+        missing = cost - float(bucket.get("tokens", 0))
+        retry_after = max(1, math.ceil(missing / self.rate_per_second)) if self.rate_per_second > 0 else 60
+        raise HTTPException(
+            status_code=429,
+            detail=f"Quota exceeded; {self.capacity:g} requests per burst, {self.rate_per_second * 60:g} per minute",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def stats(self) -> dict:
+        """Granted, limited and failed quota checks, plus the configuration."""
+        return dict(self._stats, enabled=self.enabled, capacity=self.capacity, refill_per_minute=self.rate_per_second * 60)
+
+
+quota_store = QuotaStore(LazyCollection(mongo, "rate_limits", asynchronous=True))
@@ -0,0 +1,191 @@
+"""Image pre-processing stage.
+
+Uploads are normalised before they reach the vision provider:
+
+1. decompression-bomb limits are enforced (``IMAGE_MAX_PIXELS``),
+2. JPEGs are decoded at reduced scale via ``Image.draft`` when possible,
+3. EXIF orientation is applied,
+4. the image is downscaled so its longest edge is at most
+   ``IMAGE_MAX_EDGE`` pixels,
+5. it is re-encoded to a compact format (``IMAGE_FORMAT``), which also
+   strips EXIF/GPS and other metadata.
+
+Decoding and resizing are CPU bound, so the async entry point runs the work
+in a small dedicated thread pool (Pillow releases the GIL for the heavy
+parts) instead of on the event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+
+from app.services.observability.profiler import propagate
+from app.services.observability.timing import span
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_stats_lock = threading.Lock()
+preprocess_stats = {"images": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+@dataclass(frozen=True)
+class PreprocessedImage:
+    """Result of :func:`preprocess_image`.
+
+    Attributes:
+        data: The re-encoded image bytes.
+        mime_type: MIME type of ``data``.
+        width: Output width in pixels.
+        height: Output height in pixels.
+        original_bytes: Size of the upload.
+    """
+
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+def preprocess_image(
+    image: bytes | BinaryIO,
+    max_edge: int = IMAGE_MAX_EDGE,
+    max_pixels: int = IMAGE_MAX_PIXELS,
+    fmt: str = IMAGE_FORMAT,
+    quality: int = IMAGE_QUALITY,
+) -> PreprocessedImage:
+    """Orient, downscale, strip and re-encode an uploaded image.
+
+    Args:
+        image: The raw upload, as bytes or a seekable binary file (e.g. a
+            spooled upload, so large uploads are never fully buffered).
+        max_edge: Maximum length of the longest edge after resizing.
+        max_pixels: Images with more pixels are rejected before decoding.
+        fmt: Output format understood by Pillow (``JPEG``, ``WEBP``, ``PNG``).
+        quality: Encoder quality for lossy formats.
+
+    Returns:
+        PreprocessedImage: The processed image and its size accounting.
+
+    Raises:
+        HTTPException: 400 for unreadable images, 413 for images above the
+            pixel limit.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        original_bytes = len(image)
+        source = io.BytesIO(image)
+    else:
+        source = image
+        source.seek(0, io.SEEK_END)
+        original_bytes = source.tell()
+        source.seek(0)
+
+    try:
+        with span("image_open"):
+            img = Image.open(source)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Uploaded file is not a readable image")
+
+    width, height = img.size
+    if width * height > max_pixels:
+        raise HTTPException(status_code=413, detail=f"Image has {width * height} pixels; limit is {max_pixels}")
+
+    try:
+        if img.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when the target is
+            # small enough; this is far cheaper than a full decode + resize.
+            img.draft("RGB", (max_edge, max_edge))
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise HTTPException(status_code=413, detail=f"Image rejected: {e}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {e}")
+
+    if fmt == "JPEG" and img.mode != "RGB":
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+
+    out = io.BytesIO()
+    save_kwargs = {"optimize": True}
+    if fmt in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = quality
+    # No exif=/icc_profile=/pnginfo= is passed, so metadata is not carried over.
+    with span("image_encode"):
+        img.save(out, format=fmt, **save_kwargs)
+
+    result = PreprocessedImage(
+        data=out.getvalue(),
+        mime_type=Image.MIME.get(fmt, "application/octet-stream"),
+        width=img.width,
+        height=img.height,
+        original_bytes=original_bytes,
+    )
+    with _stats_lock:
+        preprocess_stats["images"] += 1
+        preprocess_stats["bytes_in"] += result.original_bytes
+        preprocess_stats["bytes_out"] += len(result.data)
+    logger.info(
+        "preprocessed image %dx%d -> %dx%d, %d -> %d bytes (saved %d)",
+        width, height, result.width, result.height, result.original_bytes, len(result.data), result.bytes_saved,
+    )
+    return result
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-preprocess")
+        return _executor
+
+
+async def preprocess_image_async(image: bytes | BinaryIO, **kwargs) -> PreprocessedImage:
+    """Run :func:`preprocess_image` in the pre-processing worker pool.
+
+    The worker runs in a copy of the caller's context, so spans recorded
+    there (and profiler samples) are attributed to the current request.
+    """
+    loop = asyncio.get_running_loop()
+    with span("preprocess"):
+        return await loop.run_in_executor(_get_executor(), propagate(preprocess_image, image, **kwargs))
+
+
+def shutdown_executor() -> None:
+    """Shut the worker pool down (called from the application lifespan)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
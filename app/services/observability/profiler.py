@@ -0,0 +1,425 @@
+"""On-demand sampling profiler for individual requests.
+
+:class:`ProfilingMiddleware` profiles a request when it carries a valid
+``X-Profile`` header (a token signed with ``PROFILE_SECRET``, see
+:func:`sign`) or, with ``PROFILE_SAMPLE_RATE`` above zero, at random. While
+at least one request is being profiled a sampler thread wakes every
+``PROFILE_INTERVAL_MS`` and reads the stacks of:
+
+- the event loop thread, when the task it is running belongs to the
+  request (the request's task and every task created under it), so sync
+  calls made on the loop such as pymongo or cache lookups are included;
+- worker threads running a call submitted through :func:`propagate`
+  (image pre-processing, password hashing) on the request's behalf.
+
+Ticks where neither is busy are counted as ``(awaiting)``: time the request
+spent waiting for the network, the model or a queue.
+
+Each profile is written to ``PROFILE_DIR`` in the collapsed-stack format
+(``frame;frame;frame count`` per line) read by ``flamegraph.pl``,
+speedscope and similar tools, next to a small JSON summary. Only the newest
+``PROFILE_MAX_FILES`` profiles are kept. The response of a profiled request
+carries its profile id in ``X-Profile-Id``; ``/admin/profiles`` lists and
+serves the stored files.
+
+When no request is being profiled there is no sampler thread and no task
+factory, and unprofiled requests cost one header scan.
+
+Tokens are ``<expiry>.<hmac>`` over a subject: ``request:<path>`` to
+profile requests to one path, ``admin`` for the admin endpoints. Create
+one with::
+
+    PROFILE_SECRET=... python -m app.services.observability.profiler /character
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from fastapi import Header, HTTPException
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "4"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+PROFILE_MAX_DEPTH = 128
+
+PROFILE_HEADER = b"x-profile"
+IDLE_FRAME = "(awaiting)"
+
+
+def sign(subject: str, ttl_seconds: float = 300, secret: str | None = None) -> str:
+    """A token for ``subject`` (``request:<path>`` or ``admin``) valid for ``ttl_seconds``."""
+    secret = PROFILE_SECRET if secret is None else secret
+    expires = int(time.time() + ttl_seconds)
+    digest = hmac.new(secret.encode(), f"{subject}:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{digest}"
+
+
+def verify(token: str, subject: str, secret: str | None = None) -> bool:
+    """Whether ``token`` was signed for ``subject`` and has not expired."""
+    secret = PROFILE_SECRET if secret is None else secret
+    if not secret or not token:
+        return False
+    expires, _, digest = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), f"{subject}:{expires}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+class Profile:
+    """Stack samples of one request, in collapsed form."""
+
+    def __init__(self, method: str, path: str, reason: str):
+        now = time.time()
+        # Sortable by start time, so rotation drops the oldest profiles.
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.tasks: set[asyncio.Task] = set()
+        self.threads: dict[int, int] = {}
+        self.stacks: dict[str, int] = {}
+        self.samples = 0
+        self.started = time.monotonic()
+        self.route: str | None = None
+        self.status: int | None = None
+        self.duration_ms: float | None = None
+
+    def add(self, stack: str) -> None:
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "reason": self.reason,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL_MS,
+        }
+
+
+_active_profile: contextvars.ContextVar[Profile | None] = contextvars.ContextVar("active_profile", default=None)
+
+_labels: dict[Any, str] = {}
+_pool_suffix = re.compile(r"_\d+$")
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for marker in ("/site-packages/", "/app/"):
+            index = filename.rfind(marker)
+            if index != -1:
+                filename = filename[index + 1:]
+                break
+        label = _labels[code] = f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+
+def _collapse(frame, root: str) -> str:
+    labels = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+
+class Profiler:
+    """Runs the sampler thread and stores finished profiles.
+
+    Args:
+        directory: Where profiles are written.
+        interval_ms: Sampling interval.
+        max_files: Profiles kept on disk; older ones are deleted.
+        max_active: Requests profiled at once; further ones are not profiled.
+    """
+
+    def __init__(
+        self,
+        directory: str = PROFILE_DIR,
+        interval_ms: float = PROFILE_INTERVAL_MS,
+        max_files: int = PROFILE_MAX_FILES,
+        max_active: int = PROFILE_MAX_ACTIVE,
+    ):
+        self.directory = Path(directory)
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+        self.max_active = max_active
+        self._active: list[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._factories: dict[asyncio.AbstractEventLoop, tuple[Any, int]] = {}
+        self._stats = {"profiled": 0, "skipped_busy": 0, "samples": 0, "write_errors": 0}
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        with self._lock:
+            active = list(self._active)
+        for profile in active:
+            if time.monotonic() - profile.started > PROFILE_MAX_SECONDS:
+                continue
+            sampled = False
+            try:
+                task = asyncio.current_task(profile.loop)
+            except RuntimeError:
+                task = None
+            if task is not None and task in profile.tasks:
+                frame = frames.get(profile.loop_thread)
+                if frame is not None:
+                    profile.add(_collapse(frame, "event-loop"))
+                    sampled = True
+            for ident in list(profile.threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.add(_collapse(frame, _pool_suffix.sub("", names.get(ident, "worker"))))
+                    sampled = True
+            if not sampled:
+                profile.add(IDLE_FRAME)
+            self._stats["samples"] += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+            self._sample()
+            time.sleep(self.interval)
+
+    def _install_task_factory(self, loop: asyncio.AbstractEventLoop) -> None:
+        previous, users = self._factories.get(loop, (None, 0))
+        if users == 0:
+            previous = loop.get_task_factory()
+
+            def factory(loop, coro, **kwargs):
+                if previous is not None:
+                    task = previous(loop, coro, **kwargs)
+                else:
+                    task = asyncio.Task(coro, loop=loop, **kwargs)
+                context = kwargs.get("context")
+                profile = context.get(_active_profile) if context is not None else _active_profile.get()
+                if profile is not None:
+                    profile.tasks.add(task)
+                return task
+
+            loop.set_task_factory(factory)
+        self._factories[loop] = (previous, users + 1)
+
+    def _remove_task_factory(self, loop: asyncio.AbstractEventLoop) -> None:
+        previous, users = self._factories[loop]
+        if users == 1:
+            loop.set_task_factory(previous)
+            del self._factories[loop]
+        else:
+            self._factories[loop] = (previous, users - 1)
+
+    def start(self, method: str, path: str, reason: str) -> Profile | None:
+        """Start sampling the current task and the tasks it creates.
+
+        The caller sets the active profile for the request's context. Returns
+        ``None`` if ``max_active`` requests are already being profiled.
+        """
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                self._stats["skipped_busy"] += 1
+                return None
+            profile = Profile(method, path, reason)
+            profile.tasks.add(asyncio.current_task())
+            self._active.append(profile)
+            self._stats["profiled"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._install_task_factory(profile.loop)
+        return profile
+
+    def stop(self, profile: Profile) -> None:
+        """Stop sampling ``profile``."""
+        self._remove_task_factory(profile.loop)
+        with self._lock:
+            self._active.remove(profile)
+        profile.tasks.clear()
+
+    def save(self, profile: Profile) -> None:
+        """Write ``profile`` and delete the oldest ones beyond ``max_files``."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            lines = [f"{stack} {count}" for stack, count in sorted(profile.stacks.items())]
+            (self.directory / f"{profile.id}.collapsed").write_text("\n".join(lines) + "\n")
+            (self.directory / f"{profile.id}.json").write_text(json.dumps(profile.summary()))
+            for summary in sorted(self.directory.glob("*.json"))[:-self.max_files or None]:
+                summary.unlink(missing_ok=True)
+                summary.with_suffix(".collapsed").unlink(missing_ok=True)
+        except OSError as e:
+            self._stats["write_errors"] += 1
+            logger.warning("could not store profile %s: %s", profile.id, e)
+
+    def list(self) -> list[dict[str, Any]]:
+        """Summaries of the stored profiles, newest first."""
+        if not self.directory.is_dir():
+            return []
+        summaries = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                summaries.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return summaries
+
+    def path(self, profile_id: str) -> Path:
+        """The collapsed-stack file of a stored profile.
+
+        Raises:
+            HTTPException: 404 if there is no such profile.
+        """
+        if not re.fullmatch(r"[0-9T]+-[0-9a-f]{8}", profile_id):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        path = self.directory / f"{profile_id}.collapsed"
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return path
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, active=len(self._active))
+
+
+profiler = Profiler()
+
+
+def propagate(func: Callable[..., T], *args: Any, **kwargs: Any) -> Callable[[], T]:
+    """Bind a call for a worker thread to the caller's context.
+
+    The returned callable runs ``func`` in a copy of the current context
+    (so request timings and the active profile follow it) and, while a
+    profile is active, has the worker thread sampled for its duration.
+    """
+    context = contextvars.copy_context()
+
+    def call() -> T:
+        profile = context.get(_active_profile)
+        if profile is None:
+            return context.run(func, *args, **kwargs)
+        ident = threading.get_ident()
+        profile.threads[ident] = profile.threads.get(ident, 0) + 1
+        try:
+            return context.run(func, *args, **kwargs)
+        finally:
+            remaining = profile.threads.pop(ident) - 1
+            if remaining:
+                profile.threads[ident] = remaining
+
+    return call
+
+
+def _profile_reason(scope, secret: str, sample_rate: float) -> str | None:
+    if secret:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                if verify(value.decode("latin-1"), f"request:{scope['path']}", secret):
+                    return "header"
+                break
+    if sample_rate > 0 and random.random() < sample_rate:
+        return "sampled"
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it (see module docs).
+
+    Args:
+        app: The wrapped application.
+        secret: Key for ``X-Profile`` tokens; header profiling is off without one.
+        sample_rate: Fraction of requests profiled at random.
+    """
+
+    def __init__(self, app, profiler: Profiler = profiler, secret: str = PROFILE_SECRET, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.profiler = profiler
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.enabled = bool(secret) or sample_rate > 0
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = _profile_reason(scope, self.secret, self.sample_rate)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.start(scope["method"], scope["path"], reason)
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+        token = _active_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = dict(message, headers=[*message.get("headers", []), (b"x-profile-id", profile.id.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _active_profile.reset(token)
+            self.profiler.stop(profile)
+            profile.duration_ms = round((time.monotonic() - profile.started) * 1000, 1)
+            profile.route = getattr(scope.get("route"), "path", None)
+            await asyncio.to_thread(self.profiler.save, profile)
+
+
+def require_profile_admin(x_profile_token: str | None = Header(None)) -> None:
+    """
+    FastAPI dependency for the profile admin endpoints.
+
+    Raises:
+        HTTPException: 403 unless ``X-Profile-Token`` is a valid ``admin`` token.
+    """
+    if not verify(x_profile_token or "", "admin"):
+        raise HTTPException(status_code=403, detail="Profile admin token required")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print a profiling token signed with PROFILE_SECRET.")
+    parser.add_argument("path", help="Request path to profile (sent as X-Profile), or 'admin' (sent as X-Profile-Token).")
+    parser.add_argument("--ttl", type=float, default=300, help="Validity in seconds.")
+    args = parser.parse_args()
+    if not PROFILE_SECRET:
+        sys.exit("PROFILE_SECRET is not set")
+    print(sign(args.path if args.path == "admin" else f"request:{args.path}", args.ttl))
@@ -0,0 +1,156 @@
+"""Per-request timing spans and model token usage.
+
+:class:`TimingMiddleware` gives every HTTP request a :class:`RequestTimings`
+held in a context variable. Code anywhere below the route wraps a stage in
+``with span("model"):``; the duration is added to the request's timings and
+observed in the ``stage_duration_seconds`` histogram. Spans also work
+outside a request (book jobs, benchmarks), where only the histogram is fed.
+
+Context variables follow ``await`` and new tasks. Work sent to a thread pool
+keeps them only if it is started with a copied context (see
+:func:`app.services.observability.profiler.propagate`); ``asyncio.to_thread``
+does this already.
+
+When a request finishes, the middleware observes
+``http_request_duration_seconds`` and, for requests that recorded spans or
+token usage, logs one structured line on the ``app.timing`` logger, e.g.::
+
+    {"method": "POST", "route": "/character", "status": 200, "total_ms": 2311.4,
+     "spans_ms": {"upload": 3.1, "preprocess": 41.7, "model": 2204.9, ...},
+     "tokens": {"input": 1290, "output": 788}}
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from app.services.observability.metrics import TOKEN_BUCKETS, registry
+
+timing_logger = logging.getLogger("app.timing")
+
+stage_duration = registry.histogram(
+    "stage_duration_seconds", "Duration of instrumented stages (upload, preprocess, model, parse, db, ...).", ("stage",)
+)
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request duration until the response has been sent.", ("method", "route", "status")
+)
+model_tokens = registry.counter("model_tokens_total", "Tokens reported by the model provider.", ("operation", "kind"))
+model_call_tokens = registry.histogram(
+    "model_call_tokens", "Tokens per model call.", ("operation", "kind"), buckets=TOKEN_BUCKETS
+)
+
+
+class RequestTimings:
+    """Spans and token counts accumulated while serving one request.
+
+    Durations of spans with the same name add up (e.g. one ``model`` span per
+    photo in a batch). Updated from worker threads too, hence the lock.
+    """
+
+    def __init__(self):
+        self.spans_ms: dict[str, float] = {}
+        self.tokens: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, ms: float) -> None:
+        with self._lock:
+            self.spans_ms[name] = self.spans_ms.get(name, 0.0) + ms
+
+    def add_tokens(self, kind: str, count: int) -> None:
+        with self._lock:
+            self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+    def __bool__(self) -> bool:
+        return bool(self.spans_ms or self.tokens)
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> RequestTimings | None:
+    """The timings of the request being served, if any."""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the block as stage ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(elapsed, stage=name)
+        timings = _current.get()
+        if timings is not None:
+            timings.add_span(name, elapsed * 1000)
+
+
+def record_usage(operation: str, usage: Any) -> None:
+    """Record a provider's ``usage_metadata`` (input and output token counts).
+
+    Args:
+        operation: The kind of call, e.g. ``generate`` or ``stream``.
+        usage: An object with ``prompt_token_count`` and
+            ``candidates_token_count``; ``None`` is ignored.
+    """
+    if usage is None:
+        return
+    timings = _current.get()
+    for kind, attr in (("input", "prompt_token_count"), ("output", "candidates_token_count")):
+        count = getattr(usage, attr, None)
+        if not count:
+            continue
+        model_tokens.inc(count, operation=operation, kind=kind)
+        model_call_tokens.observe(count, operation=operation, kind=kind)
+        if timings is not None:
+            timings.add_tokens(kind, count)
+
+
+class TimingMiddleware:
+    """ASGI middleware opening a :class:`RequestTimings` per HTTP request.
+
+    Plain ASGI rather than ``BaseHTTPMiddleware``, so responses (including
+    streams) pass through untouched and the cost is one context variable
+    and a few clock reads per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            request_duration.observe(elapsed, method=scope["method"], route=route, status=str(status))
+            if timings and timing_logger.isEnabledFor(logging.INFO):
+                timing_logger.info(json.dumps({
+                    "method": scope["method"],
+                    "route": route,
+                    "status": status,
+                    "total_ms": round(elapsed * 1000, 1),
+                    "spans_ms": {k: round(v, 1) for k, v in timings.spans_ms.items()},
+                    "tokens": timings.tokens,
+                }, separators=(",", ":")))
@@ -0,0 +1,298 @@
+"""Precompiled prompt registry.
+
+Prompt templates live in ``app/system_messages`` and may reference schema
+files through ``{{TOON:<filename>}}`` placeholders. Assembling a prompt means
+reading the template, loading every referenced schema, converting it to TOON
+and splitting the result into a system message and a user prompt. None of
+that changes between requests, so the registry compiles each template once
+into an immutable :class:`CompiledPrompt` and serves it from memory.
+
+Invalidation is explicit: :meth:`PromptRegistry.refresh` stats the source
+files and only recompiles a template when an mtime changed *and* the content
+hash differs. In development an optional watcher thread calls ``refresh``
+periodically (``PROMPT_WATCH=1``) so edits to templates or schemas are picked
+up without a restart.
+
+Schemas are encoded with :func:`schema_to_toon` (dotted key paths, bare enum
+lists, annotations elided by ``PROMPT_TOON_VERBOSITY``). Setting
+``PROMPT_TOON_ENCODING=legacy`` restores the old ``json_to_toon`` output,
+which keeps nested objects as compact JSON.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from app.services.toon.toon_service import TOON_VERBOSITY_DEFAULT, encode_toon, json_to_toon, schema_to_toon
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join("app", "system_messages")
+SCHEMAS_DIR = os.path.join("app", "json_schemas")
+PROMPT_WATCH = os.getenv("PROMPT_WATCH", "0") == "1"
+PROMPT_WATCH_INTERVAL = float(os.getenv("PROMPT_WATCH_INTERVAL", "2.0"))
+PROMPT_TOON_ENCODING = os.getenv("PROMPT_TOON_ENCODING", "schema")
+PROMPT_TOON_VERBOSITY = int(os.getenv("PROMPT_TOON_VERBOSITY", str(TOON_VERBOSITY_DEFAULT)))
+# Relative keys (``.x=1``) more than halve the schema; the template explains
+# them in a legend. Set to 0 for absolute paths if
+# ``python -m benchmarks.toon_encoding --parse`` shows the model misreads them.
+PROMPT_TOON_RELATIVE = os.getenv("PROMPT_TOON_RELATIVE", "1") == "1"
+
+DEFAULT_SYSTEM_MESSAGE = "You are an advanced AI model tasked with analyzing images of individuals. Respond in TOON format."
+DEFAULT_PROMPT_BODY = "Analyze the provided image and extract the details about the person, responding ONLY in TOON format."
+RESPONSE_FORMAT_SUFFIX = "\n\nRespond ONLY in TOON format (compact key=value pairs, use `|` or newlines to separate)."
+
+_TOON_PLACEHOLDER = re.compile(r"\{\{TOON:([^}]+)\}\}")
+TOON_ENCODINGS = ("legacy", "paths", "schema")
+
+
+def encode_schema(
+    schema: dict,
+    encoding: str = PROMPT_TOON_ENCODING,
+    verbosity: int = PROMPT_TOON_VERBOSITY,
+    relative: bool = PROMPT_TOON_RELATIVE,
+) -> str:
+    """Encode a schema file's content for inclusion in a system message.
+
+    Args:
+        schema: The parsed JSON file.
+        encoding: ``"legacy"`` (:func:`json_to_toon`), ``"paths"`` (lossless
+            :func:`encode_toon` with absolute keys) or ``"schema"``
+            (:func:`schema_to_toon` at ``verbosity``).
+        verbosity: Annotation level used by the ``"schema"`` encoding.
+        relative: Whether the ``"schema"`` encoding writes relative keys.
+
+    Raises:
+        ValueError: If ``encoding`` is unknown.
+    """
+    if encoding == "legacy":
+        return json_to_toon(schema)
+    if encoding == "paths":
+        return encode_toon(schema, relative=False)
+    if encoding == "schema":
+        return schema_to_toon(schema, verbosity, relative=relative)
+    raise ValueError(f"Unknown TOON encoding {encoding!r}; expected one of {TOON_ENCODINGS}")
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """An immutable, ready-to-send prompt.
+
+    Attributes:
+        name: Registry name of the template (e.g. ``"character"``).
+        system_message: The processed system message.
+        prompt: The user prompt, including the response-format suffix.
+        version: Short content hash over the template and every schema it
+            references. Changes whenever any input changes.
+        sources: ``(path, mtime_ns)`` pairs for each input file that existed
+            at compile time.
+    """
+
+    name: str
+    system_message: str
+    prompt: str
+    version: str
+    sources: tuple[tuple[str, int], ...]
+
+    @property
+    def size(self) -> dict[str, int]:
+        """Report the compiled prompt's size.
+
+        ``approx_tokens`` uses the usual ~4 characters per token heuristic;
+        it is meant for trend tracking, not billing.
+        """
+        system_chars = len(self.system_message)
+        prompt_chars = len(self.prompt)
+        return {
+            "system_chars": system_chars,
+            "prompt_chars": prompt_chars,
+            "total_chars": system_chars + prompt_chars,
+            "total_bytes": len(self.system_message.encode("utf-8")) + len(self.prompt.encode("utf-8")),
+            "approx_tokens": (system_chars + prompt_chars + 3) // 4,
+        }
+
+
+def _mtime_ns(path: str) -> int:
+    """Return the mtime of ``path`` in nanoseconds, or -1 if it is missing."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _read_text(path: str) -> str | None:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class PromptRegistry:
+    """Compile prompt templates once and serve them from memory.
+
+    Args:
+        templates_dir: Directory holding ``<name>_prompt.txt`` templates.
+        schemas_dir: Directory holding the JSON files referenced by
+            ``{{TOON:...}}`` placeholders.
+        toon_encoding: How schemas are encoded, see :func:`encode_schema`.
+        toon_verbosity: Annotation level for the ``"schema"`` encoding.
+        toon_relative: Relative keys for the ``"schema"`` encoding.
+    """
+
+    def __init__(
+        self,
+        templates_dir: str = TEMPLATES_DIR,
+        schemas_dir: str = SCHEMAS_DIR,
+        toon_encoding: str = PROMPT_TOON_ENCODING,
+        toon_verbosity: int = PROMPT_TOON_VERBOSITY,
+        toon_relative: bool = PROMPT_TOON_RELATIVE,
+    ):
+        if toon_encoding not in TOON_ENCODINGS:
+            raise ValueError(f"Unknown TOON encoding {toon_encoding!r}; expected one of {TOON_ENCODINGS}")
+        self.templates_dir = templates_dir
+        self.schemas_dir = schemas_dir
+        self.toon_encoding = toon_encoding
+        self.toon_verbosity = toon_verbosity
+        self.toon_relative = toon_relative
+        self._compiled: dict[str, CompiledPrompt] = {}
+        self._lock = threading.Lock()
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def template_path(self, name: str) -> str:
+        return os.path.join(self.templates_dir, f"{name}_prompt.txt")
+
+    def compile(self, name: str) -> CompiledPrompt:
+        """Compile the template ``name`` and store the result.
+
+        Missing templates fall back to a generic system message and prompt;
+        missing or unreadable schema files are replaced with an empty string
+        so the caller can still proceed.
+        """
+        template_path = self.template_path(name)
+        template = _read_text(template_path)
+        sources: list[tuple[str, int]] = [(template_path, _mtime_ns(template_path))]
+        digest = hashlib.sha256()
+
+        if template is None:
+            template = DEFAULT_SYSTEM_MESSAGE
+        digest.update(template.encode("utf-8"))
+        digest.update(f"{self.toon_encoding}:{self.toon_verbosity}:{self.toon_relative}".encode("utf-8"))
+
+        def _loader(match: re.Match) -> str:
+            fname = match.group(1).strip()
+            schema_path = os.path.join(self.schemas_dir, fname)
+            sources.append((schema_path, _mtime_ns(schema_path)))
+            raw = _read_text(schema_path)
+            if raw is None:
+                return ""
+            digest.update(fname.encode("utf-8"))
+            digest.update(raw.encode("utf-8"))
+            try:
+                return encode_schema(json.loads(raw), self.toon_encoding, self.toon_verbosity, self.toon_relative)
+            except Exception:
+                return ""
+
+        processed = _TOON_PLACEHOLDER.sub(_loader, template)
+
+        # Split the processed template into header (system message) and the
+        # user prompt on 'PROMPT:'. If not present, fall back to defaults.
+        if "PROMPT:" in processed:
+            header, after = processed.split("PROMPT:", 1)
+            system_message = header.strip()
+            prompt_body = after.strip()
+        else:
+            system_message = processed.strip()
+            prompt_body = DEFAULT_PROMPT_BODY
+
+        compiled = CompiledPrompt(
+            name=name,
+            system_message=system_message,
+            prompt=prompt_body + RESPONSE_FORMAT_SUFFIX,
+            version=digest.hexdigest()[:16],
+            sources=tuple(sources),
+        )
+        with self._lock:
+            self._compiled[name] = compiled
+        logger.info("compiled prompt %r version=%s size=%s", name, compiled.version, compiled.size)
+        return compiled
+
+    def get(self, name: str) -> CompiledPrompt:
+        """Return the compiled prompt ``name``, compiling it on first use."""
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            compiled = self.compile(name)
+        return compiled
+
+    def compile_all(self) -> list[CompiledPrompt]:
+        """Compile every ``*_prompt.txt`` template found in ``templates_dir``."""
+        try:
+            entries = sorted(os.listdir(self.templates_dir))
+        except OSError:
+            entries = []
+        return [self.compile(e[: -len("_prompt.txt")]) for e in entries if e.endswith("_prompt.txt")]
+
+    def refresh(self) -> list[str]:
+        """Recompile templates whose inputs changed on disk.
+
+        A template is recompiled only when one of its source mtimes moved and
+        the recompiled content hash differs from the cached version, so a
+        ``touch`` alone does not churn the version.
+
+        Returns:
+            Names of templates whose version changed.
+        """
+        changed: list[str] = []
+        for name, compiled in list(self._compiled.items()):
+            if all(_mtime_ns(path) == mtime for path, mtime in compiled.sources):
+                continue
+            recompiled = self.compile(name)
+            if recompiled.version != compiled.version:
+                changed.append(name)
+        return changed
+
+    def start_watcher(self, interval: float = PROMPT_WATCH_INTERVAL, hooks: Iterable[Callable[[], Any]] = ()) -> None:
+        """Start a daemon thread that calls :meth:`refresh` every ``interval`` seconds.
+
+        Args:
+            interval: Seconds between passes.
+            hooks: Called after every pass, for state compiled from the same
+                files (e.g. the character schema validator).
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        hooks = tuple(hooks)
+
+        def _run():
+            while not self._stop.wait(interval):
+                try:
+                    for name in self.refresh():
+                        logger.info("prompt %r reloaded", name)
+                except Exception:
+                    logger.exception("prompt watcher refresh failed")
+                for hook in hooks:
+                    try:
+                        hook()
+                    except Exception:
+                        logger.exception("prompt watcher hook %r failed", hook)
+
+        self._watcher = threading.Thread(target=_run, name="prompt-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        """Stop the watcher thread if it is running."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+
+prompt_registry = PromptRegistry()
@@ -0,0 +1,198 @@
+"""Declarative index management for the application collections.
+
+Indexes are declared once in :data:`INDEXES` and created at startup by
+:meth:`IndexManager.ensure`, which is idempotent: an index that already
+exists with the declared keys and options is left alone, a missing one is
+created, and one that exists under the same name with a different
+definition is reported as a conflict rather than dropped.
+
+:meth:`IndexManager.report` compares the declarations with what is on the
+server and lists missing, conflicting and undeclared indexes, plus declared
+indexes that ``$indexStats`` shows have never been used since the server
+started.
+
+The unique ``users.email`` index is what enforces one account per email:
+signup inserts directly and treats a duplicate-key error as "already
+registered" instead of reading first.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.mongodb import MongoResource, mongo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """One declared index.
+
+    Attributes:
+        collection: Collection name.
+        keys: ``(field, direction)`` pairs, as passed to ``create_index``.
+        name: Index name; also used to match existing indexes.
+        unique: Whether the index is unique.
+        options: Further ``create_index`` options (``partialFilterExpression``,
+            ``expireAfterSeconds``, ...).
+    """
+
+    collection: str
+    keys: tuple[tuple[str, int], ...]
+    name: str
+    unique: bool = False
+    options: dict[str, Any] = field(default_factory=dict)
+
+    def matches(self, info: dict[str, Any]) -> bool:
+        """Whether an ``index_information()`` entry has this definition."""
+        if tuple((k, int(d)) for k, d in info.get("key", [])) != self.keys:
+            return False
+        if bool(info.get("unique", False)) != self.unique:
+            return False
+        return all(info.get(option) == value for option, value in self.options.items())
+
+
+INDEXES: list[IndexSpec] = [
+    IndexSpec("users", (("email", 1),), "email_unique", unique=True),
+    IndexSpec(
+        "users",
+        (("oauth_provider", 1), ("oauth_id", 1)),
+        "oauth_identity_unique",
+        unique=True,
+        options={"partialFilterExpression": {"oauth_id": {"$type": "string"}}},
+    ),
+    # Character listings are always scoped to the owner and sorted by _id
+    # (equality, sort, range), so each filter gets an index in that order.
+    # Plain owner listings use the (owner_id, _id) prefix of the second one;
+    # its created_at range is checked on index keys, without fetching.
+    IndexSpec(
+        "characters",
+        (("owner_id", 1), ("image_sha256", 1), ("_id", -1)),
+        "owner_image_sha256_id_desc",
+        options={"partialFilterExpression": {"owner_id": {"$exists": True}}},
+    ),
+    IndexSpec(
+        "characters",
+        (("owner_id", 1), ("_id", -1), ("created_at", -1)),
+        "owner_id_desc_created_at",
+        options={"partialFilterExpression": {"owner_id": {"$exists": True}}},
+    ),
+    # One character per photo per book; lets a resumed extract stage upsert.
+    IndexSpec(
+        "characters",
+        (("book_id", 1), ("image_sha256", 1)),
+        "book_image_unique",
+        unique=True,
+        options={"partialFilterExpression": {"book_id": {"$exists": True}}},
+    ),
+    # Quota buckets untouched for a day are full again; drop them.
+    IndexSpec("rate_limits", (("updated_at", 1),), "updated_at_ttl", options={"expireAfterSeconds": 86400}),
+]
+
+
+def unique_keys(collection: str, specs: list[IndexSpec] = INDEXES) -> list[tuple[str, ...]]:
+    """Field tuples covered by unique indexes on ``collection``.
+
+    Lets in-memory stand-ins enforce the same uniqueness as the server.
+    """
+    return [tuple(k for k, _ in s.keys) for s in specs if s.collection == collection and s.unique]
+
+
+class IndexManager:
+    """Create, verify and report on the declared indexes.
+
+    Args:
+        resource: Source of (sync) collections.
+        specs: The declared indexes.
+    """
+
+    def __init__(self, resource: MongoResource = mongo, specs: list[IndexSpec] = INDEXES):
+        self.resource = resource
+        self.specs = specs
+
+    def _collections(self) -> list[str]:
+        return sorted({s.collection for s in self.specs})
+
+    def ensure(self) -> dict[str, list[str]]:
+        """Create missing indexes; never drops or rebuilds existing ones.
+
+        Returns:
+            ``created``, ``present`` and ``conflicts`` as lists of
+            ``collection.name`` strings.
+        """
+        outcome: dict[str, list[str]] = {"created": [], "present": [], "conflicts": []}
+        for name in self._collections():
+            collection = self.resource.collection(name)
+            existing = collection.index_information()
+            for spec in (s for s in self.specs if s.collection == name):
+                label = f"{name}.{spec.name}"
+                info = existing.get(spec.name)
+                if info is not None:
+                    outcome["present" if spec.matches(info) else "conflicts"].append(label)
+                    continue
+                try:
+                    collection.create_index(list(spec.keys), name=spec.name, unique=spec.unique, **spec.options)
+                    outcome["created"].append(label)
+                except OperationFailure as e:
+                    # Same keys under another name, or existing duplicates
+                    # that prevent a unique index from being built.
+                    logger.error("could not create index %s: %s", label, e)
+                    outcome["conflicts"].append(label)
+        if outcome["created"]:
+            logger.info("created indexes: %s", ", ".join(outcome["created"]))
+        if outcome["conflicts"]:
+            logger.warning("index conflicts (not modified): %s", ", ".join(outcome["conflicts"]))
+        return outcome
+
+    def report(self) -> dict[str, list[str] | dict[str, int]]:
+        """Compare the declarations with the server.
+
+        Returns:
+            ``missing``, ``conflicts``, ``undeclared`` (on the server but not
+            declared, ``_id_`` excluded) and ``unused`` (declared, present,
+            with zero recorded accesses) as ``collection.name`` lists, and
+            ``accesses`` per present index when ``$indexStats`` is available.
+        """
+        report: dict[str, Any] = {"missing": [], "conflicts": [], "undeclared": [], "unused": [], "accesses": {}}
+        for name in self._collections():
+            collection = self.resource.collection(name)
+            existing = collection.index_information()
+            declared = {s.name: s for s in self.specs if s.collection == name}
+            for index_name, spec in declared.items():
+                info = existing.get(index_name)
+                if info is None:
+                    report["missing"].append(f"{name}.{index_name}")
+                elif not spec.matches(info):
+                    report["conflicts"].append(f"{name}.{index_name}")
+            report["undeclared"] += [f"{name}.{n}" for n in existing if n != "_id_" and n not in declared]
+            try:
+                stats = list(collection.aggregate([{"$indexStats": {}}]))
+            except PyMongoError as e:
+                logger.info("$indexStats unavailable for %s: %s", name, e)
+                continue
+            for entry in stats:
+                label = f"{name}.{entry['name']}"
+                ops = int(entry.get("accesses", {}).get("ops", 0))
+                report["accesses"][label] = ops
+                if entry["name"] in declared and ops == 0:
+                    report["unused"].append(label)
+        return report
+
+
+index_manager = IndexManager()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Create or report on the declared MongoDB indexes.")
+    parser.add_argument("--ensure", action="store_true", help="create missing indexes before reporting")
+    args = parser.parse_args()
+    if args.ensure:
+        print(json.dumps(index_manager.ensure(), indent=2))
+    print(json.dumps(index_manager.report(), indent=2))
@@ -0,0 +1,208 @@
+"""In-memory stand-in for ``AsyncCollection``.
+
+Implements the subset of the async collection API the repositories use, with
+equality and comparison (``$lt``, ``$lte``, ``$gt``, ``$gte``) filters on
+(dotted) paths, inclusion projections, sorted/limited cursors, ``$set``/``$setOnInsert`` updates (with upsert), single deletes and optional
+unique fields that raise ``DuplicateKeyError`` like a unique index would. Meant for tests and
+offline runs; there is no persistence.
+"""
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+
+@dataclass
+class InsertOneResult:
+    inserted_id: Any
+
+
+@dataclass
+class InsertManyResult:
+    inserted_ids: list[Any]
+
+
+@dataclass
+class DeleteResult:
+    deleted_count: int
+
+
+@dataclass
+class UpdateResult:
+    matched_count: int
+    modified_count: int
+
+
+def _lookup(document: dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+_COMPARISONS = {
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+}
+
+
+def _matches(document: dict[str, Any], filter: dict[str, Any]) -> bool:
+    for key, condition in filter.items():
+        value = _lookup(document, key)
+        if isinstance(condition, dict) and condition and all(op in _COMPARISONS for op in condition):
+            if not all(_COMPARISONS[op](value, operand) for op, operand in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _copy_path(source: dict[str, Any], target: dict[str, Any], parts: list[str]) -> None:
+    head, rest = parts[0], parts[1:]
+    if head not in source:
+        return
+    if not rest:
+        target[head] = source[head]
+    elif isinstance(source[head], dict):
+        _copy_path(source[head], target.setdefault(head, {}), rest)
+
+
+def _project(document: dict[str, Any], projection: dict[str, int] | None) -> dict[str, Any]:
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    included = [k for k, v in projection.items() if v]
+    if included:
+        kept: dict[str, Any] = {}
+        for path in included:
+            _copy_path(document, kept, path.split("."))
+        if projection.get("_id", 1) and "_id" in document:
+            kept["_id"] = document["_id"]
+        return kept
+    return {k: v for k, v in document.items() if k not in projection}
+
+
+class InMemoryCursor:
+    """Result of :meth:`InMemoryCollection.find`; supports sort, limit and to_list."""
+
+    def __init__(self, documents: list[dict[str, Any]]):
+        self._documents = documents
+        self._limit = 0
+
+    def sort(self, key: str, direction: int = 1) -> "InMemoryCursor":
+        self._documents.sort(key=lambda d: _lookup(d, key), reverse=direction < 0)
+        return self
+
+    def limit(self, limit: int) -> "InMemoryCursor":
+        self._limit = limit
+        return self
+
+    async def to_list(self, length: int | None = None) -> list[dict[str, Any]]:
+        documents = self._documents
+        for bound in (self._limit, length):
+            if bound:
+                documents = documents[:bound]
+        return documents
+
+
+class InMemoryCollection:
+    """A list of documents behind an async, ``AsyncCollection``-like API.
+
+    Args:
+        unique: Field names (or tuples of field names) that must be unique
+            across documents, mirroring unique indexes.
+        fail_with: Optional exception raised by every operation, to exercise
+            error handling.
+    """
+
+    def __init__(self, documents: Iterable[dict[str, Any]] = (), unique: Iterable[str | tuple[str, ...]] = (), fail_with: Exception | None = None):
+        self.documents: list[dict[str, Any]] = [copy.deepcopy(d) for d in documents]
+        self.unique = [(u,) if isinstance(u, str) else tuple(u) for u in unique]
+        self.fail_with = fail_with
+
+    def _check(self) -> None:
+        if self.fail_with is not None:
+            raise self.fail_with
+
+    def _check_unique(self, document: dict[str, Any]) -> None:
+        for fields in self.unique:
+            key = {f: _lookup(document, f) for f in fields}
+            if all(v is None for v in key.values()):
+                continue
+            if any(_matches(d, key) for d in self.documents):
+                raise DuplicateKeyError(f"E11000 duplicate key error: {key}", 11000, {"keyValue": key})
+
+    async def find_one(self, filter: dict[str, Any] | None = None, projection=None) -> dict[str, Any] | None:
+        self._check()
+        for document in self.documents:
+            if _matches(document, filter or {}):
+                return _project(document, projection)
+        return None
+
+    def find(self, filter: dict[str, Any] | None = None, projection=None) -> InMemoryCursor:
+        self._check()
+        return InMemoryCursor([_project(d, projection) for d in self.documents if _matches(d, filter or {})])
+
+    async def insert_one(self, document: dict[str, Any]) -> InsertOneResult:
+        self._check()
+        document.setdefault("_id", ObjectId())
+        self._check_unique(document)
+        self.documents.append(copy.deepcopy(document))
+        return InsertOneResult(document["_id"])
+
+    async def insert_many(self, documents: list[dict[str, Any]], ordered: bool = True) -> InsertManyResult:
+        self._check()
+        ids = []
+        for document in documents:
+            ids.append((await self.insert_one(document)).inserted_id)
+        return InsertManyResult(ids)
+
+    async def count_documents(self, filter: dict[str, Any]) -> int:
+        self._check()
+        return sum(_matches(d, filter) for d in self.documents)
+
+    async def update_one(self, filter: dict[str, Any], update: dict[str, Any]) -> UpdateResult:
+        self._check()
+        for document in self.documents:
+            if _matches(document, filter):
+                document.update(copy.deepcopy(update.get("$set", {})))
+                return UpdateResult(1, 1)
+        return UpdateResult(0, 0)
+
+    async def delete_one(self, filter: dict[str, Any]) -> DeleteResult:
+        self._check()
+        for index, document in enumerate(self.documents):
+            if _matches(document, filter):
+                del self.documents[index]
+                return DeleteResult(1)
+        return DeleteResult(0)
+
+    async def find_one_and_update(
+        self,
+        filter: dict[str, Any],
+        update: dict[str, Any],
+        projection=None,
+        upsert: bool = False,
+        return_document: bool = False,
+    ) -> dict[str, Any] | None:
+        self._check()
+        for document in self.documents:
+            if _matches(document, filter):
+                before = _project(document, projection)
+                document.update(copy.deepcopy(update.get("$set", {})))
+                return _project(document, projection) if return_document else before
+        if not upsert:
+            return None
+        document = {k: v for k, v in filter.items() if not isinstance(v, dict)}
+        document.update(update.get("$setOnInsert", {}))
+        document.update(update.get("$set", {}))
+        await self.insert_one(document)
+        return _project(document, projection) if return_document else None
@@ -0,0 +1,204 @@
+"""Async data-access layer for characters and users.
+
+Request handlers must not block the event loop on database round trips, so
+the services that write characters (``character_crud``) and users
+(``signup_service``, ``oauth_service``) go through the repositories here,
+which await PyMongo's async API (``AsyncCollection``).
+
+A repository only needs an object with the ``AsyncCollection`` methods it
+uses, so tests can swap in :class:`~app.services.repository.memory.InMemoryCollection`
+instead of a real database.
+
+Database errors are mapped the same way everywhere by :func:`db_errors`:
+
+- duplicate key -> ``409`` (:class:`DuplicateRecord`, so callers can tell
+  a unique-index violation apart and answer with their own message);
+- no server, network or pool timeouts -> ``503``;
+- any other PyMongo error -> ``500``.
+"""
+from __future__ import annotations
+
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import (
+    AutoReconnect,
+    ConnectionFailure,
+    DuplicateKeyError,
+    ExecutionTimeout,
+    PyMongoError,
+    WaitQueueTimeoutError,
+)
+
+from app.mongodb import LazyCollection, mongo
+
+_UNAVAILABLE = (ConnectionFailure, AutoReconnect, WaitQueueTimeoutError, ExecutionTimeout)
+
+
+class DuplicateRecord(HTTPException):
+    """A write was rejected by a unique index.
+
+    Attributes:
+        key_value: The duplicated key, as reported by the server.
+    """
+
+    def __init__(self, what: str, key_value: Any = None):
+        super().__init__(status_code=409, detail=f"Duplicate {what}: {key_value}")
+        self.key_value = key_value
+
+
+@contextmanager
+def db_errors(what: str) -> Iterator[None]:
+    """Translate PyMongo errors raised inside the block into ``HTTPException``.
+
+    Args:
+        what: Short description of the operation, used in the error detail.
+    """
+    try:
+        yield
+    except DuplicateKeyError as e:
+        raise DuplicateRecord(what, (e.details or {}).get("keyValue"))
+    except _UNAVAILABLE as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable while trying to {what}: {str(e)}")
+    except PyMongoError as e:
+        raise HTTPException(status_code=500, detail=f"MongoDB operation error: {str(e)}")
+
+
+class CharacterRepository:
+    """Character documents.
+
+    Args:
+        collection: An ``AsyncCollection`` (or compatible stand-in).
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert(self, document: dict[str, Any]) -> str:
+        """Insert one character and return its id as a string."""
+        with db_errors("insert character"):
+            result = await self.collection.insert_one(document)
+        return str(result.inserted_id)
+
+    async def insert_many(self, documents: list[dict[str, Any]]) -> list[str]:
+        """Insert several characters in order and return their ids."""
+        if not documents:
+            return []
+        with db_errors("insert characters"):
+            result = await self.collection.insert_many(documents, ordered=True)
+        return [str(i) for i in result.inserted_ids]
+
+    async def upsert_many(self, documents: list[dict[str, Any]], keys: tuple[str, ...]) -> list[str]:
+        """Insert each document unless one with the same ``keys`` values exists.
+
+        Returns:
+            list[str]: The id of the new or already stored document, in input order.
+        """
+
+        async def upsert(document: dict[str, Any]) -> str:
+            with db_errors("upsert character"):
+                stored = await self.collection.find_one_and_update(
+                    {k: document[k] for k in keys},
+                    {"$setOnInsert": document},
+                    projection={"_id": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            return str(stored["_id"])
+
+        return list(await asyncio.gather(*[upsert(d) for d in documents]))
+
+    async def get(self, character_id: Any, owner_id: str, projection: dict[str, int] | None = None) -> dict[str, Any] | None:
+        """Return one of ``owner_id``'s characters by ``_id`` (only the projected fields), or ``None``."""
+        with db_errors("read character"):
+            return await self.collection.find_one({"_id": character_id, "owner_id": owner_id}, projection)
+
+    async def find_page(
+        self,
+        filter: dict[str, Any],
+        projection: dict[str, int] | None = None,
+        before_id: Any = None,
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """Return up to ``limit`` characters matching ``filter``, newest first.
+
+        Keyset pagination: ``before_id`` is the last ``_id`` of the previous
+        page, so every page is an index range scan regardless of how deep
+        the client has paged. ``filter`` must hold an ``owner_id`` and may
+        add the fields declared after it in the ``characters`` indexes
+        (``image_sha256``, ``created_at``); other filters are not indexed.
+        """
+        query = dict(filter)
+        if before_id is not None:
+            query["_id"] = {"$lt": before_id}
+        with db_errors("list characters"):
+            cursor = self.collection.find(query, projection).sort("_id", -1).limit(limit)
+            return await cursor.to_list(length=limit)
+
+
+class UserRepository:
+    """User documents.
+
+    Args:
+        collection: An ``AsyncCollection`` (or compatible stand-in).
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_by_email(self, email: str) -> dict[str, Any] | None:
+        """Return the user registered with ``email``, or ``None``."""
+        with db_errors("find user"):
+            return await self.collection.find_one({"email": email})
+
+    async def insert(self, document: dict[str, Any]) -> str:
+        """Insert one user and return its id as a string.
+
+        Raises:
+            DuplicateRecord: If the email (or OAuth identity) is taken.
+        """
+        with db_errors("insert user"):
+            result = await self.collection.insert_one(document)
+        return str(result.inserted_id)
+
+    async def get_or_create(self, email: str, fields: dict[str, Any]) -> dict[str, Any]:
+        """Return the user registered with ``email``, creating it from ``fields`` if absent.
+
+        One ``findOneAndUpdate`` with upsert, so a returning user costs a
+        single round trip. Two concurrent first logins can both try the
+        insert; the loser hits the unique email index and re-reads.
+
+        Raises:
+            DuplicateRecord: If the insert clashed on another unique key, e.g.
+                the OAuth identity already belongs to a user with a different
+                email.
+        """
+        query = {"email": email}
+        update = {"$setOnInsert": fields}
+        try:
+            with db_errors("upsert user"):
+                return await self.collection.find_one_and_update(
+                    query, update, upsert=True, return_document=ReturnDocument.AFTER
+                )
+        except DuplicateRecord:
+            user = await self.find_by_email(email)
+            if user is None:
+                raise
+            return user
+
+    async def set_password_hash(self, user_id: Any, hashed_password: str) -> None:
+        """Replace the stored password hash of a user (e.g. after a rehash)."""
+        with db_errors("update user"):
+            await self.collection.update_one({"_id": user_id}, {"$set": {"hashed_password": hashed_password}})
+
+    async def delete(self, user_id: Any) -> None:
+        """Delete one user (e.g. a signup that could not be completed)."""
+        with db_errors("delete user"):
+            await self.collection.delete_one({"_id": user_id})
+
+
+character_repository = CharacterRepository(LazyCollection(mongo, "characters", asynchronous=True))
+user_repository = UserRepository(LazyCollection(mongo, "users", asynchronous=True))
@@ -4,9 +4,20 @@ This module provides two primary helpers used across the application:
 
 - json_to_toon(obj) -> str: Convert a JSON-like dict into a compact TOON
   string (top-level keys flattened, nested dicts encoded as compact JSON)
+- encode_toon(obj) -> str: Lossless TOON encoding that writes nested
+  objects as dotted key paths (``general.view=front``) and string lists as
+  bare comma lists.
+- schema_to_toon(schema, verbosity) -> str: ``encode_toon`` for JSON
+  schemas, eliding annotations (titles, descriptions, ...) according to a
+  verbosity level. Used to put schemas into system messages.
 - toon_to_json(text) -> dict: Parse a TOON string back into a JSON-like
   dictionary. The parser is resilient to simple nested JSON values encoded
-  as compact JSON strings.
+  as compact JSON strings, and expands dotted keys into nested objects.
+- ToonStreamParser: the incremental parser behind toon_to_json, which
+  accepts model output chunk by chunk and emits each top-level key as soon
+  as its value is complete.
+- ToonSectionAssembler: regroups the parser's dotted paths into whole
+  top-level sections, for streams written with :func:`encode_toon`.
 
 The functions are intentionally conservative and focused on the project's
 character schema use-cases.
@@ -14,7 +25,8 @@ character schema use-cases.
 from __future__ import annotations
 
 import json
-from typing import Any
+import re
+from typing import Any, Iterable
 
 
 def json_to_toon(obj: dict[str, Any]) -> str:
@@ -62,14 +74,434 @@ def _parse_value(token: str) -> Any:
             return token
 
 
-def toon_to_json(text: str) -> dict[str, Any]:
+# Verbosity levels for schema_to_toon.
+TOON_VERBOSITY_MINIMAL = 0  # structure and constraints only
+TOON_VERBOSITY_DEFAULT = 1  # plus descriptions
+TOON_VERBOSITY_FULL = 2  # everything, including titles and examples
+
+# JSON-schema annotation keywords and the lowest verbosity that keeps them.
+_ANNOTATIONS = {
+    "description": TOON_VERBOSITY_DEFAULT,
+    "title": TOON_VERBOSITY_FULL,
+    "examples": TOON_VERBOSITY_FULL,
+    "$comment": TOON_VERBOSITY_FULL,
+    "$schema": TOON_VERBOSITY_FULL,
+    "$id": TOON_VERBOSITY_FULL,
+}
+# Keywords whose value is a map of names to subschemas.
+_SCHEMA_MAPS = ("properties", "patternProperties", "definitions", "$defs", "dependentSchemas")
+# Keywords whose value is a subschema or a list of subschemas.
+_SCHEMA_NODES = ("items", "additionalProperties", "additionalItems", "contains", "not", "if", "then", "else", "propertyNames")
+_SCHEMA_LISTS = ("allOf", "anyOf", "oneOf", "prefixItems")
+
+_PATH_RESERVED = set(".=:|\n\"")
+
+
+def _is_path_key(key: Any) -> bool:
+    """Whether ``key`` can be written as one segment of a dotted path."""
+    return (
+        isinstance(key, str)
+        and key != ""
+        and key == key.strip()
+        and key[0] not in "`{["
+        and not _PATH_RESERVED.intersection(key)
+    )
+
+
+def _encode_value(value: Any) -> str:
+    """Encode a leaf value so that ``_parse_value`` gives it back unchanged."""
+    if isinstance(value, str):
+        if value and value == value.strip() and not set(value) & set("|\n,\"{[") and _parse_value(value) == value:
+            return value
+    elif isinstance(value, (list, tuple)) and len(value) > 1 and all(isinstance(v, str) for v in value):
+        candidate = ",".join(value)
+        if "|" not in candidate and "\n" not in candidate and _parse_value(candidate) == list(value):
+            return candidate
+    encoded = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    if encoded[0] not in "{[":
+        # Scalars end at the next separator, so a pipe inside a quoted string
+        # has to be escaped; containers are scanned bracket by bracket.
+        encoded = encoded.replace("|", "\\u007c")
+    return encoded
+
+
+def _flatten(obj: dict[str, Any], prefix: list[str], pairs: list[tuple[list[str], str]]) -> None:
+    for key, value in obj.items():
+        path = prefix + [key]
+        if isinstance(value, dict) and value and all(_is_path_key(k) for k in value):
+            _flatten(value, path, pairs)
+        else:
+            pairs.append((path, _encode_value(value)))
+
+
+def _relative_key(path: list[str], previous: list[str] | None) -> str:
+    """Shortest key for ``path`` given the previously written path."""
+    absolute = ".".join(path)
+    if not previous:
+        return absolute
+    common = 0
+    while common < len(previous) - 1 and common < len(path) - 1 and previous[common] == path[common]:
+        common += 1
+    relative = "." * (len(previous) - common) + ".".join(path[common:])
+    return relative if len(relative) < len(absolute) else absolute
+
+
+def encode_toon(obj: dict[str, Any], separator: str = "\n", relative: bool = True) -> str:
+    """Encode a mapping as TOON with dotted paths for nested objects.
+
+    Nested objects are flattened into ``a.b.c=value`` pairs. With
+    ``relative`` a key may start with N dots instead of repeating a long
+    prefix: it continues the previous key's path after dropping its last N
+    segments, so ``a.b.c=1`` followed by ``.d=2`` sets ``a.b.d`` and
+    ``..x=3`` then sets ``a.x``. Lists of plain
+    strings are written as bare comma lists (``type=string,null``) and
+    strings that cannot be confused with another type are written unquoted.
+    Everything else (numbers, booleans, ``null``, mixed lists, objects with
+    keys that contain path characters) is compact JSON. The output is exact:
+    ``toon_to_json(encode_toon(obj)) == obj``.
+
+    Args:
+        obj: The mapping to encode. Top-level keys must be valid path
+            segments (no ``.``, ``=``, ``:``, ``|``, quotes or newlines).
+        separator: Pair separator, ``"\\n"`` or ``"|"``.
+        relative: Write dot-prefixed relative keys where they are shorter.
+
+    Returns:
+        The TOON string.
+
+    Raises:
+        ValueError: If a top-level key cannot be encoded.
+    """
+    for key in obj:
+        if not _is_path_key(key):
+            raise ValueError(f"Cannot encode top-level key {key!r} as TOON")
+    pairs: list[tuple[list[str], str]] = []
+    _flatten(obj, [], pairs)
+    lines: list[str] = []
+    previous = None
+    for path, value in pairs:
+        key = _relative_key(path, previous) if relative else ".".join(path)
+        lines.append(f"{key}={value}")
+        previous = path
+    return separator.join(lines)
+
+
+def _reduce_schema(node: Any, verbosity: int) -> Any:
+    if not isinstance(node, dict):
+        return node
+    reduced: dict[str, Any] = {}
+    for key, value in node.items():
+        if key in _ANNOTATIONS:
+            if verbosity >= _ANNOTATIONS[key]:
+                reduced[key] = value
+        elif key in _SCHEMA_MAPS and isinstance(value, dict):
+            reduced[key] = {name: _reduce_schema(sub, verbosity) for name, sub in value.items()}
+        elif key in _SCHEMA_NODES:
+            if isinstance(value, list):
+                reduced[key] = [_reduce_schema(sub, verbosity) for sub in value]
+            else:
+                reduced[key] = _reduce_schema(value, verbosity)
+        elif key in _SCHEMA_LISTS and isinstance(value, list):
+            reduced[key] = [_reduce_schema(sub, verbosity) for sub in value]
+        else:
+            reduced[key] = value
+    return reduced
+
+
+def schema_to_toon(schema: dict[str, Any], verbosity: int = TOON_VERBOSITY_DEFAULT, relative: bool = True) -> str:
+    """Encode a JSON schema as compact TOON for a system message.
+
+    The schema is walked keyword by keyword, so annotations are only elided
+    where they are schema keywords (a property that happens to be called
+    ``description`` is kept). Enum and type lists come out as bare comma
+    lists, e.g. ``properties.hair.properties.length.enum=short,long``.
+
+    Args:
+        schema: The JSON schema.
+        verbosity: ``TOON_VERBOSITY_MINIMAL`` drops every annotation,
+            ``TOON_VERBOSITY_DEFAULT`` keeps descriptions and
+            ``TOON_VERBOSITY_FULL`` keeps the schema unchanged.
+        relative: Write dot-prefixed relative keys (see :func:`encode_toon`).
+
+    Returns:
+        The TOON string; ``toon_to_json`` gives back the reduced schema.
+    """
+    return encode_toon(_reduce_schema(schema, verbosity), relative=relative)
+
+
+_SEPARATORS = "|\n"
+# Characters that matter while scanning a JSON value; everything else is
+# skipped in bulk.
+_JSON_SPECIAL = re.compile(r'[{}\[\]"\\]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class ToonStreamParser:
+    """Single-pass incremental TOON parser.
+
+    Feed the model output in arbitrary chunks (e.g. from a streaming
+    ``generate_content(stream=True)`` call) and receive each top-level
+    ``(key, value)`` pair as soon as it is complete. Unlike a plain split on
+    ``|``, the parser tracks JSON nesting and string quoting, so nested
+    compact-JSON values may contain pipes and newlines.
+
+    Pairs are separated by ``|`` or newlines and use ``=`` (or ``:``) between
+    key and value. A value starting with ``{`` or ``[`` is complete as soon as
+    its brackets balance; other values are complete at the next separator or
+    at :meth:`close`. Tokens without a key (fences, stray prose lines) are
+    ignored. Keys starting with dots are resolved against the previous key
+    (see :func:`encode_toon`) and reported as full dotted paths.
+
+    With ``expected_keys``, everything before the first pair whose top-level
+    key is expected is treated as preface and dropped, so a line such as
+    ``Sure, here it is:`` is not mistaken for a key; :attr:`skipped` counts
+    the dropped tokens.
+
+    Args:
+        expected_keys: Top-level keys that may start the output.
+
+    Example:
+        >>> parser = ToonStreamParser()
+        >>> parser.feed('meta={"note":"a|b"}|gen')
+        [('meta', {'note': 'a|b'})]
+        >>> parser.feed('eral=3')
+        []
+        >>> parser.close()
+        [('general', 3)]
+    """
+
+    _KEY, _VALUE_START, _SCALAR, _JSON, _AFTER_JSON = range(5)
+
+    def __init__(self, expected_keys: Iterable[str] | None = None):
+        self.expected_keys = frozenset(expected_keys) if expected_keys is not None else None
+        self.skipped = 0
+        self._started = expected_keys is None
+        self.result: dict[str, Any] = {}
+        self._state = self._KEY
+        self._key: list[str] = []
+        self._value: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._last_path: list[str] = []
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """Consume ``chunk`` and return the pairs completed by it."""
+        completed: list[tuple[str, Any]] = []
+        i, n = 0, len(chunk)
+        while i < n:
+            state = self._state
+            if state == self._KEY:
+                i = self._scan_key(chunk, i)
+            elif state == self._VALUE_START:
+                c = chunk[i]
+                if c in " \t":
+                    i += 1
+                elif c in _SEPARATORS:
+                    self._emit("", completed)
+                    i += 1
+                elif c in "{[":
+                    self._state = self._JSON
+                    self._depth = 0
+                else:
+                    self._state = self._SCALAR
+            elif state == self._SCALAR:
+                j = min((k for k in (chunk.find("|", i), chunk.find("\n", i)) if k != -1), default=n)
+                self._value.append(chunk[i:j])
+                i = j
+                if j < n:
+                    self._emit("".join(self._value).strip(), completed)
+                    i += 1
+            elif state == self._JSON:
+                i = self._scan_json(chunk, i, completed)
+            else:  # _AFTER_JSON: ignore anything up to the next separator
+                j = min((k for k in (chunk.find("|", i), chunk.find("\n", i)) if k != -1), default=n)
+                if j < n:
+                    self._state = self._KEY
+                    j += 1
+                i = j
+        return completed
+
+    def close(self) -> list[tuple[str, Any]]:
+        """Flush the last pair at end of stream and return it (if any)."""
+        completed: list[tuple[str, Any]] = []
+        if self._state in (self._VALUE_START, self._SCALAR, self._JSON):
+            # An unbalanced JSON value is kept as a raw string, like
+            # toon_to_json has always done for malformed values.
+            self._emit("".join(self._value).strip(), completed)
+        self._state = self._KEY
+        self._key = []
+        return completed
+
+    def _scan_key(self, chunk: str, i: int) -> int:
+        n = len(chunk)
+        j = i
+        while j < n:
+            c = chunk[j]
+            if c == "=" or c == ":":
+                self._key.append(chunk[i:j])
+                self._state = self._VALUE_START
+                self._value = []
+                return j + 1
+            if c in _SEPARATORS:
+                # A token without a key (fence line, prose); drop it.
+                if not self._started and ("".join(self._key) + chunk[i:j]).strip():
+                    self.skipped += 1
+                self._key = []
+                return j + 1
+            j += 1
+        self._key.append(chunk[i:j])
+        return j
+
+    def _scan_json(self, chunk: str, i: int, completed: list) -> int:
+        n = len(chunk)
+        start = i
+        while i < n:
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+            m = (_STRING_SPECIAL if self._in_string else _JSON_SPECIAL).search(chunk, i)
+            if m is None:
+                i = n
+                break
+            i = m.end()
+            c = m.group()
+            if self._in_string:
+                if c == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._value.append(chunk[start:i])
+                    self._emit("".join(self._value), completed)
+                    self._state = self._AFTER_JSON
+                    return i
+        self._value.append(chunk[start:i])
+        return i
+
+    def _emit(self, raw: str, completed: list) -> None:
+        key = "".join(self._key).strip()
+        self._key = []
+        self._value = []
+        self._in_string = False
+        self._escape = False
+        self._state = self._KEY
+        if not key:
+            return
+        key = self._resolve(key)
+        if not self._started:
+            if key.split(".", 1)[0] not in self.expected_keys:
+                self.skipped += 1
+                self._last_path = []
+                return
+            self._started = True
+        value = _parse_value(raw)
+        self.result[key] = value
+        completed.append((key, value))
+
+    def _resolve(self, key: str) -> str:
+        dots = len(key) - len(key.lstrip("."))
+        if dots and dots <= len(self._last_path):
+            path = self._last_path[:-dots] + key[dots:].split(".")
+        else:
+            path = key.split(".")
+        self._last_path = path
+        return ".".join(path)
+
+
+def _expand_paths(flat: dict[str, Any]) -> dict[str, Any]:
+    """Turn dotted keys (``a.b=1``) into nested objects (``{"a": {"b": 1}}``).
+
+    A dotted key that would overwrite a non-object value is kept as is.
+    """
+    expanded: dict[str, Any] = {}
+    for key, value in flat.items():
+        parts = key.split(".") if "." in key else None
+        if not parts or not all(parts):
+            expanded[key] = value
+            continue
+        node = expanded
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if not isinstance(child, dict):
+                node = None
+                break
+            node = child
+        if node is None:
+            expanded[key] = value
+        else:
+            node[parts[-1]] = value
+    return expanded
+
+
+class ToonSectionAssembler:
+    """Regroup streamed pairs into complete top-level sections.
+
+    Output written with :func:`encode_toon` spreads one section over many
+    pairs (``meta.view=front``, ``.confidence_overall=0.9``). Pairs are
+    collected while their first path segment stays the same and the section
+    is expanded (with the same rules as :func:`toon_to_json`) once the next
+    section starts or the stream ends. A section written as one value
+    (``meta={...}``) is passed through immediately.
+
+    Example:
+        >>> sections = ToonSectionAssembler()
+        >>> sections.add([("meta.view", "front"), ("meta.confidence_overall", 0.9)])
+        []
+        >>> sections.add([("hair", {"length": "short"})])
+        [('meta', {'view': 'front', 'confidence_overall': 0.9}), ('hair', {'length': 'short'})]
+    """
+
+    def __init__(self):
+        self._section: str | None = None
+        self._flat: dict[str, Any] = {}
+
+    def add(self, pairs: Iterable[tuple[str, Any]]) -> list[tuple[str, Any]]:
+        """Take pairs from :class:`ToonStreamParser` and return the sections they complete."""
+        completed: list[tuple[str, Any]] = []
+        for path, value in pairs:
+            section = path.split(".", 1)[0]
+            if section != self._section:
+                completed += self.close()
+            if path == section:
+                completed.append((section, value))
+                continue
+            self._section = section
+            self._flat[path] = value
+        return completed
+
+    def close(self) -> list[tuple[str, Any]]:
+        """Return the section still being collected (if any)."""
+        if self._section is None:
+            return []
+        section, flat = self._section, self._flat
+        self._section, self._flat = None, {}
+        expanded = _expand_paths(flat)
+        if section not in expanded:
+            # Every path was malformed (e.g. ``meta..x``); keep them flat.
+            return list(flat.items())
+        return [(section, expanded[section])]
+
+
+def toon_to_json(text: str, expand_paths: bool = True) -> dict[str, Any]:
     """Parse a TOON-formatted string back into a JSON-like dictionary.
 
     Supports both pipe-separated (``|``) and newline-separated key/value
-    pairs. Values encoded as compact JSON are parsed with ``json.loads``.
+    pairs. Values encoded as compact JSON are parsed with ``json.loads`` and
+    may themselves contain pipes or newlines. This is a thin wrapper around
+    :class:`ToonStreamParser` for complete strings.
 
     Args:
         text: The TOON string to parse.
+        expand_paths: Expand dotted keys, as written by :func:`encode_toon`,
+            into nested objects.
 
     Returns:
         A dictionary of parsed values.
@@ -80,19 +512,9 @@ def toon_to_json(text: str) -> dict[str, Any]:
     for fence in ("```toon", "```", "```json"):
         if text.startswith(fence) and text.endswith("```"):
             text = text[len(fence):-3].strip()
-    if "|" in text:
-        tokens = [t.strip() for t in text.split("|") if t.strip()]
-    else:
-        tokens = [t.strip() for t in text.splitlines() if t.strip()]
-    out: dict[str, Any] = {}
-    for tok in tokens:
-        if "=" in tok:
-            k, v = tok.split("=", 1)
-        elif ":" in tok:
-            k, v = tok.split(":", 1)
-        else:
-            continue
-        k = k.strip()
-        v = v.strip()
-        out[k] = _parse_value(v)
-    return out
+    parser = ToonStreamParser()
+    parser.feed(text)
+    parser.close()
+    if expand_paths:
+        return _expand_paths(parser.result)
+    return parser.result
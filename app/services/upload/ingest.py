@@ -0,0 +1,322 @@
+"""Streaming, size-bounded upload ingestion.
+
+``UploadFile`` parameters make FastAPI consume and buffer the whole multipart
+body before the handler runs, with no size limit. The helpers here read the
+request stream chunk by chunk instead and, for every file part:
+
+- enforce a maximum byte size (``UPLOAD_MAX_BYTES``) as data arrives,
+- sniff the magic bytes of the first chunk and reject non-images before the
+  rest of the body is buffered,
+- compute the SHA-256 content hash incrementally while reading,
+- spool to a temporary file above ``UPLOAD_SPOOL_BYTES``.
+
+Text fields are capped in number (``UPLOAD_MAX_FIELDS``), each in size and
+together in size (``UPLOAD_MAX_TEXT_BYTES``), and each part's headers in size.
+Peak memory per request is therefore bounded by the spool threshold plus
+these caps no matter what a client sends.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from dataclasses import dataclass, field
+from tempfile import SpooledTemporaryFile
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+UPLOAD_MAX_FIELD_BYTES = 64 * 1024
+UPLOAD_MAX_FIELDS = int(os.getenv("UPLOAD_MAX_FIELDS", "16"))
+UPLOAD_MAX_TEXT_BYTES = int(os.getenv("UPLOAD_MAX_TEXT_BYTES", str(256 * 1024)))
+# Per part: Content-Disposition and Content-Type, with room for long filenames.
+UPLOAD_MAX_PART_HEADER_BYTES = 8 * 1024
+SNIFF_BYTES = 12
+
+# Allowance for multipart boundaries and part headers when checking
+# Content-Length up front.
+_MULTIPART_OVERHEAD = 16 * 1024
+
+# The upload form schema, for routes that read the stream themselves and so
+# cannot declare ``File(...)`` parameters.
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Return the image MIME type implied by the leading bytes, or ``None``."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass
+class IngestedUpload:
+    """A file part read from the request stream.
+
+    Attributes:
+        field_name: The form field the file was sent under.
+        filename: The client-supplied filename, if any.
+        mime_type: The sniffed MIME type.
+        size: Number of bytes received.
+        sha256: Hex SHA-256 of the content, computed while streaming.
+        file: The spooled content, rewound to the start.
+    """
+
+    field_name: str
+    filename: str | None
+    mime_type: str
+    size: int
+    sha256: str
+    file: SpooledTemporaryFile
+
+    def read(self) -> bytes:
+        """Return the full content (loads it into memory)."""
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.seek(0)
+        return data
+
+    def close(self) -> None:
+        self.file.close()
+
+
+@dataclass
+class IngestedForm:
+    """Files and text fields of a streamed multipart body."""
+
+    files: list[IngestedUpload] = field(default_factory=list)
+    fields: dict[str, str] = field(default_factory=dict)
+
+    def close(self) -> None:
+        for upload in self.files:
+            upload.close()
+
+
+class _FilePart:
+    def __init__(self, field_name: str, filename: str | None, max_bytes: int, spool_bytes: int):
+        self.field_name = field_name
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.file = SpooledTemporaryFile(max_size=spool_bytes)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.mime_type: str | None = None
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {self.max_bytes} bytes")
+        if self.mime_type is None:
+            self.head += data[: SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._sniff()
+        self.hasher.update(data)
+        self.file.write(data)
+
+    def _sniff(self) -> None:
+        self.mime_type = sniff_image_type(self.head)
+        if self.mime_type is None:
+            raise HTTPException(status_code=415, detail=f"Unsupported file type for field {self.field_name!r}; expected an image")
+
+    def finish(self) -> IngestedUpload:
+        if self.mime_type is None:
+            self._sniff()
+        self.file.seek(0)
+        return IngestedUpload(
+            field_name=self.field_name,
+            filename=self.filename,
+            mime_type=self.mime_type,
+            size=self.size,
+            sha256=self.hasher.hexdigest(),
+            file=self.file,
+        )
+
+
+class _StreamingFormParser:
+    """Callback target for ``python_multipart.MultipartParser``."""
+
+    def __init__(
+        self,
+        max_files: int,
+        max_bytes: int,
+        spool_bytes: int,
+        max_fields: int = UPLOAD_MAX_FIELDS,
+        max_text_bytes: int = UPLOAD_MAX_TEXT_BYTES,
+    ):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.max_fields = max_fields
+        self.max_text_bytes = max_text_bytes
+        self.form = IngestedForm()
+        self._header_field = b""
+        self._header_value = b""
+        self._header_bytes = 0
+        self._text_bytes = 0
+        self._field_count = 0
+        self._headers: dict[bytes, bytes] = {}
+        self._file: _FilePart | None = None
+        self._field_name: str | None = None
+        self._field_value = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._header_bytes = 0
+        self._file = None
+        self._field_name = None
+        self._field_value = bytearray()
+
+    def _count_header(self, size: int) -> None:
+        self._header_bytes += size
+        if self._header_bytes > UPLOAD_MAX_PART_HEADER_BYTES:
+            raise HTTPException(status_code=413, detail="Multipart part headers are too large")
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._count_header(end - start)
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._count_header(end - start)
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        if b"filename" in options:
+            if len(self.form.files) >= self.max_files:
+                raise HTTPException(status_code=413, detail=f"Too many files; at most {self.max_files} allowed")
+            filename = options[b"filename"].decode("latin-1")
+            self._file = _FilePart(name, filename, self.max_bytes, self.spool_bytes)
+        else:
+            self._field_count += 1
+            if self._field_count > self.max_fields:
+                raise HTTPException(status_code=413, detail=f"Too many form fields; at most {self.max_fields} allowed")
+            self._field_name = name
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        chunk = data[start:end]
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._field_value += chunk
+            self._text_bytes += len(chunk)
+            if len(self._field_value) > UPLOAD_MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field {self._field_name!r} is too large")
+            if self._text_bytes > self.max_text_bytes:
+                raise HTTPException(status_code=413, detail=f"Form fields exceed {self.max_text_bytes} bytes in total")
+
+    def on_part_end(self) -> None:
+        if self._file is not None:
+            self.form.files.append(self._file.finish())
+            self._file = None
+        elif self._field_name is not None:
+            self.form.fields[self._field_name] = self._field_value.decode("utf-8", errors="replace")
+
+    def close_partial(self) -> None:
+        if self._file is not None:
+            self._file.file.close()
+        self.form.close()
+
+
+async def ingest_form(
+    request: Request,
+    max_files: int = 1,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    spool_bytes: int = UPLOAD_SPOOL_BYTES,
+    max_fields: int = UPLOAD_MAX_FIELDS,
+    max_text_bytes: int = UPLOAD_MAX_TEXT_BYTES,
+) -> IngestedForm:
+    """Stream a multipart body into bounded, hashed, sniffed uploads.
+
+    Args:
+        request: The incoming request.
+        max_files: Maximum number of file parts accepted.
+        max_bytes: Maximum size of each file part.
+        spool_bytes: File parts larger than this are spooled to disk.
+        max_fields: Maximum number of text fields accepted.
+        max_text_bytes: Maximum size of all text fields together.
+
+    Returns:
+        IngestedForm: The uploaded files and text fields. The caller owns the
+        spooled files and should ``close()`` the form when done.
+
+    Raises:
+        HTTPException: 400 for malformed bodies, 413 when a limit is exceeded,
+            415 for non-image files.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > max_files * max_bytes + max_text_bytes + _MULTIPART_OVERHEAD:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+
+    target = _StreamingFormParser(max_files, max_bytes, spool_bytes, max_fields, max_text_bytes)
+    parser = MultipartParser(boundary, target.callbacks())
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+        parser.finalize()
+    except HTTPException:
+        target.close_partial()
+        raise
+    except Exception as e:
+        target.close_partial()
+        raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+    return target.form
+
+
+async def ingest_upload(request: Request, field_name: str = "file", **kwargs) -> IngestedUpload:
+    """Stream a single-file multipart upload sent under ``field_name``.
+
+    Raises:
+        HTTPException: 400 if no file was sent under ``field_name``, plus the
+            errors documented on :func:`ingest_form`.
+    """
+    form = await ingest_form(request, max_files=1, **kwargs)
+    for upload in form.files:
+        if upload.field_name == field_name:
+            return upload
+    form.close()
+    raise HTTPException(status_code=400, detail=f"Missing file field {field_name!r}")
@@ -0,0 +1,130 @@
+"""Google Gemini vision provider."""
+from __future__ import annotations
+
+import inspect
+import io
+import os
+from typing import AsyncIterator
+
+import google.generativeai as genai
+from fastapi import HTTPException
+from PIL import Image
+
+from app.services.observability.timing import record_usage
+from app.services.vision.provider import VisionProvider
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.5-flash")
+GEMINI_IMAGE_MODEL = os.getenv("GEMINI_IMAGE_MODEL", "models/gemini-2.5-flash-image")
+MAX_MODEL_HANDLES = 16
+
+
+def _image_part(image: bytes) -> dict:
+    """Build an inline image part from raw bytes.
+
+    Sending the original bytes with their MIME type avoids the SDK re-encoding
+    a decoded PIL image on the event loop.
+    """
+    img = Image.open(io.BytesIO(image))
+    mime_type = Image.MIME.get(img.format or "", "image/png")
+    return {"mime_type": mime_type, "data": image}
+
+
+class GeminiProvider(VisionProvider):
+    """Vision provider backed by ``google.generativeai``.
+
+    :meth:`startup` configures the SDK once and detects whether the installed
+    SDK accepts a real ``system_instruction``; older SDKs get the system
+    message prepended to the prompt instead. ``GenerativeModel`` handles are
+    kept per system message and reused across calls.
+
+    Args:
+        model_name: The Gemini model to call.
+    """
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL):
+        self.model_name = model_name
+        self.configured = False
+        self.supports_system_instruction = False
+        self._models: dict[str | None, genai.GenerativeModel] = {}
+        self._image_model: genai.GenerativeModel | None = None
+
+    def startup(self) -> None:
+        api_key = os.getenv("GEMINI_KEY")
+        if api_key:
+            genai.configure(api_key=api_key)
+            self.configured = True
+        params = inspect.signature(genai.GenerativeModel.__init__).parameters
+        self.supports_system_instruction = "system_instruction" in params
+
+    def _model(self, system_message: str | None) -> genai.GenerativeModel:
+        key = system_message if self.supports_system_instruction else None
+        model = self._models.get(key)
+        if model is None:
+            if len(self._models) >= MAX_MODEL_HANDLES:
+                self._models.pop(next(iter(self._models)))
+            if key is not None:
+                model = genai.GenerativeModel(self.model_name, system_instruction=key)
+            else:
+                model = genai.GenerativeModel(self.model_name)
+            self._models[key] = model
+        return model
+
+    def build_contents(self, prompt: str, image: bytes, system_message: str | None = None) -> list:
+        """Build the ``contents`` list for a call.
+
+        When ``system_instruction`` is unsupported the system message is
+        included as a preface to the prompt. This isn't a true system role but
+        keeps backward compatibility.
+        """
+        text = prompt
+        if system_message and not self.supports_system_instruction:
+            text = f"SYSTEM:\n{system_message}\n---\n{prompt}"
+        return [text, _image_part(image)]
+
+    async def generate(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> str:
+        if not self.configured:
+            raise HTTPException(status_code=500, detail="API key not configured.")
+        model = self._model(system_message)
+        contents = self.build_contents(prompt, image, system_message)
+        request_options = {"timeout": timeout} if timeout is not None else None
+        response = await model.generate_content_async(contents, request_options=request_options)
+        record_usage("generate", getattr(response, "usage_metadata", None))
+        return response.text
+
+    async def generate_stream(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> AsyncIterator[str]:
+        if not self.configured:
+            raise HTTPException(status_code=500, detail="API key not configured.")
+        model = self._model(system_message)
+        contents = self.build_contents(prompt, image, system_message)
+        request_options = {"timeout": timeout} if timeout is not None else None
+        response = await model.generate_content_async(contents, stream=True, request_options=request_options)
+        try:
+            async for chunk in response:
+                text = chunk.text
+                if text:
+                    yield text
+        finally:
+            # Usage is reported with the last chunk; an abandoned stream
+            # records what was counted so far.
+            record_usage("stream", getattr(response, "usage_metadata", None))
+
+    async def illustrate(self, prompt: str, size: int, timeout: float | None = None) -> tuple[bytes, str]:
+        if not self.configured:
+            raise HTTPException(status_code=500, detail="API key not configured.")
+        model = self._image_model
+        if model is None:
+            model = self._image_model = genai.GenerativeModel(GEMINI_IMAGE_MODEL)
+        request_options = {"timeout": timeout} if timeout is not None else None
+        response = await model.generate_content_async(
+            f"{prompt}\n\nOutput a single image, about {size}px on the longest edge.",
+            request_options=request_options,
+        )
+        record_usage("illustrate", getattr(response, "usage_metadata", None))
+        for candidate in response.candidates:
+            for part in candidate.content.parts:
+                inline = getattr(part, "inline_data", None)
+                if inline is not None and inline.data:
+                    return inline.data, inline.mime_type
+        raise HTTPException(status_code=502, detail="Image model returned no image")
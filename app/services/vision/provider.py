@@ -0,0 +1,117 @@
+"""Pluggable vision-provider interface.
+
+A vision provider turns a prompt, an optional system message and an image
+into the model's raw text response. Providers that can also draw implement
+:meth:`VisionProvider.illustrate` for page illustrations. The application talks to exactly one
+provider per process, chosen by ``VISION_PROVIDER``:
+
+- ``gemini`` (default): the Google Gemini API.
+- ``stub``: a deterministic local provider returning schema-valid output
+  after a configurable latency; for load tests and offline benchmarks.
+- ``record``: Gemini, with every response captured to ``VISION_REPLAY_DIR``.
+- ``replay``: serves previously recorded responses from disk.
+
+Providers do their capability detection and client setup once in
+:meth:`VisionProvider.startup`, which :func:`init_vision_provider` calls from
+the application lifespan.
+"""
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+VISION_PROVIDER = os.getenv("VISION_PROVIDER", "gemini")
+
+
+class VisionProvider(ABC):
+    """Base class for image + prompt -> text providers."""
+
+    name: str = "base"
+
+    def startup(self) -> None:
+        """Detect capabilities and prepare reusable client state.
+
+        Called once before the first request. The default does nothing.
+        """
+
+    @abstractmethod
+    async def generate(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> str:
+        """Return the model's text response for ``prompt`` and ``image``.
+
+        Args:
+            prompt: The user prompt.
+            image: Raw image bytes.
+            system_message: Optional system message.
+            timeout: Optional deadline in seconds, forwarded to the backend.
+
+        Returns:
+            The raw text produced by the model.
+        """
+
+    async def generate_stream(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> AsyncIterator[str]:
+        """Yield the model's text response in chunks as it is generated.
+
+        Closing the iterator early abandons the generation. The default
+        yields the whole :meth:`generate` result as a single chunk.
+        """
+        yield await self.generate(prompt, image, system_message=system_message, timeout=timeout)
+
+    async def illustrate(self, prompt: str, size: int, timeout: float | None = None) -> tuple[bytes, str]:
+        """Generate an illustration for ``prompt``.
+
+        Args:
+            prompt: The page's image prompt.
+            size: Requested longest edge in pixels.
+            timeout: Optional deadline in seconds.
+
+        Returns:
+            The image bytes and their MIME type.
+        """
+        raise NotImplementedError(f"Provider {self.name!r} cannot generate illustrations")
+
+
+_provider: VisionProvider | None = None
+
+
+def build_vision_provider(name: str = VISION_PROVIDER) -> VisionProvider:
+    """Instantiate the provider called ``name``.
+
+    Raises:
+        ValueError: If ``name`` is not a known provider.
+    """
+    if name == "gemini":
+        from app.services.vision.gemini_provider import GeminiProvider
+        return GeminiProvider()
+    if name == "stub":
+        from app.services.vision.stub_provider import StubProvider
+        return StubProvider()
+    if name == "record":
+        from app.services.vision.gemini_provider import GeminiProvider
+        from app.services.vision.replay_provider import RecordingProvider
+        return RecordingProvider(GeminiProvider())
+    if name == "replay":
+        from app.services.vision.replay_provider import ReplayProvider
+        return ReplayProvider()
+    raise ValueError(f"Unknown vision provider: {name!r}")
+
+
+def init_vision_provider(name: str = VISION_PROVIDER) -> VisionProvider:
+    """Build the configured provider, run its startup and make it current."""
+    provider = build_vision_provider(name)
+    provider.startup()
+    set_vision_provider(provider)
+    return provider
+
+
+def set_vision_provider(provider: VisionProvider | None) -> None:
+    """Replace the current provider (``None`` resets to lazy initialisation)."""
+    global _provider
+    _provider = provider
+
+
+def get_vision_provider() -> VisionProvider:
+    """Return the current provider, initialising it on first use."""
+    if _provider is None:
+        return init_vision_provider()
+    return _provider
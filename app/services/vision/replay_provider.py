@@ -0,0 +1,125 @@
+"""Record/replay vision providers.
+
+``RecordingProvider`` wraps a real provider and writes every response to
+``VISION_REPLAY_DIR``; ``ReplayProvider`` later serves those captured
+responses from disk, so real model output can be replayed offline and
+deterministically.
+
+Recordings are keyed on the image hash and, by default, on the prompt and
+system message too (``VISION_REPLAY_MATCH=exact``). With
+``VISION_REPLAY_MATCH=image`` only the image is matched, which keeps old
+recordings usable after prompt edits. Illustrations are recorded and
+replayed too, keyed on their prompt and size.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+from app.services.vision.provider import VisionProvider
+
+VISION_REPLAY_DIR = os.getenv("VISION_REPLAY_DIR", "vision_recordings")
+VISION_REPLAY_MATCH = os.getenv("VISION_REPLAY_MATCH", "exact")
+
+
+def recording_key(prompt: str, image: bytes, system_message: str | None, match: str = VISION_REPLAY_MATCH) -> str:
+    """Return the file key for a call.
+
+    Args:
+        prompt: The user prompt.
+        image: Raw image bytes.
+        system_message: Optional system message.
+        match: ``"exact"`` to include the prompts in the key, ``"image"`` to
+            key on the image alone.
+    """
+    digest = hashlib.sha256(image)
+    if match == "exact":
+        digest.update(b"\0" + (system_message or "").encode("utf-8"))
+        digest.update(b"\0" + prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def illustration_key(prompt: str, size: int) -> str:
+    """Return the file key for an illustration call."""
+    return "illustration-" + hashlib.sha256(f"{size}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class RecordingProvider(VisionProvider):
+    """Forward calls to ``inner`` and capture each response on disk.
+
+    Args:
+        inner: The provider that produces the real responses.
+        directory: Where recordings are written.
+    """
+
+    name = "record"
+
+    def __init__(self, inner: VisionProvider, directory: str = VISION_REPLAY_DIR, match: str = VISION_REPLAY_MATCH):
+        self.inner = inner
+        self.directory = directory
+        self.match = match
+
+    def startup(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.inner.startup()
+
+    async def generate(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> str:
+        text = await self.inner.generate(prompt, image, system_message=system_message, timeout=timeout)
+        self._write(recording_key(prompt, image, system_message, self.match), {"text": text})
+        return text
+
+    async def illustrate(self, prompt: str, size: int, timeout: float | None = None) -> tuple[bytes, str]:
+        data, mime_type = await self.inner.illustrate(prompt, size, timeout=timeout)
+        self._write(illustration_key(prompt, size), {"image": base64.b64encode(data).decode("ascii"), "mime_type": mime_type})
+        return data, mime_type
+
+    def _write(self, key: str, fields: dict) -> None:
+        record = {"provider": self.inner.name, "recorded_at": datetime.now(timezone.utc).isoformat(), **fields}
+        tmp_path = os.path.join(self.directory, f".{key}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, os.path.join(self.directory, f"{key}.json"))
+
+
+class ReplayProvider(VisionProvider):
+    """Serve responses captured by :class:`RecordingProvider`.
+
+    Args:
+        directory: Where recordings are read from.
+        match: Key strategy; must match the one used while recording.
+    """
+
+    name = "replay"
+
+    def __init__(self, directory: str = VISION_REPLAY_DIR, match: str = VISION_REPLAY_MATCH):
+        self.directory = directory
+        self.match = match
+        self._cache: dict[str, str] = {}
+
+    async def generate(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> str:
+        key = recording_key(prompt, image, system_message, self.match)
+        text = self._cache.get(key)
+        if text is None:
+            text = self._cache[key] = self._read(key, "text")["text"]
+        return text
+
+    async def illustrate(self, prompt: str, size: int, timeout: float | None = None) -> tuple[bytes, str]:
+        # Not cached in memory: images are large and a book asks for each once.
+        record = self._read(illustration_key(prompt, size), "image", "mime_type")
+        return base64.b64decode(record["image"]), record["mime_type"]
+
+    def _read(self, key: str, *fields: str) -> dict:
+        path = os.path.join(self.directory, f"{key}.json")
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            record = None
+        if not isinstance(record, dict) or any(name not in record for name in fields):
+            raise HTTPException(status_code=503, detail=f"No recorded response for key {key}")
+        return record
@@ -0,0 +1,125 @@
+"""Deterministic local vision provider.
+
+Returns a schema-valid character description without any network access, so
+the pipeline can be load-tested and benchmarked offline. Illustrations are
+flat placeholder PNGs whose colour is derived from the prompt. The response is
+derived from ``app/json_schemas/character.json`` and encoded the way the
+prompt asks the real model to answer (compact TOON with JSON values), so the
+normal parsing path is exercised.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+from typing import Any, AsyncIterator
+
+from PIL import Image
+
+from app.services.vision.provider import VisionProvider
+
+VISION_STUB_LATENCY_MS = float(os.getenv("VISION_STUB_LATENCY_MS", "0"))
+VISION_STUB_CHUNK_CHARS = int(os.getenv("VISION_STUB_CHUNK_CHARS", "64"))
+VISION_STUB_SCHEMA = os.getenv("VISION_STUB_SCHEMA", os.path.join("app", "json_schemas", "character.json"))
+
+_STRING_BY_FORMAT = {"date-time": "1970-01-01T00:00:00Z"}
+_HEX_COLOR_PATTERN = "^#([A-Fa-f0-9]{6})$"
+
+
+def example_from_schema(schema: dict[str, Any]) -> Any:
+    """Build a deterministic instance that satisfies ``schema``.
+
+    Supports the subset of JSON Schema used by ``character.json``: object
+    properties, arrays with ``minItems``, enums, defaults, nullable type
+    lists, numeric bounds, ``date-time`` formats and the hex-colour pattern.
+    """
+    if "default" in schema:
+        return schema["default"]
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    types = schema.get("type", "object")
+    if isinstance(types, list):
+        non_null = [t for t in types if t != "null"]
+        types = non_null[0] if non_null else "null"
+
+    if types == "object":
+        return {k: example_from_schema(v) for k, v in schema.get("properties", {}).items()}
+    if types == "array":
+        item = example_from_schema(schema.get("items", {"type": "string"}))
+        return [item for _ in range(schema.get("minItems", 0))]
+    if types in ("number", "integer"):
+        low = schema.get("minimum", 0)
+        high = schema.get("maximum", low + 1)
+        value = (low + high) / 2
+        return int(value) if types == "integer" else value
+    if types == "boolean":
+        return False
+    if types == "string":
+        if schema.get("pattern") == _HEX_COLOR_PATTERN:
+            return "#808080"
+        return _STRING_BY_FORMAT.get(schema.get("format", ""), "unknown")
+    return None
+
+
+def encode_response(description: dict[str, Any]) -> str:
+    """Encode a description as compact TOON with JSON-encoded values."""
+    return "|".join(f"{k}={json.dumps(v, separators=(',', ':'))}" for k, v in description.items())
+
+
+class StubProvider(VisionProvider):
+    """Provider that returns a fixed, schema-valid description.
+
+    Args:
+        latency_ms: Simulated model latency per call, in milliseconds.
+        schema_path: The JSON schema the responses must satisfy.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = VISION_STUB_LATENCY_MS, schema_path: str = VISION_STUB_SCHEMA):
+        self.latency_ms = latency_ms
+        self.schema_path = schema_path
+        self._description: dict[str, Any] | None = None
+
+    def startup(self) -> None:
+        with open(self.schema_path, "r") as f:
+            self._description = example_from_schema(json.load(f))
+
+    def describe(self, image: bytes) -> dict[str, Any]:
+        """Return the description for ``image``.
+
+        The output is identical for every call with the same image; the image
+        hash is recorded in ``meta.observer`` so distinct uploads can be told
+        apart downstream.
+        """
+        if self._description is None:
+            self.startup()
+        description = json.loads(json.dumps(self._description))
+        description.setdefault("meta", {})["observer"] = "stub:" + hashlib.sha256(image).hexdigest()[:12]
+        return description
+
+    async def generate(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> str:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return encode_response(self.describe(image))
+
+    async def generate_stream(self, prompt: str, image: bytes, system_message: str | None = None, timeout: float | None = None) -> AsyncIterator[str]:
+        """Yield the response in fixed-size chunks, spreading the latency over them."""
+        text = encode_response(self.describe(image))
+        chunks = [text[i:i + VISION_STUB_CHUNK_CHARS] for i in range(0, len(text), VISION_STUB_CHUNK_CHARS)]
+        delay = self.latency_ms / 1000 / max(len(chunks), 1)
+        for chunk in chunks:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    async def illustrate(self, prompt: str, size: int, timeout: float | None = None) -> tuple[bytes, str]:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        buf = io.BytesIO()
+        Image.new("RGB", (size, size), tuple(digest[:3])).save(buf, format="PNG")
+        return buf.getvalue(), "image/png"
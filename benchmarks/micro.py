@@ -0,0 +1,234 @@
+"""Offline micro-benchmarks for the TOON, parsing and prompt-building hot paths.
+
+Nothing here touches MongoDB or a model API: inputs are synthetic
+descriptions derived from ``app/json_schemas/character.json`` (through the
+stub provider's ``example_from_schema``) and grown in size by repeating
+annotations and lengthening free-text notes. Each case is timed with
+``timeit`` (auto-ranged loop count, best of ``--repeat`` runs) and reported
+in microseconds per call.
+
+Results can be saved as JSON and compared against a stored baseline; a case
+whose time grew by more than ``--threshold`` is flagged as a regression and
+the command exits with status 1.
+
+Run from the repository root::
+
+    python -m benchmarks.micro --save benchmarks/baseline.json
+    python -m benchmarks.micro --compare benchmarks/baseline.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from app.models.character_schema import CharacterCreate
+from app.services.character.response_parser import _parse_response_text, parse_character_response
+from app.services.prompts.prompt_registry import PromptRegistry
+from app.services.toon.toon_service import encode_toon, json_to_toon, toon_to_json
+from app.services.vision.stub_provider import encode_response, example_from_schema
+
+SCHEMA_PATH = os.path.join("app", "json_schemas", "character.json")
+SIZES = (1, 10, 100)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25
+
+
+@dataclass(frozen=True)
+class Case:
+    """One benchmark: ``func`` is called with no arguments."""
+
+    name: str
+    size: int
+    func: Callable[[], Any]
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.size}]"
+
+
+def synthetic_description(size: int, schema_path: str = SCHEMA_PATH) -> dict[str, Any]:
+    """A schema-valid description whose payload grows roughly linearly with ``size``."""
+    with open(schema_path) as f:
+        description = example_from_schema(json.load(f))
+    description["annotations"] = [
+        {"label": f"note {i}", "text": "freckles near the left eye " * 2, "confidence": 0.5}
+        for i in range(size)
+    ]
+    description["hair"]["texture_notes"] = "soft loose curls, " * size
+    return description
+
+
+def synthetic_schema(size: int) -> dict[str, Any]:
+    """An object schema with ``10 * size`` enum properties."""
+    return {
+        "title": "synthetic",
+        "type": "object",
+        "properties": {
+            f"field_{i}": {
+                "type": ["string", "null"],
+                "enum": ["small", "medium", "large", "unknown"],
+                "description": f"synthetic field number {i}",
+            }
+            for i in range(10 * size)
+        },
+    }
+
+
+def _response_shapes(description: dict[str, Any]) -> dict[str, str]:
+    """The three response shapes the parse chain handles, one per fallback step."""
+    as_json = json.dumps(description)
+    return {
+        "json": as_json,
+        "embedded_json": f"Here is the description:\n```json\n{as_json}\n```\nLet me know if you need more.",
+        "toon": encode_response(description),
+    }
+
+
+def build_cases(sizes: tuple[int, ...] = SIZES, workdir: str | None = None) -> list[Case]:
+    """Build every benchmark case for every input size.
+
+    Args:
+        sizes: Input size factors.
+        workdir: Directory for the synthetic prompt templates and schemas;
+            a temporary directory is used when omitted.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="bench-prompts-")
+    cases: list[Case] = []
+    for size in sizes:
+        description = synthetic_description(size)
+        legacy_toon = json_to_toon(description)
+        path_toon = encode_toon(description)
+        shapes = _response_shapes(description)
+
+        cases += [
+            Case("json_to_toon", size, lambda d=description: json_to_toon(d)),
+            Case("encode_toon", size, lambda d=description: encode_toon(d)),
+            Case("toon_to_json.legacy", size, lambda t=legacy_toon: toon_to_json(t)),
+            Case("toon_to_json.paths", size, lambda t=path_toon: toon_to_json(t)),
+            Case("character_create", size, lambda d=description: CharacterCreate(**d)),
+        ]
+        for shape, text in shapes.items():
+            cases.append(Case(f"parse.{shape}", size, lambda t=text: _parse_response_text(t)))
+            cases.append(Case(f"parse_validate.{shape}", size, lambda t=text: parse_character_response(t)))
+
+        templates = os.path.join(workdir, f"size_{size}", "system_messages")
+        schemas = os.path.join(workdir, f"size_{size}", "json_schemas")
+        os.makedirs(templates, exist_ok=True)
+        os.makedirs(schemas, exist_ok=True)
+        with open(os.path.join(schemas, "synthetic.json"), "w") as f:
+            json.dump(synthetic_schema(size), f)
+        with open(os.path.join(templates, "synthetic_prompt.txt"), "w") as f:
+            f.write("SYSTEM MESSAGE:\n{{TOON:synthetic.json}}\nPROMPT:\nDescribe the person.")
+        for encoding in ("legacy", "schema"):
+            registry = PromptRegistry(templates, schemas, toon_encoding=encoding)
+            cases.append(Case(f"prompt_compile.{encoding}", size, lambda r=registry: r.compile("synthetic")))
+    return cases
+
+
+def time_case(case: Case, repeat: int = DEFAULT_REPEAT) -> dict[str, float]:
+    """Time ``case`` and return per-call statistics in microseconds."""
+    timer = timeit.Timer(case.func)
+    number, _ = timer.autorange()
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "best_us": min(runs),
+        "median_us": statistics.median(runs),
+        "loops": number,
+    }
+
+
+def run(sizes: tuple[int, ...] = SIZES, repeat: int = DEFAULT_REPEAT, only: str | None = None) -> dict[str, Any]:
+    """Run the suite and return a JSON-serialisable report."""
+    results: dict[str, dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="bench-prompts-") as workdir:
+        for case in build_cases(sizes, workdir):
+            if only and only not in case.name:
+                continue
+            results[case.key] = time_case(case, repeat)
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> list[dict[str, Any]]:
+    """Compare two reports case by case on ``best_us``.
+
+    Returns:
+        One row per case present in both reports, with the relative change
+        and a ``regression`` flag for slowdowns larger than ``threshold``.
+    """
+    rows = []
+    for key, result in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None or not base["best_us"]:
+            continue
+        change = result["best_us"] / base["best_us"] - 1.0
+        rows.append({
+            "case": key,
+            "baseline_us": base["best_us"],
+            "current_us": result["best_us"],
+            "change": change,
+            "regression": change > threshold,
+        })
+    return rows
+
+
+def _print_results(report: dict[str, Any]) -> None:
+    print(f"{'case':<36}{'best us':>12}{'median us':>12}{'loops':>9}")
+    for key, r in report["results"].items():
+        print(f"{key:<36}{r['best_us']:>12.1f}{r['median_us']:>12.1f}{r['loops']:>9}")
+
+
+def _print_comparison(rows: list[dict[str, Any]]) -> None:
+    print(f"\n{'case':<36}{'baseline us':>12}{'current us':>12}{'change':>9}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['case']:<36}{row['baseline_us']:>12.1f}{row['current_us']:>12.1f}{row['change']:>+9.0%}{flag}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated input size factors")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timing runs per case")
+    parser.add_argument("--only", help="run only cases whose name contains this string")
+    parser.add_argument("--save", metavar="PATH", help="write the report as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline report")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="relative slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = tuple(int(s) for s in args.sizes.split(",") if s)
+    report = run(sizes, args.repeat, args.only)
+    _print_results(report)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nsaved {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        _print_comparison(rows)
+        regressions = [row["case"] for row in rows if row["regression"]]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,180 @@
+"""Prompt-size and parse-success benchmark for the TOON schema encodings.
+
+Encodes every schema in ``app/json_schemas`` and compiles the character
+prompt once per encoding mode, then prints characters, UTF-8 bytes and
+approximate tokens (~4 characters per token, as in ``CompiledPrompt.size``)
+for each. Every TOON mode is also checked to round-trip through
+``toon_to_json``.
+
+A smaller prompt only helps if the model still answers in a parseable
+shape, so ``--parse`` sends the compiled prompt of every mode to the
+configured vision provider (``VISION_PROVIDER``) ``--samples`` times with
+``--image`` and reports, per mode, how many responses parsed, how many had
+every character section and how many sections were recovered on average.
+Run it against the real provider before changing the default encoding; the
+stub provider ignores the prompt and only checks the plumbing.
+
+Run from the repository root::
+
+    python -m benchmarks.toon_encoding [--json]
+    python -m benchmarks.toon_encoding --parse --samples 20 --image tests/assets/test_person.png
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+
+from app.services.character.character_service import EXPECTED_KEYS
+from app.services.character.response_parser import parse_character_response
+from app.services.prompts.prompt_registry import SCHEMAS_DIR, PromptRegistry, encode_schema
+from app.services.toon.toon_service import (
+    TOON_VERBOSITY_DEFAULT,
+    TOON_VERBOSITY_FULL,
+    TOON_VERBOSITY_MINIMAL,
+    encode_toon,
+    schema_to_toon,
+    toon_to_json,
+)
+
+from app.services.vision.provider import get_vision_provider, init_vision_provider
+
+# (name, registry encoding, verbosity, relative keys)
+MODES = [
+    ("legacy", "legacy", TOON_VERBOSITY_FULL, False),
+    ("paths", "paths", TOON_VERBOSITY_FULL, False),
+    ("schema-full", "schema", TOON_VERBOSITY_FULL, False),
+    ("schema-default", "schema", TOON_VERBOSITY_DEFAULT, False),
+    ("schema-relative", "schema", TOON_VERBOSITY_DEFAULT, True),
+    ("schema-minimal", "schema", TOON_VERBOSITY_MINIMAL, False),
+]
+
+
+def _measure(text: str) -> dict[str, int]:
+    return {"chars": len(text), "bytes": len(text.encode("utf-8")), "approx_tokens": (len(text) + 3) // 4}
+
+
+def _round_trips(schema: dict, encoding: str, verbosity: int, relative: bool) -> bool | None:
+    """Whether the encoding gives back what it was asked to encode."""
+    if encoding == "legacy":
+        return None  # lossy by design: lists are joined without quoting
+    if encoding == "paths":
+        return toon_to_json(encode_toon(schema, relative=False)) == schema
+    return toon_to_json(schema_to_toon(schema, TOON_VERBOSITY_FULL, relative=relative)) == schema and bool(
+        toon_to_json(schema_to_toon(schema, verbosity, relative=relative))
+    )
+
+
+def run(schemas_dir: str = SCHEMAS_DIR, prompt_name: str = "character") -> dict:
+    """Measure every schema and the compiled prompt in every mode."""
+    report: dict = {"schemas": {}, "prompt": {}}
+    for fname in sorted(os.listdir(schemas_dir)):
+        if not fname.endswith(".json"):
+            continue
+        with open(os.path.join(schemas_dir, fname)) as f:
+            schema = json.load(f)
+        rows = {
+            "json-pretty": _measure(json.dumps(schema, indent=2)),
+            "json-compact": _measure(json.dumps(schema, separators=(",", ":"))),
+        }
+        for name, encoding, verbosity, relative in MODES:
+            rows[name] = _measure(encode_schema(schema, encoding, verbosity, relative))
+            rows[name]["round_trip"] = _round_trips(schema, encoding, verbosity, relative)
+        report["schemas"][fname] = rows
+    for name, encoding, verbosity, relative in MODES:
+        registry = PromptRegistry(
+            schemas_dir=schemas_dir, toon_encoding=encoding, toon_verbosity=verbosity, toon_relative=relative
+        )
+        report["prompt"][name] = registry.compile(prompt_name).size
+    return report
+
+
+def _score(text: str) -> tuple[bool, int]:
+    """Whether ``text`` parses, and how many character sections it holds."""
+    try:
+        parsed = parse_character_response(text)
+    except Exception:
+        return False, 0
+    return True, len(EXPECTED_KEYS.intersection(parsed))
+
+
+async def parse_success(image: bytes, samples: int = 10, schemas_dir: str = SCHEMAS_DIR, prompt_name: str = "character") -> dict:
+    """Send each mode's compiled prompt to the vision provider and score the answers.
+
+    Returns:
+        Per mode: ``samples``, ``parsed`` and ``complete`` rates and the mean
+        number of ``sections`` recovered.
+    """
+    provider = get_vision_provider()
+    report: dict = {}
+    for name, encoding, verbosity, relative in MODES:
+        registry = PromptRegistry(
+            schemas_dir=schemas_dir, toon_encoding=encoding, toon_verbosity=verbosity, toon_relative=relative
+        )
+        compiled = registry.compile(prompt_name)
+        responses = await asyncio.gather(
+            *[provider.generate(compiled.prompt, image, system_message=compiled.system_message) for _ in range(samples)],
+            return_exceptions=True,
+        )
+        scores = [_score(r) if isinstance(r, str) else (False, 0) for r in responses]
+        report[name] = {
+            "samples": samples,
+            "parsed": sum(ok for ok, _ in scores) / samples,
+            "complete": sum(n == len(EXPECTED_KEYS) for _, n in scores) / samples,
+            "sections": sum(n for _, n in scores) / samples,
+        }
+    return report
+
+
+def _print_table(title: str, rows: dict[str, dict], chars_key: str, tokens_key: str) -> None:
+    print(title)
+    baseline = next(iter(rows.values()))[chars_key]
+    print(f"  {'mode':<16}{'chars':>8}{'tokens':>8}{'vs first':>10}  round-trip")
+    for mode, row in rows.items():
+        ratio = row[chars_key] / baseline if baseline else 0.0
+        rt = {True: "ok", False: "FAIL", None: "-"}[row.get("round_trip")]
+        print(f"  {mode:<16}{row[chars_key]:>8}{row[tokens_key]:>8}{ratio:>9.0%}  {rt}")
+    print()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    parser.add_argument("--prompt", default="character", help="prompt template to compile")
+    parser.add_argument("--parse", action="store_true", help="measure parse success against the vision provider")
+    parser.add_argument("--samples", type=int, default=10, help="responses per mode with --parse")
+    parser.add_argument("--image", default="tests/assets/test_person.png", help="photo sent with --parse")
+    args = parser.parse_args(argv)
+
+    if args.parse:
+        init_vision_provider()
+        with open(args.image, "rb") as f:
+            image = f.read()
+        results = asyncio.run(parse_success(image, args.samples, prompt_name=args.prompt))
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print(f"  {'mode':<16}{'parsed':>8}{'complete':>10}{'sections':>10}")
+            for mode, row in results.items():
+                print(f"  {mode:<16}{row['parsed']:>8.0%}{row['complete']:>10.0%}{row['sections']:>10.1f}")
+        return 0
+
+    report = run(prompt_name=args.prompt)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for fname, rows in report["schemas"].items():
+            _print_table(fname, rows, "chars", "approx_tokens")
+        _print_table(f"{args.prompt} prompt (system + user)", report["prompt"], "total_chars", "approx_tokens")
+    failed = [
+        (fname, mode)
+        for fname, rows in report["schemas"].items()
+        for mode, row in rows.items()
+        if row.get("round_trip") is False
+    ]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,198 @@
+"""
+Tests for admission control and per-user quotas.
+"""
+
+import asyncio
+import time
+import pytest
+from types import SimpleNamespace
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from pymongo.errors import AutoReconnect
+from app.main import app
+from app.services.auth.tokens import token_service
+from app.services.http.admission import AdmissionController, content_cost, request_subject
+from app.services.http.quotas import QuotaStore, refill
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+@pytest.mark.asyncio
+async def test_in_flight_limit_queues_and_hands_over_in_order():
+    controller = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=5)
+    order = []
+
+    async def job(name, priority=False):
+        async with controller.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await controller.acquire()
+    tasks = [asyncio.create_task(job("a")), asyncio.create_task(job("b"))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(job("paid", priority=True)))
+    await asyncio.sleep(0)
+    assert controller.stats()["queued"] == 2
+    assert controller.stats()["queued_priority"] == 1
+
+    controller.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["paid", "a", "b"]
+    stats = controller.stats()
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 3
+    assert stats["admitted_priority"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full_or_wait_times_out():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    await controller.acquire()
+    waiting = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as full:
+        await controller.acquire()
+    with pytest.raises(HTTPException) as timed_out:
+        await waiting
+
+    assert full.value.status_code == 503
+    assert full.value.headers["Retry-After"]
+    assert timed_out.value.status_code == 503
+    stats = controller.stats()
+    assert stats["rejected_queue_full"] == 1
+    assert stats["rejected_timeout"] == 1
+    assert stats["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    controller = AdmissionController(max_in_flight=1, max_queue=2, queue_timeout=5)
+    await controller.acquire()
+    waiting = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    controller.release()
+
+    assert controller.stats()["in_flight"] == 0
+    assert controller.stats()["queued"] == 0
+
+
+def test_priority_is_never_rejected_for_a_full_queue():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=0.01)
+        await controller.acquire()
+        paid = asyncio.create_task(controller.acquire(priority=True))
+        await asyncio.sleep(0.05)
+        assert not paid.done()
+        controller.release()
+        await paid
+        controller.release()
+        return controller.stats()
+
+    assert asyncio.run(scenario())["admitted_priority"] == 1
+
+
+class BucketCollection:
+    """Applies the take pipeline's arithmetic in Python."""
+
+    def __init__(self, fail_with=None):
+        self.buckets = {}
+        self.fail_with = fail_with
+
+    async def find_one_and_update(self, filter, pipeline, projection=None, upsert=False, return_document=None):
+        if self.fail_with is not None:
+            raise self.fail_with
+        capacity = pipeline[0]["$set"]["tokens"]["$min"][0]
+        rate = pipeline[0]["$set"]["tokens"]["$min"][1]["$add"][1]["$multiply"][1]
+        cost = pipeline[1]["$set"]["granted"]["$gte"][1]
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(filter["_id"], (capacity, now))
+        tokens = refill(tokens, now - updated, capacity, rate)
+        granted = tokens >= cost
+        tokens = tokens - cost if granted else tokens
+        self.buckets[filter["_id"]] = (tokens, now)
+        return {"_id": filter["_id"], "tokens": tokens, "granted": granted}
+
+
+@pytest.mark.asyncio
+async def test_quota_limits_with_retry_after():
+    store = QuotaStore(BucketCollection(), capacity=2, refill_per_minute=6)
+
+    await store.take("user:1")
+    await store.take("user:1")
+    with pytest.raises(HTTPException) as exc_info:
+        await store.take("user:1")
+    await store.take("user:2")
+
+    assert exc_info.value.status_code == 429
+    assert 1 <= int(exc_info.value.headers["Retry-After"]) <= 10
+    assert store.stats()["limited"] == 1
+    assert store.stats()["granted"] == 3
+
+
+@pytest.mark.asyncio
+async def test_quota_fails_open_when_the_store_is_unavailable():
+    store = QuotaStore(BucketCollection(fail_with=AutoReconnect("down")))
+
+    await store.take("user:1")
+
+    assert store.stats()["store_errors"] == 1
+
+
+def test_refill_is_capped():
+    assert refill(0, 30, capacity=10, rate_per_second=0.1) == 3
+    assert refill(9, 3600, capacity=10, rate_per_second=0.1) == 10
+
+
+def test_request_subject_prefers_the_access_token():
+    token = token_service.issue("u1", "a@example.com")
+    with_token = SimpleNamespace(headers={"authorization": f"Bearer {token}"}, client=SimpleNamespace(host="1.2.3.4"))
+    forged = SimpleNamespace(headers={"authorization": "Bearer forged"}, client=SimpleNamespace(host="1.2.3.4"))
+
+    assert request_subject(with_token) == "user:u1"
+    assert request_subject(forged) == "ip:1.2.3.4"
+
+
+def test_character_route_sheds_load_before_reading_the_upload(monkeypatch):
+    async def no_quota(request, cost=1):
+        pass
+
+    async def must_not_run(*args, **kwargs):
+        raise AssertionError("upload was read")
+
+    monkeypatch.setattr("app.services.http.admission.take_quota", no_quota)
+    monkeypatch.setattr("app.services.http.admission.admission_controller", AdmissionController(max_in_flight=0, max_queue=0))
+    monkeypatch.setattr("app.routers.character.ingest_upload", must_not_run)
+
+    response = TestClient(app).post("/character", files={"file": ("p.png", PNG, "image/png")})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"]
+
+
+def test_shed_requests_do_not_consume_quota(monkeypatch):
+    charged = []
+
+    async def record_quota(request, cost=1):
+        charged.append(cost)
+
+    monkeypatch.setattr("app.services.http.admission.take_quota", record_quota)
+    monkeypatch.setattr("app.services.http.admission.admission_controller", AdmissionController(max_in_flight=0, max_queue=0))
+
+    for path, files in (("/character", {"file": ("p.png", PNG, "image/png")}), ("/characters/batch", [("files", ("p.png", PNG, "image/png"))])):
+        assert TestClient(app).post(path, files=files).status_code == 503
+    assert charged == []
+
+
+def test_content_cost_is_bounded_by_the_batch_size():
+    def request(length):
+        return SimpleNamespace(headers={} if length is None else {"content-length": str(length)})
+
+    assert content_cost(request(10), 4, bytes_per_unit=100) == 1
+    assert content_cost(request(250), 4, bytes_per_unit=100) == 3
+    assert content_cost(request(10_000), 4, bytes_per_unit=100) == 4
+    assert content_cost(request(None), 4, bytes_per_unit=100) == 4
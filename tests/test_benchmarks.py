@@ -0,0 +1,55 @@
+"""
+Tests for the offline micro-benchmark suite.
+"""
+
+import pytest
+from app.models.character_schema import CharacterCreate
+from app.services.character.response_parser import parse_character_response
+from app.services.vision.provider import set_vision_provider
+from app.services.vision.stub_provider import StubProvider
+from benchmarks.micro import build_cases, compare, run, synthetic_description, _response_shapes
+from benchmarks.toon_encoding import MODES, parse_success
+
+
+def test_synthetic_inputs_parse_back_through_every_shape():
+    description = synthetic_description(3)
+
+    assert len(description["annotations"]) == 3
+    for text in _response_shapes(description).values():
+        assert CharacterCreate(**parse_character_response(text))
+
+
+def test_every_case_runs(tmp_path):
+    cases = build_cases((1,), str(tmp_path))
+
+    assert len({c.key for c in cases}) == len(cases)
+    for case in cases:
+        case.func()
+
+
+def test_run_reports_each_case():
+    report = run((1,), repeat=1, only="json_to_toon")
+
+    assert list(report["results"]) == ["json_to_toon[1]"]
+    assert report["results"]["json_to_toon[1]"]["best_us"] > 0
+
+
+def test_compare_flags_slowdowns_above_threshold():
+    baseline = {"results": {"a[1]": {"best_us": 100.0}, "b[1]": {"best_us": 100.0}}}
+    current = {"results": {"a[1]": {"best_us": 110.0}, "b[1]": {"best_us": 150.0}, "new[1]": {"best_us": 1.0}}}
+
+    rows = compare(current, baseline, threshold=0.25)
+
+    assert [(r["case"], r["regression"]) for r in rows] == [("a[1]", False), ("b[1]", True)]
+
+
+@pytest.mark.asyncio
+async def test_parse_success_scores_every_mode():
+    set_vision_provider(StubProvider())
+    try:
+        report = await parse_success(b"image", samples=2)
+    finally:
+        set_vision_provider(None)
+
+    assert set(report) == {name for name, *_ in MODES}
+    assert all(row["parsed"] == 1.0 and row["complete"] == 1.0 for row in report.values())
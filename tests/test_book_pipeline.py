@@ -0,0 +1,293 @@
+"""
+Tests for the book job pipeline.
+"""
+
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+from app.services.book.job_store import QUEUED, RUNNING, SUCCEEDED, FAILED
+from app.services.book.pipeline import JobWorkerPool
+
+
+class FakeJobStore:
+    """In-memory stand-in for JobStore covering what the worker pool uses."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.started = []
+        self.heartbeats = 0
+
+    async def claim(self, job_id, worker_id):
+        job = self.jobs[job_id]
+        if job["status"] != QUEUED:
+            return None
+        job["status"] = RUNNING
+        return {**job, "result": dict(job["result"])}
+
+    async def recover(self):
+        return 0
+
+    async def pending_ids(self):
+        return [k for k, j in self.jobs.items() if j["status"] == QUEUED]
+
+    async def heartbeat(self, job_id, worker_id):
+        self.heartbeats += 1
+        return self.jobs[job_id]["status"] == RUNNING
+
+    async def stage_started(self, job_id, stage):
+        self.started.append(stage)
+
+    async def stage_finished(self, job_id, stage, output, duration_ms, progress):
+        job = self.jobs[job_id]
+        job["completed_stages"].append(stage)
+        job["result"].update(output)
+        job["progress"] = progress
+
+    async def fail(self, job_id, stage, error):
+        self.jobs[job_id].update(status=FAILED, error=error)
+
+    async def delete_images(self, job_id):
+        self.jobs[job_id]["images_deleted"] = True
+
+    async def release(self, job_id):
+        self.jobs[job_id]["status"] = QUEUED
+
+    async def finish(self, job_id):
+        self.jobs[job_id].update(status=SUCCEEDED, progress=1.0)
+
+
+def _job(completed=(), result=None):
+    return {"status": QUEUED, "completed_stages": list(completed), "result": result or {}, "request": {}}
+
+
+async def _stage_a(job, store):
+    return {"a": 1}
+
+
+async def _stage_b(job, store):
+    return {"b": job["result"]["a"] + 1}
+
+
+async def _failing(job, store):
+    raise RuntimeError("boom")
+
+
+@pytest.mark.asyncio
+async def test_stages_run_in_order_and_persist_output():
+    store = FakeJobStore({"j": _job()})
+    pool = JobWorkerPool(store, stages=[("a", _stage_a), ("b", _stage_b)], workers=1)
+
+    await pool.run_job("j")
+
+    assert store.jobs["j"]["status"] == SUCCEEDED
+    assert store.jobs["j"]["result"] == {"a": 1, "b": 2}
+    assert store.started == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_resume_skips_completed_stages():
+    """A job restarted after stage 'a' only runs stage 'b'."""
+    store = FakeJobStore({"j": _job(completed=["a"], result={"a": 5})})
+    pool = JobWorkerPool(store, stages=[("a", _stage_a), ("b", _stage_b)], workers=1)
+
+    await pool.run_job("j")
+
+    assert store.started == ["b"]
+    assert store.jobs["j"]["result"]["b"] == 6
+
+
+@pytest.mark.asyncio
+async def test_failure_is_recorded():
+    store = FakeJobStore({"j": _job()})
+    pool = JobWorkerPool(store, stages=[("a", _stage_a), ("x", _failing), ("b", _stage_b)], workers=1)
+
+    await pool.run_job("j")
+
+    assert store.jobs["j"]["status"] == FAILED
+    assert store.jobs["j"]["error"] == "boom"
+    assert store.started == ["a", "x"]
+    assert store.jobs["j"]["images_deleted"]
+
+
+@pytest.mark.asyncio
+async def test_workers_drain_queue_and_release_on_stop():
+    gate = asyncio.Event()
+
+    async def _blocking(job, store):
+        await gate.wait()
+        return {}
+
+    store = FakeJobStore({"done": _job(), "stuck": _job()})
+    pool = JobWorkerPool(store, stages=[("a", _stage_a)], workers=2)
+    await pool.start()
+    await asyncio.sleep(0.05)
+    assert store.jobs["done"]["status"] == SUCCEEDED
+
+    pool.stages = [("wait", _blocking)]
+    store.jobs["stuck"] = _job()
+    pool.submit("stuck")
+    await asyncio.sleep(0.05)
+    await pool.stop()
+
+    assert store.jobs["stuck"]["status"] == QUEUED
+
+
+@pytest.mark.asyncio
+async def test_long_stage_renews_its_lease(monkeypatch):
+    from app.services.book import pipeline
+
+    async def _slow(job, store):
+        await asyncio.sleep(0.05)
+        return {}
+
+    monkeypatch.setattr(pipeline, "JOB_HEARTBEAT_SECONDS", 0.01)
+    store = FakeJobStore({"j": _job()})
+    pool = JobWorkerPool(store, stages=[("slow", _slow)], workers=1)
+
+    await pool.run_job("j")
+
+    assert store.jobs["j"]["status"] == SUCCEEDED
+    assert store.heartbeats >= 2
+
+
+@pytest.mark.asyncio
+async def test_recover_loop_picks_up_jobs_queued_elsewhere(monkeypatch):
+    from app.services.book import pipeline
+
+    monkeypatch.setattr(pipeline, "JOB_RECOVER_INTERVAL_SECONDS", 0.01)
+    store = FakeJobStore({})
+    pool = JobWorkerPool(store, stages=[("a", _stage_a)], workers=1)
+    await pool.start()
+    store.jobs["late"] = _job()
+    await asyncio.sleep(0.1)
+    await pool.stop()
+
+    assert store.jobs["late"]["status"] == SUCCEEDED
+
+
+def _auth(user_id):
+    from app.services.auth.tokens import token_service
+
+    return {"Authorization": f"Bearer {token_service.issue(user_id, f'{user_id}@example.com')}"}
+
+
+def test_post_books_requires_consent_for_children(monkeypatch):
+    from app.routers import book as book_router
+    from fastapi import FastAPI
+
+    monkeypatch.setattr(book_router, "job_store", MagicMock(), raising=True)
+    monkeypatch.setattr(book_router, "job_pool", MagicMock(), raising=True)
+    app = FastAPI()
+    app.include_router(book_router.router)
+    client = TestClient(app, headers=_auth("u1"))
+    png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+    data = {
+        "people": json.dumps([{"name": "Cy", "declared_age": 2, "role": "child"}]),
+        "num_pages": "4",
+        "target_age": "2",
+        "theme": "dinos",
+        "style": "gentle watercolor",
+    }
+
+    response = client.post("/books", data=data, files=[("files", ("c.png", png, "image/png"))])
+
+    assert response.status_code == 422
+    book_router.job_store.create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_jobs_submitted_before_start_run_once_started():
+    store = FakeJobStore({"early": _job()})
+    pool = JobWorkerPool(store, stages=[("a", _stage_a)], workers=1)
+
+    pool.submit("early")
+    await pool.start()
+    await asyncio.sleep(0.05)
+    await pool.stop()
+
+    assert store.jobs["early"]["status"] == SUCCEEDED
+
+
+@pytest.mark.asyncio
+async def test_extract_stage_saves_characters_through_the_repository(monkeypatch):
+    from app.services.book import pipeline
+    from app.services.character import character_crud
+    from app.services.repository.indexes import unique_keys
+    from app.services.repository.memory import InMemoryCollection
+    from app.services.repository.repositories import CharacterRepository
+
+    class ImageStore:
+        def __init__(self):
+            self.deleted = []
+
+        async def load_image(self, job_id, image_hash):
+            return f"{job_id}/{image_hash}".encode()
+
+        async def delete_images(self, job_id):
+            self.deleted.append(job_id)
+
+    async def describe(data, image_hash):
+        return {"meta": {"observer": image_hash}}
+
+    collection = InMemoryCollection(unique=unique_keys("characters"))
+    monkeypatch.setattr(character_crud, "character_repository", CharacterRepository(collection))
+    monkeypatch.setattr(pipeline, "get_character_description_cached", describe)
+    people = [{"name": "Ana", "declared_age": 30, "role": "adult"}, {"name": "Bo", "declared_age": 3, "role": "child"}]
+    job = {"_id": "book-1", "request": {"image_hashes": ["h0", "h1"], "people": people}}
+    store = ImageStore()
+
+    output = await pipeline.extract_stage(job, store)
+    resumed = await pipeline.extract_stage(job, store)
+
+    assert output == resumed
+    assert output["character_ids"] == [str(d["_id"]) for d in collection.documents]
+    assert [(d["book_id"], d["image_sha256"], d["person"]["name"]) for d in collection.documents] == [
+        ("book-1", "h0", "Ana"),
+        ("book-1", "h1", "Bo"),
+    ]
+    assert store.deleted == ["book-1", "book-1"]
+
+
+def test_idempotent_retry_returns_the_job_before_reading_or_charging(monkeypatch):
+    from unittest.mock import AsyncMock
+    from fastapi import FastAPI
+    from app.routers import book as book_router
+
+    async def must_not_run(*args, **kwargs):
+        raise AssertionError("retry was charged or read")
+
+    store = MagicMock()
+    store.find_by_idempotency_key = AsyncMock(return_value={"_id": "b1", "status": QUEUED, "owner_id": "u1"})
+    monkeypatch.setattr(book_router, "job_store", store)
+    monkeypatch.setattr(book_router, "take_quota", must_not_run)
+    monkeypatch.setattr(book_router, "ingest_form", must_not_run)
+    app = FastAPI()
+    app.include_router(book_router.router)
+    client = TestClient(app)
+
+    response = client.post("/books", headers={**_auth("u1"), "Idempotency-Key": "k1"}, files=[("files", ("c.png", b"x", "image/png"))])
+
+    assert response.status_code == 200
+    assert response.json()["id"] == "b1"
+    store.find_by_idempotency_key.assert_awaited_once_with("k1", "u1")
+    assert client.post("/books", files=[("files", ("c.png", b"x", "image/png"))]).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_readable_by_their_owner_only():
+    from bson import ObjectId
+    from fastapi import HTTPException
+    from app.services.book.job_store import JobStore
+    from app.services.repository.memory import InMemoryCollection
+
+    job_id = ObjectId()
+    store = JobStore(InMemoryCollection([{"_id": job_id, "owner_id": "u1", "idempotency_key": "k1", "status": QUEUED}]), None)
+
+    assert (await store.get(str(job_id), "u1"))["_id"] == job_id
+    assert (await store.find_by_idempotency_key("k1", "u1"))["_id"] == job_id
+    for call, status in ((store.get(str(job_id), "u2"), 404), (store.find_by_idempotency_key("k1", "u2"), 409)):
+        with pytest.raises(HTTPException) as exc_info:
+            await call
+        assert exc_info.value.status_code == status
@@ -0,0 +1,113 @@
+"""
+Tests for the batch character extraction endpoint.
+"""
+
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.main import app
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+SECTIONS = [
+    "meta", "general", "head", "hair", "skin", "face",
+    "measurements_and_proportions", "pose_and_landmarks", "clothing_and_accessories", "annotations",
+]
+
+client = TestClient(app)
+
+
+def _description(confidence):
+    description = {key: {} for key in SECTIONS}
+    description["meta"] = {"confidence_overall": confidence}
+    description["annotations"] = []
+    return description
+
+
+def _files(n):
+    return [("files", (f"p{i}.png", PNG + bytes([i]), "image/png")) for i in range(n)]
+
+
+@pytest.fixture
+def patched(monkeypatch):
+    """Replace extraction and persistence with in-memory fakes."""
+    state = {"active": 0, "peak": 0, "insert_calls": [], "owners": []}
+
+    async def fake_describe(image_file, image_hash):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.02)
+        state["active"] -= 1
+        if image_file.read().endswith(b"\x01"):
+            raise HTTPException(status_code=502, detail="model failed")
+        return _description(0.9)
+
+    async def fake_create_characters(characters, people, **kwargs):
+        state["insert_calls"].append(len(characters))
+        state["owners"].append(kwargs.get("owner_id"))
+        return [dict(c.model_dump(exclude_unset=True), _id=f"id{i}", person=p.model_dump()) for i, (c, p) in enumerate(zip(characters, people))]
+
+    monkeypatch.setattr("app.routers.character.get_character_description_cached", fake_describe, raising=True)
+    monkeypatch.setattr("app.routers.character.create_characters", fake_create_characters, raising=True)
+    return state
+
+
+def test_batch_runs_concurrently_with_partial_failure(patched):
+    """One failing photo does not fail the batch; successes share one insert."""
+    people = [
+        {"name": "Ana", "declared_age": 34, "role": "adult"},
+        {"name": "Bo", "declared_age": 36, "role": "adult"},
+        {"name": "Cy", "declared_age": 3, "role": "child"},
+    ]
+    response = client.post("/characters/batch", data={"people": json.dumps(people)}, files=_files(3))
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["ok", "error", "ok"]
+    assert results[1]["status_code"] == 502
+    assert results[2]["character"]["person"]["name"] == "Cy"
+    assert patched["insert_calls"] == [2]
+    assert patched["peak"] == 3
+
+
+def test_batch_characters_belong_to_the_authenticated_caller(patched):
+    from app.services.auth.tokens import token_service
+
+    people = [{"name": "Ana", "declared_age": 34, "role": "adult"}]
+    headers = {"Authorization": f"Bearer {token_service.issue('u1', 'u1@example.com')}"}
+
+    assert client.post("/characters/batch", data={"people": json.dumps(people)}, files=_files(1), headers=headers).status_code == 200
+    assert client.post("/characters/batch", data={"people": json.dumps(people)}, files=_files(1)).status_code == 200
+    assert patched["owners"] == ["u1", None]
+
+
+def test_batch_rejects_too_many_children(patched):
+    people = [{"name": str(i), "declared_age": 2, "role": "child"} for i in range(3)]
+    response = client.post("/characters/batch", data={"people": json.dumps(people)}, files=_files(3))
+    assert response.status_code == 422
+
+
+def test_batch_rejects_mismatched_metadata(patched):
+    people = [{"name": "Ana", "declared_age": 34, "role": "adult"}]
+    response = client.post("/characters/batch", data={"people": json.dumps(people)}, files=_files(2))
+    assert response.status_code == 422
+
+
+def test_batch_rejects_more_than_four_files(patched):
+    people = [{"name": str(i), "declared_age": 30, "role": "adult"} for i in range(5)]
+    response = client.post("/characters/batch", data={"people": json.dumps(people)}, files=_files(5))
+    assert response.status_code == 413
+
+
+def test_batch_is_charged_once_before_the_upload_is_read(patched, monkeypatch):
+    costs = []
+
+    async def record_quota(request, cost=1):
+        costs.append(cost)
+
+    monkeypatch.setattr("app.services.http.admission.take_quota", record_quota)
+    people = [{"name": "Ana", "declared_age": 34, "role": "adult"}, {"name": "Cy", "declared_age": 3, "role": "child"}]
+
+    assert client.post("/characters/batch", data={"people": json.dumps(people)}, files=_files(2)).status_code == 200
+    assert costs == [1]
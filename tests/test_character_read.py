@@ -0,0 +1,101 @@
+"""
+Tests for the paginated, projected character read API.
+"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.auth.tokens import token_service
+from app.services.character import character_crud
+from app.services.repository.memory import InMemoryCollection
+from app.services.repository.repositories import CharacterRepository
+
+client = TestClient(app, headers={"Authorization": f"Bearer {token_service.issue('u1', 'u1@example.com')}"})
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def characters(monkeypatch):
+    documents = [
+        {
+            "_id": ObjectId.from_datetime(START + timedelta(minutes=i)),
+            "meta": {"confidence_overall": 0.9},
+            "general": {"view": "front"},
+            "face": {"notes": "x" * 100},
+            "image_sha256": "even" if i % 2 == 0 else "odd",
+            "owner_id": "u1",
+            "created_at": START + timedelta(minutes=i),
+        }
+        for i in range(5)
+    ]
+    others = [{"_id": ObjectId(), "meta": {}, "image_sha256": "odd", "owner_id": "u2", "created_at": START}]
+    collection = InMemoryCollection(documents + others)
+    monkeypatch.setattr(character_crud, "character_repository", CharacterRepository(collection))
+    return documents
+
+
+def test_pages_are_newest_first_and_cover_everything(characters):
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/characters", params=params).json()
+        seen += [item["_id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [str(d["_id"]) for d in reversed(characters)]
+
+
+def test_list_projects_default_and_requested_fields(characters):
+    default = client.get("/characters", params={"limit": 1}).json()["items"][0]
+    assert set(default) == {"_id", "meta", "general", "created_at"}
+
+    only_meta = client.get("/characters", params={"fields": "meta"}).json()["items"][0]
+    assert set(only_meta) == {"_id", "meta"}
+
+    assert client.get("/characters", params={"fields": "meta,password"}).status_code == 422
+
+
+def test_list_filters_on_indexed_fields(characters):
+    body = client.get("/characters", params={"image_sha256": "odd"}).json()
+    assert len(body["items"]) == 2
+
+    after = (START + timedelta(minutes=3)).isoformat()
+    body = client.get("/characters", params={"created_after": after}).json()
+    assert len(body["items"]) == 2
+
+
+def test_get_character(characters):
+    character_id = str(characters[0]["_id"])
+
+    full = client.get(f"/characters/{character_id}").json()
+    assert full["face"] == {"notes": "x" * 100}
+    assert full["created_at"] == START.isoformat()
+
+    assert set(client.get(f"/characters/{character_id}", params={"fields": "general"}).json()) == {"_id", "general"}
+    assert client.get(f"/characters/{ObjectId()}").status_code == 404
+    assert client.get("/characters/not-an-id").status_code == 404
+
+
+def test_get_character_is_scoped_to_the_caller(characters):
+    others = TestClient(app, headers={"Authorization": f"Bearer {token_service.issue('u2', 'u2@example.com')}"})
+    character_id = str(characters[0]["_id"])
+
+    assert others.get(f"/characters/{character_id}").status_code == 404
+    assert TestClient(app).get(f"/characters/{character_id}").status_code == 401
+
+
+def test_list_requires_a_token(characters):
+    anonymous = TestClient(app)
+
+    assert anonymous.get("/characters").status_code == 401
+    assert anonymous.get("/characters", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+
+def test_invalid_cursor_is_rejected(characters):
+    assert client.get("/characters", params={"cursor": "!!"}).status_code == 422
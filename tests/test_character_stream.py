@@ -0,0 +1,106 @@
+"""
+Tests for the server-sent-events character endpoint.
+"""
+
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+from app.main import app
+from app.routers.character import _AdmittedStreamingResponse
+from app.services.vision.provider import VisionProvider, set_vision_provider
+from app.services.vision.stub_provider import StubProvider
+
+client = TestClient(app)
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    """Stub provider, in-memory cache and fake persistence."""
+    provider = StubProvider()
+    provider.startup()
+    set_vision_provider(provider)
+    cache = {}
+    async def fake_get(image_hash):
+        return cache.get(image_hash)
+
+    async def fake_store(image_hash, description):
+        cache[image_hash] = description
+
+    monkeypatch.setattr("app.routers.character.get_cached_description", fake_get, raising=True)
+    monkeypatch.setattr("app.routers.character.store_description", fake_store, raising=True)
+    async def fake_create_character(character, **kwargs):
+        return {"_id": "abc123"}
+
+    monkeypatch.setattr("app.routers.character.create_character", fake_create_character, raising=True)
+    yield cache
+    set_vision_provider(None)
+
+
+def _post():
+    with open("tests/assets/test_person.png", "rb") as image_file:
+        files = {"file": ("test_person.png", image_file, "image/png")}
+        return client.post("/character/stream", files=files)
+
+
+def test_stream_emits_sections_then_character(stubbed):
+    response = _post()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    names = [name for name, _ in events]
+    assert names[0] == "section" and events[0][1]["key"] == "meta"
+    assert names[1] == "confidence"
+    assert events[1][1] == {"confidence_overall": 0.5, "needs_review": True}
+    assert names[-1] == "character" and events[-1][1] == {"_id": "abc123"}
+    assert names.count("section") == 10
+    assert len(stubbed) == 1
+
+
+def test_stream_replays_cached_description(stubbed):
+    class _Unavailable(VisionProvider):
+        async def generate(self, prompt, image, system_message=None, timeout=None):
+            raise AssertionError("model must not be called on a cache hit")
+
+    _post()
+    set_vision_provider(_Unavailable())
+
+    events = _events(_post().text)
+
+    assert events[-1] == ("character", {"_id": "abc123"})
+
+
+def test_upload_errors_are_plain_http_errors(stubbed):
+    response = client.post("/character/stream", files={"file": ("a.txt", b"hello world, not an image", "text/plain")})
+    assert response.status_code == 415
+
+
+def test_slot_is_released_when_the_client_leaves_before_the_stream_starts():
+    started, closed = [], []
+
+    async def events():
+        started.append(True)
+        yield "event: section\n\n"
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        raise OSError("client went away")
+
+    response = _AdmittedStreamingResponse(events(), media_type="text/event-stream", on_close=lambda: closed.append(True))
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
+
+    assert started == []
+    assert closed == [True]
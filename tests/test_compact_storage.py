@@ -0,0 +1,114 @@
+"""
+Tests for the compact character storage encoding.
+"""
+
+import copy
+import json
+import bson
+import pytest
+from app.models.character_schema import CharacterCreate
+from app.services.character import character_crud
+from app.services.character.compact_storage import STORAGE_VERSION, compact_document, expand_document, migrate
+from app.services.repository.memory import InMemoryCollection
+from app.services.repository.repositories import CharacterRepository
+from app.services.vision.stub_provider import example_from_schema
+
+with open("app/json_schemas/character.json") as f:
+    SCHEMA = json.load(f)
+
+
+def _description():
+    description = example_from_schema(SCHEMA)
+    description["meta"]["observer"] = None
+    description["general"]["height_cm"] = None
+    description["annotations"] = [{"label": "freckles", "text": "left cheek", "note": None}]
+    return description
+
+
+def test_round_trip_restores_nulls_and_defaults():
+    description = _description()
+    document = dict(description, image_sha256="abc", person={"name": "Ana", "nickname": None})
+
+    compact = compact_document(copy.deepcopy(document), SCHEMA)
+
+    assert compact["_v"] == STORAGE_VERSION
+    assert "observer" not in compact["meta"]
+    assert "view" not in compact["general"]  # equal to the schema default
+    assert "annotations" not in compact and "pose_and_landmarks" not in compact
+    assert compact["person"] == {"name": "Ana", "nickname": None}  # not a section: untouched
+    assert len(bson.encode(compact)) < len(bson.encode(document))
+    assert expand_document(compact, SCHEMA) == document
+
+
+def test_documents_expand_against_the_schema_they_were_written_with(monkeypatch, tmp_path):
+    from app.services.character import compact_storage
+    from app.services.character.schema_validator import ValidatorRegistry, schema_version
+
+    old_schema = copy.deepcopy(SCHEMA)
+    new_schema = copy.deepcopy(SCHEMA)
+    new_schema["properties"]["general"]["properties"]["view"]["default"] = "rear"
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    (archive / f"character-{schema_version(old_schema)}.json").write_text(json.dumps(old_schema))
+    current = tmp_path / "character.json"
+    current.write_text(json.dumps(new_schema))
+    registry = ValidatorRegistry(str(current), str(archive))
+    registry.load()
+    monkeypatch.setattr(compact_storage, "validator_registry", registry)
+    description = _description()
+
+    compact = compact_document(copy.deepcopy(description), old_schema)
+
+    assert compact["_s"] == schema_version(old_schema)
+    assert expand_document(compact)["general"]["view"] == description["general"]["view"] == "front"
+    unknown = dict(compact, _s="0" * 16)
+    assert "view" not in expand_document(unknown)["general"]
+
+
+def test_legacy_documents_are_returned_as_stored():
+    document = {"_id": 1, "meta": {"observer": None}}
+    assert expand_document(document, SCHEMA) is document
+
+
+@pytest.mark.asyncio
+async def test_crud_writes_compact_and_reads_expanded(monkeypatch):
+    collection = InMemoryCollection()
+    monkeypatch.setattr(character_crud, "character_repository", CharacterRepository(collection))
+
+    created = await character_crud.create_character(CharacterCreate(**_description()), image_hash="abc", owner_id="u1")
+
+    assert collection.documents[0]["_v"] == STORAGE_VERSION
+    full = await character_crud.get_character(created["_id"], "u1")
+    assert full["annotations"] == created["annotations"]
+    assert full["general"] == created["general"]
+    partial = await character_crud.get_character(created["_id"], "u1", "annotations,meta")
+    assert set(partial) == {"_id", "annotations", "meta"}
+    assert partial["annotations"] == created["annotations"]
+
+
+class _SyncCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, batch_size=None):
+        return [d for d in self.documents if "_v" not in d]
+
+    def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            document = request._doc
+            self.documents[[d["_id"] for d in self.documents].index(document["_id"])] = document
+
+
+def test_migrate_converts_legacy_documents_once():
+    legacy = [dict(_description(), _id=i) for i in range(3)]
+    collection = _SyncCollection(copy.deepcopy(legacy))
+
+    dry = migrate(collection, batch_size=2, dry_run=True)
+    assert dry["documents"] == 3 and all("_v" not in d for d in collection.documents)
+
+    totals = migrate(collection, batch_size=2)
+
+    assert totals["bytes_after"] < totals["bytes_before"]
+    assert all(d["_v"] == STORAGE_VERSION for d in collection.documents)
+    assert [expand_document(d) for d in collection.documents] == legacy
+    assert migrate(collection)["documents"] == 0
@@ -0,0 +1,103 @@
+"""
+Tests for the character description cache.
+"""
+
+from datetime import datetime, timedelta, timezone
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError
+from app.services.character.description_cache import DescriptionCache, cache_key, hash_image
+
+
+def test_cache_key_depends_on_image_and_version():
+    """Different images or prompt versions must not share an entry."""
+    a = hash_image(b"image-a")
+    b = hash_image(b"image-b")
+    assert cache_key(a, "v1") != cache_key(b, "v1")
+    assert cache_key(a, "v1") != cache_key(a, "v2")
+
+
+@pytest.mark.asyncio
+async def test_memory_hit_returns_copy_and_counts():
+    cache = DescriptionCache(collection=None)
+    await cache.set("k", {"meta": {"confidence_overall": 0.9}})
+
+    first = await cache.get("k")
+    first["meta"]["confidence_overall"] = 0.1
+
+    assert await cache.get("k") == {"meta": {"confidence_overall": 0.9}}
+    assert cache.hits("k") == 2
+    assert cache.stats["memory_hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_hit_counters_are_evicted_with_their_entries():
+    cache = DescriptionCache(collection=None, maxsize=2)
+    for key in ("a", "b", "c"):
+        await cache.set(key, {"meta": {}})
+        await cache.get(key)
+
+    assert cache.hits("a") == 0
+    assert cache.hits("c") == 1
+    assert len(cache._memory) == 2
+
+
+@pytest.mark.asyncio
+async def test_persistent_hit_populates_memory():
+    """A miss in memory falls through to MongoDB and is then served locally."""
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock()
+    collection.find_one_and_update.return_value = {
+        "_id": "k",
+        "description": {"meta": {}},
+        "created_at": datetime.now(timezone.utc),
+    }
+    cache = DescriptionCache(collection=collection)
+
+    assert await cache.get("k") == {"meta": {}}
+    assert await cache.get("k") == {"meta": {}}
+    collection.find_one_and_update.assert_awaited_once_with({"_id": "k"}, {"$inc": {"hits": 1}})
+    assert cache.stats == {"memory_hits": 1, "store_hits": 1, "misses": 0}
+
+
+@pytest.mark.asyncio
+async def test_expired_persistent_entry_is_a_miss():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock()
+    collection.find_one_and_update.return_value = {
+        "_id": "k",
+        "description": {"meta": {}},
+        "created_at": datetime.now(timezone.utc) - timedelta(seconds=120),
+    }
+    cache = DescriptionCache(collection=collection, ttl_seconds=60)
+
+    assert await cache.get("k") is None
+    assert cache.stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_database_errors_behave_as_miss():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(side_effect=PyMongoError("down"))
+    collection.update_one = AsyncMock(side_effect=PyMongoError("down"))
+    cache = DescriptionCache(collection=collection)
+
+    assert await cache.get("k") is None
+    await cache.set("k", {"meta": {}})
+    assert await cache.get("k") == {"meta": {}}
+
+
+@pytest.mark.asyncio
+async def test_unreachable_database_is_a_bounded_miss():
+    """With no server the lookup gives up after the cache deadline, not the client's."""
+    client = AsyncMongoClient("mongodb://127.0.0.1:9", serverSelectionTimeoutMS=5000)
+    cache = DescriptionCache(collection=client.db.character_cache, timeout_ms=100)
+    started = time.perf_counter()
+    try:
+        assert await cache.get("k") is None
+    finally:
+        await client.close()
+
+    assert time.perf_counter() - started < 2
@@ -0,0 +1,73 @@
+"""
+Tests for the async Gemini client.
+"""
+
+import asyncio
+import io
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from app.services.gemini import client
+from app.services.vision.gemini_provider import _image_part
+from app.services.vision.provider import VisionProvider, set_vision_provider
+
+
+def _png_bytes():
+    buf = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _SlowProvider(VisionProvider):
+    """Provider stand-in that records peak concurrency."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.delay = 0.05
+
+    async def generate(self, prompt, image, system_message=None, timeout=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return "ok"
+
+
+@pytest.fixture
+def slow_model(monkeypatch):
+    provider = _SlowProvider()
+    set_vision_provider(provider)
+    monkeypatch.setattr(client, "_semaphore", None)
+    yield provider
+    set_vision_provider(None)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(monkeypatch, slow_model):
+    """No more than GEMINI_MAX_CONCURRENCY calls are in flight at once."""
+    monkeypatch.setattr(client, "GEMINI_MAX_CONCURRENCY", 2)
+    image = _png_bytes()
+
+    results = await asyncio.gather(*[client.generate_text_from_image_async("p", image) for _ in range(6)])
+
+    assert results == ["ok"] * 6
+    assert slow_model.peak == 2
+
+
+@pytest.mark.asyncio
+async def test_timeout_raises_504(slow_model):
+    slow_model.delay = 1.0
+
+    with pytest.raises(HTTPException) as exc_info:
+        await client.generate_text_from_image_async("p", _png_bytes(), timeout=0.01)
+
+    assert exc_info.value.status_code == 504
+    assert slow_model.active == 0
+
+
+def test_image_part_keeps_original_bytes():
+    image = _png_bytes()
+    assert _image_part(image) == {"mime_type": "image/png", "data": image}
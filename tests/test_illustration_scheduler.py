@@ -0,0 +1,130 @@
+"""
+Tests for the illustration scheduler.
+"""
+
+import asyncio
+import pytest
+from app.services.book.illustration_scheduler import IllustrationScheduler, PREVIEW, FINAL
+
+
+def _pages(n, tag):
+    return [{"page": i, "image_prompt": f"{tag}:{i}"} for i in range(1, n + 1)]
+
+
+class Recorder:
+    """Renderer stand-in that logs call order and peak concurrency."""
+
+    def __init__(self, delay=0.01, fail_first=()):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.fail_first = set(fail_first)
+
+    async def __call__(self, prompt, size):
+        self.calls.append((prompt, size))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if prompt in self.fail_first:
+                self.fail_first.discard(prompt)
+                raise RuntimeError("transient")
+            return prompt.encode(), "image/png"
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_results_in_page_order_with_bounded_concurrency():
+    renderer = Recorder()
+    scheduler = IllustrationScheduler(renderer, max_concurrency=3)
+
+    pages = list(reversed(_pages(8, "a")))
+    results = await scheduler.render_pages("a", pages, lane=FINAL)
+
+    assert [r.page for r in results] == list(range(1, 9))
+    assert [r.image for r in results] == [f"a:{i}".encode() for i in range(1, 9)]
+    assert renderer.peak == 3
+
+
+@pytest.mark.asyncio
+async def test_books_are_served_round_robin():
+    """A small book is not starved behind a large one in the same lane."""
+    renderer = Recorder()
+    scheduler = IllustrationScheduler(renderer, max_concurrency=1)
+
+    await asyncio.gather(
+        scheduler.render_pages("big", _pages(8, "big"), lane=FINAL),
+        scheduler.render_pages("small", _pages(2, "small"), lane=FINAL),
+    )
+
+    order = [prompt.split(":")[0] for prompt, _ in renderer.calls]
+    assert order[:4] == ["big", "small", "big", "small"]
+
+
+@pytest.mark.asyncio
+async def test_preview_lane_goes_first():
+    renderer = Recorder()
+    scheduler = IllustrationScheduler(renderer, max_concurrency=1)
+
+    finals = asyncio.create_task(scheduler.render_pages("a", _pages(3, "final"), lane=FINAL))
+    await asyncio.sleep(0.001)  # let the first final page start
+    await scheduler.render_pages("b", _pages(3, "preview"), lane=PREVIEW)
+    await finals
+
+    lanes = [prompt.split(":")[0] for prompt, _ in renderer.calls]
+    # The first final page was already in flight; every preview jumps the rest.
+    assert lanes == ["final", "preview", "preview", "preview", "final", "final"]
+    assert renderer.calls[1][1] < renderer.calls[-1][1]
+
+
+@pytest.mark.asyncio
+async def test_failed_page_is_retried_individually():
+    renderer = Recorder(fail_first={"a:2"})
+    scheduler = IllustrationScheduler(renderer, max_concurrency=2, retry_base_seconds=0)
+
+    results = await scheduler.render_pages("a", _pages(3, "a"))
+
+    assert all(r.image for r in results)
+    assert results[1].attempts == 2
+    assert [p for p, _ in renderer.calls].count("a:1") == 1
+
+
+@pytest.mark.asyncio
+async def test_page_gives_up_after_max_attempts():
+    renderer = Recorder()
+
+    async def always_fail(prompt, size):
+        raise RuntimeError("down")
+
+    scheduler = IllustrationScheduler(always_fail, max_concurrency=2, max_attempts=2, retry_base_seconds=0)
+
+    results = await scheduler.render_pages("a", _pages(2, "a"))
+
+    assert [r.image for r in results] == [None, None]
+    assert [r.attempts for r in results] == [2, 2]
+    assert results[0].error == "down"
+
+
+@pytest.mark.asyncio
+async def test_each_page_is_delivered_as_soon_as_it_is_done():
+    gate = asyncio.Event()
+    delivered = []
+
+    async def renderer(prompt, size):
+        if prompt == "a:2":
+            await gate.wait()
+        return prompt.encode(), "image/png"
+
+    async def on_page(result):
+        delivered.append(result.page)
+        if len(delivered) == 2:
+            gate.set()
+
+    scheduler = IllustrationScheduler(renderer, max_concurrency=3)
+
+    results = await scheduler.render_pages("a", _pages(3, "a"), lane=PREVIEW, on_page=on_page)
+
+    assert delivered == [1, 3, 2]
+    assert [r.page for r in results] == [1, 2, 3]
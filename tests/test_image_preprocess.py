@@ -0,0 +1,68 @@
+"""
+Tests for the image pre-processing stage.
+"""
+
+import io
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from app.services.image.preprocess import preprocess_image, preprocess_image_async
+
+
+def _jpeg_with_exif(size=(400, 200), orientation=6):
+    img = Image.new("RGB", size, (200, 10, 10))
+    exif = Image.Exif()
+    exif[0x0112] = orientation  # Orientation
+    exif[0x010F] = "TestCam"  # Make
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", exif=exif)
+    return buf.getvalue()
+
+
+def test_test_asset_is_downscaled_and_shrunk():
+    """The 2 MB PNG test asset is resized to the max edge and re-encoded."""
+    with open("tests/assets/test_person.png", "rb") as f:
+        data = f.read()
+
+    result = preprocess_image(data, max_edge=512)
+
+    assert max(result.width, result.height) == 512
+    assert result.mime_type == "image/jpeg"
+    assert result.bytes_saved > 0
+    assert Image.open(io.BytesIO(result.data)).format == "JPEG"
+
+
+def test_exif_orientation_applied_and_metadata_stripped():
+    result = preprocess_image(_jpeg_with_exif(), max_edge=1024)
+
+    out = Image.open(io.BytesIO(result.data))
+    # Orientation 6 rotates the 400x200 image to portrait
+    assert out.size == (200, 400)
+    assert len(out.getexif()) == 0
+
+
+def test_transparent_png_is_flattened_for_jpeg():
+    buf = io.BytesIO()
+    Image.new("RGBA", (10, 10), (0, 0, 0, 0)).save(buf, format="PNG")
+
+    result = preprocess_image(buf.getvalue())
+
+    assert Image.open(io.BytesIO(result.data)).mode == "RGB"
+
+
+def test_pixel_limit_rejects_before_decoding():
+    with pytest.raises(HTTPException) as exc_info:
+        preprocess_image(_jpeg_with_exif(), max_pixels=100)
+    assert exc_info.value.status_code == 413
+
+
+def test_non_image_is_rejected():
+    with pytest.raises(HTTPException) as exc_info:
+        preprocess_image(b"not an image")
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_async_runs_in_pool():
+    result = await preprocess_image_async(_jpeg_with_exif(), max_edge=100)
+    assert max(result.width, result.height) == 100
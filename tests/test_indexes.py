@@ -0,0 +1,95 @@
+"""
+Tests for the declarative index manager.
+"""
+
+from pymongo.errors import OperationFailure
+from app.services.repository.indexes import INDEXES, IndexManager, IndexSpec, unique_keys
+
+
+class FakeCollection:
+    """Just enough of a sync Collection for index management."""
+
+    def __init__(self, indexes=None, stats=None, fail_create=False):
+        self.indexes = {"_id_": {"key": [("_id", 1)]}, **(indexes or {})}
+        self.stats = stats
+        self.fail_create = fail_create
+        self.created = []
+
+    def index_information(self):
+        return dict(self.indexes)
+
+    def create_index(self, keys, name, unique=False, **options):
+        if self.fail_create:
+            raise OperationFailure("index build failed")
+        self.created.append(name)
+        self.indexes[name] = {"key": list(keys), **({"unique": True} if unique else {}), **options}
+        return name
+
+    def aggregate(self, pipeline):
+        if self.stats is None:
+            raise OperationFailure("$indexStats not supported")
+        return [{"name": n, "accesses": {"ops": ops}} for n, ops in self.stats.items()]
+
+
+class FakeResource:
+    def __init__(self, collections):
+        self.collections = collections
+
+    def collection(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+
+def test_ensure_is_idempotent():
+    resource = FakeResource({})
+    manager = IndexManager(resource)
+
+    first = manager.ensure()
+    second = manager.ensure()
+
+    assert sorted(first["created"]) == sorted(f"{s.collection}.{s.name}" for s in INDEXES)
+    assert second["created"] == [] and second["conflicts"] == []
+    assert len(second["present"]) == len(INDEXES)
+    assert resource.collections["users"].indexes["email_unique"]["unique"] is True
+
+
+def test_conflicting_definition_is_reported_not_dropped():
+    users = FakeCollection({"email_unique": {"key": [("email", 1)]}})
+    manager = IndexManager(FakeResource({"users": users}), [IndexSpec("users", (("email", 1),), "email_unique", unique=True)])
+
+    assert manager.ensure()["conflicts"] == ["users.email_unique"]
+    assert users.created == []
+    assert manager.report()["conflicts"] == ["users.email_unique"]
+
+
+def test_failed_creation_is_a_conflict():
+    manager = IndexManager(FakeResource({"users": FakeCollection(fail_create=True)}), INDEXES[:1])
+
+    assert manager.ensure()["conflicts"] == ["users.email_unique"]
+
+
+def test_report_lists_missing_undeclared_and_unused():
+    specs = [IndexSpec("characters", (("image_sha256", 1),), "image_sha256"), IndexSpec("characters", (("created_at", -1),), "created_at")]
+    characters = FakeCollection(
+        {"image_sha256": {"key": [("image_sha256", 1)]}, "legacy_name": {"key": [("name", 1)]}},
+        stats={"_id_": 10, "image_sha256": 0, "legacy_name": 3},
+    )
+
+    report = IndexManager(FakeResource({"characters": characters}), specs).report()
+
+    assert report["missing"] == ["characters.created_at"]
+    assert report["undeclared"] == ["characters.legacy_name"]
+    assert report["unused"] == ["characters.image_sha256"]
+    assert report["accesses"]["characters.legacy_name"] == 3
+
+
+def test_unique_keys():
+    assert unique_keys("users") == [("email",), ("oauth_provider", "oauth_id")]
+    assert unique_keys("characters") == [("book_id", "image_sha256")]
+
+
+def test_no_declared_index_is_a_prefix_of_another():
+    for spec in INDEXES:
+        for other in INDEXES:
+            if other is spec or other.collection != spec.collection or spec.unique:
+                continue
+            assert other.keys[: len(spec.keys)] != spec.keys, f"{spec.name} is a prefix of {other.name}"
@@ -0,0 +1,120 @@
+"""
+Tests for the metrics registry, request timing spans and /metrics.
+"""
+
+import io
+import json
+import logging
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.services.character.response_parser import parse_paths, _parse_response_text
+from app.services.image.preprocess import preprocess_image_async
+from app.services.observability import timing
+from app.services.observability.metrics import MetricsRegistry
+from app.services.observability.timing import RequestTimings, TimingMiddleware, record_usage, span
+
+
+def test_render_counters_and_cumulative_histograms():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Jobs.", ("kind",))
+    histogram = registry.histogram("job_seconds", "Job time.", buckets=(0.1, 1))
+    counter.inc(kind="a")
+    counter.inc(2, kind='say "hi"')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+    registry.gauge("depth", "Depth.", lambda: 4)
+    registry.gauge("broken", "Raises.", lambda: 1 / 0)
+
+    text = registry.render()
+
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="a"} 1' in text
+    assert 'jobs_total{kind="say \\"hi\\""} 2' in text
+    assert 'job_seconds_bucket{le="0.1"} 1' in text
+    assert 'job_seconds_bucket{le="1"} 2' in text
+    assert 'job_seconds_bucket{le="+Inf"} 3' in text
+    assert "job_seconds_count 3" in text
+    assert "depth 4" in text
+    assert "broken" not in text
+    assert registry.counter("jobs_total", "Jobs.", ("kind",)) is counter
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+def test_spans_and_usage_accumulate_on_the_current_request():
+    timings = RequestTimings()
+    token = timing._current.set(timings)
+    try:
+        with span("model"):
+            pass
+        with span("model"):
+            pass
+        record_usage("generate", SimpleNamespace(prompt_token_count=120, candidates_token_count=30))
+        record_usage("generate", None)
+    finally:
+        timing._current.reset(token)
+
+    assert set(timings.spans_ms) == {"model"}
+    assert timings.tokens == {"input": 120, "output": 30}
+    assert timing.model_tokens.value(operation="generate", kind="input") >= 120
+
+
+@pytest.mark.asyncio
+async def test_preprocess_spans_from_the_worker_thread_reach_the_request():
+    out = io.BytesIO()
+    Image.new("RGB", (64, 48), "red").save(out, format="PNG")
+    timings = RequestTimings()
+    token = timing._current.set(timings)
+    try:
+        await preprocess_image_async(out.getvalue())
+    finally:
+        timing._current.reset(token)
+
+    assert {"preprocess", "image_open", "image_encode"} <= set(timings.spans_ms)
+
+
+def test_parse_paths_are_counted():
+    before = {path: parse_paths.value(path=path) for path in ("json", "embedded_json", "toon")}
+
+    _parse_response_text('{"a": 1}')
+    _parse_response_text('Sure! {"a": 1} hope that helps')
+    _parse_response_text("a: 1")
+
+    for path, count in before.items():
+        assert parse_paths.value(path=path) == count + 1
+
+
+def test_middleware_logs_spans_by_route_template(caplog):
+    probe = FastAPI()
+    probe.add_middleware(TimingMiddleware)
+
+    @probe.get("/items/{item_id}")
+    async def item(item_id: str):
+        with span("lookup"):
+            return {"id": item_id}
+
+    with caplog.at_level(logging.INFO, logger="app.timing"):
+        assert TestClient(probe).get("/items/42").status_code == 200
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["route"] == "/items/{item_id}"
+    assert line["status"] == 200
+    assert "lookup" in line["spans_ms"]
+    assert timing.request_duration.count(method="GET", route="/items/{item_id}", status="200") >= 1
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    client = TestClient(app)
+    client.get("/healthz")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/healthz",status="200"}' in response.text
+    assert "admission_in_flight 0" in response.text
@@ -0,0 +1,127 @@
+"""
+Tests for the lazy MongoDB resource and the health endpoints.
+"""
+
+import asyncio
+import pytest
+import time
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from pymongo.errors import ServerSelectionTimeoutError
+from app.mongodb import LazyCollection, MongoResource, PoolStats
+
+
+def test_client_is_created_on_first_use_without_io():
+    resource = MongoResource(uri="mongodb://127.0.0.1:1", max_pool_size=7, min_pool_size=0)
+    assert not resource.is_open
+
+    started = time.monotonic()
+    collection = LazyCollection(resource, "things")
+    assert collection.name == "things"
+    assert collection.full_name == f"{resource.database}.things"
+
+    assert resource.is_open
+    assert time.monotonic() - started < 1
+    assert resource.client.options.pool_options.max_pool_size == 7
+    resource.close()
+    assert not resource.is_open
+
+
+def test_lazy_collection_survives_reconnect():
+    resource = MongoResource(uri="mongodb://127.0.0.1:1")
+    collection = LazyCollection(resource, "things")
+    first = resource.client
+    collection.full_name
+    resource.close()
+
+    collection.full_name
+
+    assert resource.client is not first
+    resource.close()
+
+
+def test_ping_is_bounded_by_timeout():
+    resource = MongoResource(uri="mongodb://127.0.0.1:1")
+    started = time.monotonic()
+    try:
+        resource.ping(timeout_ms=200)
+    except ServerSelectionTimeoutError:
+        pass
+    else:
+        raise AssertionError("ping to an unreachable server succeeded")
+    assert time.monotonic() - started < 2
+    resource.close()
+
+
+def test_pool_stats_track_checkouts():
+    stats = PoolStats()
+    event = SimpleNamespace()
+
+    stats.connection_created(event)
+    stats.connection_check_out_started(event)
+    stats.connection_checked_out(event)
+    stats.connection_check_out_started(event)
+
+    assert stats.snapshot()["in_use"] == 1
+    assert stats.snapshot()["waiting"] == 1
+    stats.connection_check_out_failed(event)
+    stats.connection_checked_in(event)
+    assert stats.snapshot() == {
+        "open": 1, "in_use": 0, "waiting": 0, "created": 1, "closed": 0, "checkout_failures": 1, "pool_clears": 0,
+    }
+
+
+def test_health_endpoints(monkeypatch):
+    from app.main import app
+    from app.mongodb import mongo
+    from app.routers import health
+
+    def _down(timeout_ms):
+        raise ServerSelectionTimeoutError("no servers")
+
+    client = TestClient(app)
+    response = client.get("/healthz")
+    assert response.status_code == 200
+    assert response.json()["mongo"]["max_pool_size"] == mongo.max_pool_size
+
+    monkeypatch.setattr(mongo, "ping", _down)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+
+    monkeypatch.setattr(mongo, "ping", lambda timeout_ms: None)
+    monkeypatch.setitem(health.storage_state, "bootstrapped", False)
+    assert client.get("/readyz").json()["status"] == "starting"
+    monkeypatch.setitem(health.storage_state, "bootstrapped", True)
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert "ping_ms" in response.json()
+
+
+@pytest.mark.asyncio
+async def test_storage_bootstrap_retries_until_the_database_answers(monkeypatch):
+    from app import main
+    from app.routers import health
+
+    calls = []
+
+    def ensure():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ServerSelectionTimeoutError("no servers")
+
+    async def noop():
+        return None
+
+    monkeypatch.setattr(main, "STORAGE_BOOTSTRAP_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(main.index_manager, "ensure", ensure)
+    monkeypatch.setattr(main.description_cache, "ensure_indexes", noop)
+    monkeypatch.setattr(main.job_store, "ensure_indexes", noop)
+    monkeypatch.setattr(main.job_pool, "start", noop)
+    monkeypatch.setattr(health, "storage_state", dict(health.storage_state))
+    monkeypatch.setattr(main, "storage_state", health.storage_state)
+
+    await asyncio.wait_for(main.bootstrap_storage(), 2)
+
+    assert len(calls) == 3
+    assert health.storage_state == {"bootstrapped": True, "error": None, "attempts": 3}
@@ -6,6 +6,9 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock
 from starlette.requests import Request
 from app.services.auth.oauth_service import google_authorize_redirect, google_authorize_callback
+from app.services.auth.tokens import token_service
+from app.services.repository.memory import InMemoryCollection
+from app.services.repository.repositories import UserRepository
 
 # Mock the OAuth client
 mock_oauth = MagicMock()
@@ -15,12 +18,8 @@ mock_oauth.google.parse_id_token = AsyncMock()
 
 @pytest.fixture
 def mock_collection():
-    """Return a fresh MagicMock for the MongoDB collection per test.
-
-    This fixture avoids shared call history across tests by providing a fresh
-    MagicMock instance for each test that needs to assert database interactions.
-    """
-    return MagicMock()
+    """Return a fresh in-memory users collection per test."""
+    return InMemoryCollection()
 
 @pytest.mark.asyncio
 async def test_google_authorize_redirect(monkeypatch):
@@ -66,22 +65,21 @@ async def test_google_authorize_callback_new_user(monkeypatch, mock_collection):
         raising=True,
     )
     monkeypatch.setattr(
-        "app.services.auth.oauth_service.users_collection",
-        mock_collection,
+        "app.services.auth.oauth_service.user_repository",
+        UserRepository(mock_collection),
         raising=True,
     )
     mock_oauth.google.parse_id_token.return_value = user_info
     mock_oauth.google.load_server_metadata = AsyncMock(return_value={"jwks_uri": "mock_uri"})
     mock_oauth.google.fetch_jwk_set = AsyncMock(return_value={"keys": []})
-    mock_collection.find_one.return_value = None
-    mock_collection.insert_one.return_value.inserted_id = "12345"
 
     user = await google_authorize_callback(token)
 
-    assert user["id"] == "12345"
+    assert user["id"] == str(mock_collection.documents[0]["_id"])
     assert user["email"] == user_info["email"]
-    mock_collection.find_one.assert_called_once_with({"email": user_info["email"]})
-    mock_collection.insert_one.assert_called_once()
+    assert mock_collection.documents[0]["oauth_id"] == user_info["sub"]
+    assert len(mock_collection.documents) == 1
+    assert token_service.verify(user["access_token"])["sub"] == user["id"]
 
 @pytest.mark.asyncio
 async def test_google_authorize_callback_existing_user(monkeypatch, mock_collection):
@@ -110,20 +108,21 @@ async def test_google_authorize_callback_existing_user(monkeypatch, mock_collect
         raising=True,
     )
     monkeypatch.setattr(
-        "app.services.auth.oauth_service.users_collection",
-        mock_collection,
+        "app.services.auth.oauth_service.user_repository",
+        UserRepository(mock_collection),
         raising=True,
     )
     mock_oauth.google.parse_id_token.return_value = user_info
     mock_oauth.google.load_server_metadata = AsyncMock(return_value={"jwks_uri": "mock_uri"})
     mock_oauth.google.fetch_jwk_set = AsyncMock(return_value={"keys": []})
-    mock_collection.find_one.return_value = existing_user
+    mock_collection.documents.append(dict(existing_user, _id="existing_id"))
 
     user = await google_authorize_callback(token)
 
-    assert user == existing_user
-    mock_collection.find_one.assert_called_once_with({"email": user_info["email"]})
-    mock_collection.insert_one.assert_not_called()
+    assert {k: user[k] for k in existing_user} == existing_user
+    assert user["id"] == "existing_id"
+    assert user["token_type"] == "bearer"
+    assert len(mock_collection.documents) == 1
 
 
 @pytest.mark.asyncio
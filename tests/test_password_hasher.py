@@ -0,0 +1,132 @@
+"""
+Tests for the password hasher and the login service.
+"""
+
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from app.services.auth.login_service import authenticate_user
+from app.services.auth.password_hasher import PasswordHasher
+from app.services.repository.memory import InMemoryCollection
+from app.services.repository.repositories import UserRepository
+
+
+@pytest.fixture
+def hasher():
+    """A hasher with the minimum bcrypt cost so tests stay fast."""
+    hasher = PasswordHasher(rounds=4, workers=2, max_pending=4)
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify(hasher):
+    hashed = await hasher.hash("secret")
+
+    assert hashed.startswith("$2b$04$")
+    assert await hasher.verify("secret", hashed) == (True, None)
+    assert await hasher.verify("wrong", hashed) == (False, None)
+
+    stats = hasher.stats()
+    assert stats["hashed"] == 1
+    assert stats["verified"] == 2
+    assert stats["verify_failures"] == 1
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 0
+    assert stats["avg_ms"] > 0
+
+
+@pytest.mark.asyncio
+async def test_verify_returns_new_hash_when_cost_changes(hasher):
+    old = PasswordHasher(rounds=5)
+    hashed = await old.hash("secret")
+    old.shutdown()
+
+    ok, new_hash = await hasher.verify("secret", hashed)
+
+    assert ok
+    assert new_hash.startswith("$2b$04$")
+    assert hasher.stats()["rehashed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hashing_does_not_block_the_event_loop(hasher):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.gather(*(hasher.hash("secret") for _ in range(4)))
+    task.cancel()
+
+    assert ticks > 4
+
+
+@pytest.mark.asyncio
+async def test_rejects_with_503_when_saturated():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+    release = threading.Event()
+    hasher.context.hash = lambda password: release.wait(5) and password
+
+    first = asyncio.create_task(hasher.hash("a"))
+    second = asyncio.create_task(hasher.hash("b"))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await hasher.hash("c")
+    release.set()
+    await asyncio.gather(first, second)
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"]
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_upgrades_outdated_hash(monkeypatch, hasher):
+    old = PasswordHasher(rounds=5)
+    users = InMemoryCollection([{"_id": 1, "email": "a@example.com", "hashed_password": await old.hash("secret")}])
+    old.shutdown()
+    monkeypatch.setattr("app.services.auth.login_service.user_repository", UserRepository(users))
+    monkeypatch.setattr("app.services.auth.login_service.password_hasher", hasher)
+
+    user = await authenticate_user("a@example.com", "secret")
+
+    assert user.email == "a@example.com"
+    assert user.hashed_password is None
+    assert users.documents[0]["hashed_password"].startswith("$2b$04$")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("email, password", [("a@example.com", "wrong"), ("b@example.com", "secret")])
+async def test_authenticate_user_rejects_bad_credentials(monkeypatch, hasher, email, password):
+    users = InMemoryCollection([{"email": "a@example.com", "hashed_password": await hasher.hash("secret")}])
+    monkeypatch.setattr("app.services.auth.login_service.user_repository", UserRepository(users))
+    monkeypatch.setattr("app.services.auth.login_service.password_hasher", hasher)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await authenticate_user(email, password)
+
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_authenticate_user_unknown_email_still_runs_bcrypt(monkeypatch, hasher):
+    users = InMemoryCollection([])
+    monkeypatch.setattr("app.services.auth.login_service.user_repository", UserRepository(users))
+    monkeypatch.setattr("app.services.auth.login_service.password_hasher", hasher)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc_info:
+            await authenticate_user("nobody@example.com", "secret")
+        assert exc_info.value.status_code == 401
+
+    assert hasher.stats()["verified"] == 2
+    assert hasher.stats()["verify_failures"] == 2
+    assert hasher.stats()["hashed"] == 0
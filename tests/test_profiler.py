@@ -0,0 +1,115 @@
+"""
+Tests for the on-demand request profiler.
+"""
+
+import asyncio
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.observability import profiler as profiler_module
+from app.services.observability.profiler import Profiler, ProfilingMiddleware, propagate, sign, verify
+
+SECRET = "test-secret"
+
+
+def busy_loop_work(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def busy_worker_work(seconds):
+    busy_loop_work(seconds)
+
+
+def _probe(profiler, **kwargs):
+    probe = FastAPI()
+    probe.add_middleware(ProfilingMiddleware, profiler=profiler, **kwargs)
+
+    @probe.get("/slow")
+    async def slow():
+        busy_loop_work(0.1)
+        await asyncio.get_running_loop().run_in_executor(None, propagate(busy_worker_work, 0.1))
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    return probe
+
+
+def test_tokens_are_bound_to_subject_and_expiry():
+    token = sign("request:/slow", secret=SECRET)
+
+    assert verify(token, "request:/slow", secret=SECRET)
+    assert not verify(token, "request:/other", secret=SECRET)
+    assert not verify(token, "request:/slow", secret="other")
+    assert not verify(token, "request:/slow", secret="")
+    assert not verify(sign("request:/slow", ttl_seconds=-1, secret=SECRET), "request:/slow", secret=SECRET)
+    assert not verify("garbage", "request:/slow", secret=SECRET)
+
+
+def test_signed_request_is_profiled_with_loop_and_worker_stacks(tmp_path):
+    profiler = Profiler(directory=tmp_path, interval_ms=1)
+    client = TestClient(_probe(profiler, secret=SECRET))
+
+    response = client.get("/slow", headers={"X-Profile": sign("request:/slow", secret=SECRET)})
+
+    profile_id = response.headers["x-profile-id"]
+    stacks = (tmp_path / f"{profile_id}.collapsed").read_text().splitlines()
+    loop_stacks = [s for s in stacks if s.startswith("event-loop;")]
+    assert any("busy_loop_work" in s for s in loop_stacks)
+    assert any("busy_worker_work" in s and not s.startswith("event-loop;") for s in stacks)
+    assert any(s.startswith("(awaiting) ") for s in stacks)
+    assert all(s.rsplit(" ", 1)[1].isdigit() for s in stacks)
+    summary = profiler.list()[0]
+    assert summary["id"] == profile_id
+    assert summary["route"] == "/slow"
+    assert summary["status"] == 200
+    assert summary["reason"] == "header"
+    assert profiler.stats()["active"] == 0
+
+
+def test_unsigned_or_forged_requests_are_not_profiled(tmp_path):
+    profiler = Profiler(directory=tmp_path, interval_ms=1)
+    client = TestClient(_probe(profiler, secret=SECRET))
+
+    plain = client.get("/slow")
+    forged = client.get("/slow", headers={"X-Profile": sign("request:/slow", secret="guess")})
+
+    assert "x-profile-id" not in plain.headers
+    assert "x-profile-id" not in forged.headers
+    assert profiler.list() == []
+
+
+def test_sampling_rate_and_rotation(tmp_path):
+    profiler = Profiler(directory=tmp_path, interval_ms=5, max_files=2)
+    client = TestClient(_probe(profiler, sample_rate=1.0))
+
+    ids = [client.get("/slow").headers["x-profile-id"] for _ in range(3)]
+
+    stored = {p["id"] for p in profiler.list()}
+    assert len(stored) == 2
+    assert len(list(tmp_path.glob("*.collapsed"))) == 2
+    assert stored <= set(ids)
+    assert all(p["reason"] == "sampled" for p in profiler.list())
+
+
+def test_admin_endpoints_require_an_admin_token(tmp_path, monkeypatch):
+    store = Profiler(directory=tmp_path, interval_ms=1)
+    monkeypatch.setattr(profiler_module, "PROFILE_SECRET", SECRET)
+    monkeypatch.setattr("app.routers.admin.profiler", store)
+    profile_id = TestClient(_probe(store, sample_rate=1.0)).get("/slow").headers["x-profile-id"]
+    client = TestClient(app)
+    admin = {"X-Profile-Token": sign("admin", secret=SECRET)}
+
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get("/admin/profiles", headers={"X-Profile-Token": sign("request:/admin/profiles", secret=SECRET)}).status_code == 403
+    listing = client.get("/admin/profiles", headers=admin)
+    download = client.get(f"/admin/profiles/{profile_id}", headers=admin)
+    missing = client.get("/admin/profiles/..%2Fsecrets", headers=admin)
+
+    assert listing.status_code == 200
+    assert [p["id"] for p in listing.json()["profiles"]] == [profile_id]
+    assert download.status_code == 200
+    assert "busy_loop_work" in download.text
+    assert missing.status_code == 404
@@ -0,0 +1,120 @@
+"""
+Tests for the prompt registry.
+"""
+
+import json
+import os
+import threading
+from app.services.prompts.prompt_registry import PromptRegistry, RESPONSE_FORMAT_SUFFIX
+
+
+def _write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _registry(tmp_path):
+    templates = tmp_path / "system_messages"
+    schemas = tmp_path / "json_schemas"
+    templates.mkdir()
+    schemas.mkdir()
+    _write(schemas / "thing.json", json.dumps({"a": 1, "b": {"c": 2}}))
+    _write(templates / "thing_prompt.txt", "SYSTEM\n{{TOON:thing.json}}\nPROMPT:\nDescribe it.")
+    return PromptRegistry(str(templates), str(schemas)), templates, schemas
+
+
+def test_compile_splits_and_inlines_toon(tmp_path):
+    """The template is split on PROMPT: and placeholders are replaced by TOON."""
+    registry, _, _ = _registry(tmp_path)
+
+    compiled = registry.get("thing")
+
+    assert compiled.system_message == "SYSTEM\na=1\nb.c=2"
+    assert compiled.prompt == "Describe it." + RESPONSE_FORMAT_SUFFIX
+    assert compiled.size["total_chars"] == len(compiled.system_message) + len(compiled.prompt)
+    # Served from memory afterwards
+    assert registry.get("thing") is compiled
+
+
+def test_legacy_encoding_keeps_nested_json(tmp_path):
+    templates = tmp_path / "system_messages"
+    schemas = tmp_path / "json_schemas"
+    templates.mkdir()
+    schemas.mkdir()
+    _write(schemas / "thing.json", json.dumps({"a": 1, "b": {"c": 2}}))
+    _write(templates / "thing_prompt.txt", "{{TOON:thing.json}}")
+    legacy = PromptRegistry(str(templates), str(schemas), toon_encoding="legacy").get("thing")
+    schema = PromptRegistry(str(templates), str(schemas)).get("thing")
+
+    assert legacy.system_message == 'a=1|b={"c":2}'
+    assert legacy.version != schema.version
+
+
+def test_missing_schema_is_replaced_with_empty_string(tmp_path):
+    registry, templates, _ = _registry(tmp_path)
+    _write(templates / "other_prompt.txt", "X {{TOON:missing.json}} Y")
+
+    compiled = registry.get("other")
+
+    assert compiled.system_message == "X  Y"
+
+
+def test_refresh_recompiles_only_on_content_change(tmp_path):
+    """A touch alone keeps the version; an edit to a referenced schema bumps it."""
+    registry, _, schemas = _registry(tmp_path)
+    first = registry.get("thing")
+    schema_path = schemas / "thing.json"
+
+    st = os.stat(schema_path)
+    os.utime(schema_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert registry.refresh() == []
+    assert registry.get("thing").version == first.version
+
+    _write(schema_path, json.dumps({"a": 2}))
+    os.utime(schema_path, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000))
+    assert registry.refresh() == ["thing"]
+    assert registry.get("thing").system_message == "SYSTEM\na=2"
+    assert registry.get("thing").version != first.version
+
+
+def test_compile_all_finds_templates(tmp_path):
+    registry, _, _ = _registry(tmp_path)
+
+    names = [c.name for c in registry.compile_all()]
+
+    assert names == ["thing"]
+
+
+def test_watcher_runs_hooks_after_each_pass(tmp_path):
+    registry, _, _ = _registry(tmp_path)
+    registry.get("thing")
+    calls = threading.Event()
+
+    registry.start_watcher(interval=0.01, hooks=(calls.set,))
+    try:
+        assert calls.wait(2)
+    finally:
+        registry.stop_watcher()
+
+
+def test_schema_encoding_can_use_absolute_keys(tmp_path):
+    registry, templates, schemas = _registry(tmp_path)
+    _write(schemas / "thing.json", json.dumps({"a": {"b": 1, "c": 2}}))
+
+    relative = PromptRegistry(str(templates), str(schemas), toon_relative=True).get("thing")
+    absolute = PromptRegistry(str(templates), str(schemas), toon_relative=False).get("thing")
+
+    assert relative.system_message == "SYSTEM\na.b=1\n.c=2"
+    assert absolute.system_message == "SYSTEM\na.b=1\na.c=2"
+    assert relative.version != absolute.version
+
+
+def test_character_template_explains_the_notation_it_uses():
+    registry = PromptRegistry(toon_relative=True)
+
+    compiled = registry.compile("character")
+
+    assert "How to read the TOON below" in compiled.system_message
+    assert "\n." in compiled.system_message
+    assert "general.age_estimate_years=30" in compiled.prompt
+    assert 'general={"' not in compiled.prompt
@@ -0,0 +1,89 @@
+"""
+Tests for the async repositories and their in-memory stand-in.
+"""
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+from app.models.character_schema import CharacterCreate, PersonMetadata
+from app.services.character import character_crud
+from app.services.repository.indexes import unique_keys
+from app.services.repository.memory import InMemoryCollection
+from app.services.repository.repositories import CharacterRepository, UserRepository
+
+
+@pytest.mark.asyncio
+async def test_user_repository_round_trip():
+    users = UserRepository(InMemoryCollection())
+
+    user_id = await users.insert({"email": "a@example.com"})
+
+    found = await users.find_by_email("a@example.com")
+    assert str(found["_id"]) == user_id
+    assert await users.find_by_email("b@example.com") is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error, status", [
+    (ServerSelectionTimeoutError("no servers"), 503),
+    (OperationFailure("bad"), 500),
+])
+async def test_errors_are_mapped_consistently(error, status):
+    users = UserRepository(InMemoryCollection(fail_with=error))
+    characters = CharacterRepository(InMemoryCollection(fail_with=error))
+
+    for call in (users.find_by_email("a@example.com"), users.insert({}), characters.insert({})):
+        with pytest.raises(HTTPException) as exc_info:
+            await call
+        assert exc_info.value.status_code == status
+
+
+@pytest.mark.asyncio
+async def test_duplicate_key_maps_to_conflict():
+    users = UserRepository(InMemoryCollection(unique=["email"]))
+    await users.insert({"email": "a@example.com"})
+
+    with pytest.raises(HTTPException) as exc_info:
+        await users.insert({"email": "a@example.com"})
+
+    assert exc_info.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_conflict_on_oauth_identity_is_raised():
+    users = UserRepository(InMemoryCollection(unique=unique_keys("users")))
+    await users.insert({"email": "a@example.com", "oauth_provider": "google", "oauth_id": "g1"})
+
+    assert (await users.get_or_create("a@example.com", {"oauth_provider": "google", "oauth_id": "g1"}))["email"] == "a@example.com"
+    with pytest.raises(HTTPException) as exc_info:
+        await users.get_or_create("b@example.com", {"oauth_provider": "google", "oauth_id": "g1"})
+
+    assert exc_info.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_create_characters_inserts_in_order(monkeypatch):
+    collection = InMemoryCollection()
+    monkeypatch.setattr(character_crud, "character_repository", CharacterRepository(collection))
+    people = [PersonMetadata(name="Ana", declared_age=30, role="adult"), PersonMetadata(name="Bo", declared_age=3, role="child")]
+
+    inserted = await character_crud.create_characters([CharacterCreate(meta={"i": 0}), CharacterCreate(meta={"i": 1})], people)
+    single = await character_crud.create_character(CharacterCreate(meta={"i": 2}))
+
+    assert [d["person"]["name"] for d in inserted] == ["Ana", "Bo"]
+    assert [d["_id"] for d in inserted + [single]] == [str(d["_id"]) for d in collection.documents]
+    assert await character_crud.create_characters([]) == []
+
+
+@pytest.mark.asyncio
+async def test_book_characters_are_upserted_once_per_photo(monkeypatch):
+    collection = InMemoryCollection(unique=unique_keys("characters"))
+    monkeypatch.setattr(character_crud, "character_repository", CharacterRepository(collection))
+    characters = [CharacterCreate(meta={"i": 0}), CharacterCreate(meta={"i": 1})]
+
+    first = await character_crud.create_characters(characters, image_hashes=["h0", "h1"], book_id="b")
+    again = await character_crud.create_characters(characters, image_hashes=["h0", "h1"], book_id="b")
+
+    assert [d["_id"] for d in again] == [d["_id"] for d in first]
+    assert len(collection.documents) == 2
+    assert {d["book_id"] for d in collection.documents} == {"b"}
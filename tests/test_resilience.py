@@ -0,0 +1,200 @@
+"""
+Tests for provider retries, hedging and the circuit breaker.
+"""
+
+import asyncio
+import pytest
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+from app.services.gemini import resilience
+from app.services.gemini.resilience import CircuitBreaker, ResilientCaller, backoff_delay, is_retryable
+
+
+@pytest.fixture(autouse=True)
+def _fast_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0.001)
+
+
+def _flaky(failures, exc=google_exceptions.ServiceUnavailable("busy"), result="ok"):
+    calls = []
+
+    async def fn(remaining):
+        calls.append(remaining)
+        if len(calls) <= failures:
+            raise exc
+        return result
+
+    return fn, calls
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors():
+    caller = ResilientCaller("t", CircuitBreaker(failure_threshold=10), max_attempts=3)
+    fn, calls = _flaky(2)
+
+    assert await caller.call(fn, deadline=5) == "ok"
+
+    assert len(calls) == 3
+    stats = caller.stats()
+    assert stats["retries"] == 2
+    assert stats["successes"] == 1
+    assert caller.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_gives_up_with_503_after_max_attempts():
+    caller = ResilientCaller("t", CircuitBreaker(failure_threshold=10), max_attempts=2)
+    fn, calls = _flaky(5)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await caller.call(fn, deadline=5)
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"]
+    assert len(calls) == 2
+    assert caller.stats()["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_are_raised_once():
+    caller = ResilientCaller("t", CircuitBreaker(), max_attempts=3)
+    fn, calls = _flaky(1, exc=google_exceptions.InvalidArgument("bad image"))
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        await caller.call(fn, deadline=5)
+
+    assert len(calls) == 1
+    assert caller.breaker.stats()["consecutive_failures"] == 0
+
+
+@pytest.mark.asyncio
+async def test_no_retry_when_backoff_would_pass_the_deadline(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 10)
+    caller = ResilientCaller("t", CircuitBreaker(failure_threshold=10), max_attempts=3)
+    fn, calls = _flaky(1)
+
+    with pytest.raises(HTTPException):
+        await caller.call(fn, deadline=1)
+
+    assert len(calls) == 1
+    assert caller.stats()["deadline_exhausted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_fails_fast_and_recovers_through_a_probe(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    caller = ResilientCaller("t", breaker, max_attempts=1)
+    failing, _ = _flaky(10)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await caller.call(failing, deadline=5)
+    assert breaker.state == "open"
+
+    healthy, calls = _flaky(0)
+    with pytest.raises(HTTPException) as exc_info:
+        await caller.call(healthy, deadline=5)
+    assert exc_info.value.status_code == 503
+    assert not calls
+
+    breaker._opened_at -= 31
+    assert await caller.call(healthy, deadline=5) == "ok"
+    assert breaker.state == "closed"
+    assert breaker.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_attempt_timeouts_are_retried_and_trip_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    caller = ResilientCaller("t", breaker, max_attempts=3, attempt_timeout=0.01)
+    calls = []
+
+    async def hang(remaining):
+        calls.append(remaining)
+        await asyncio.sleep(1)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await caller.call(hang, deadline=5)
+
+    assert exc_info.value.status_code == 503
+    assert len(calls) == 2
+    assert all(r <= 0.01 for r in calls)
+    assert caller.stats()["timeouts"] == 2
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_deadline_timeout_raises_504_and_counts_as_a_failure():
+    breaker = CircuitBreaker(failure_threshold=10)
+    caller = ResilientCaller("t", breaker, max_attempts=3)
+
+    async def hang(remaining):
+        await asyncio.sleep(1)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await caller.call(hang, deadline=0.01)
+
+    assert exc_info.value.status_code == 504
+    assert breaker.stats()["consecutive_failures"] == 1
+
+
+def test_half_open_admits_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+
+    breaker.check()
+    with pytest.raises(HTTPException):
+        breaker.check()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_the_slow_tail():
+    caller = ResilientCaller("t", CircuitBreaker(), hedge=True, hedge_min_samples=3, hedge_min_delay=0.01)
+    for _ in range(3):
+        caller.latencies.add(0.01)
+    delays = [1.0, 0.0]
+    cancelled = []
+
+    async def fn(remaining):
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return f"after {delay}"
+
+    assert await caller.call(fn, deadline=5) == "after 0.0"
+
+    await asyncio.sleep(0)
+    assert cancelled == [1.0]
+    stats = caller.stats()
+    assert stats["hedges_sent"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_a_free_slot_or_enough_samples():
+    caller = ResilientCaller("t", CircuitBreaker(), hedge=True, hedge_min_samples=3, hedge_min_delay=0.01)
+
+    async def fn(remaining):
+        await asyncio.sleep(0.03)
+        return "ok"
+
+    assert await caller.call(fn, deadline=5) == "ok"
+    for _ in range(3):
+        caller.latencies.add(0.01)
+    assert await caller.call(fn, deadline=5, can_hedge=lambda: False) == "ok"
+
+    assert caller.stats()["hedges_sent"] == 0
+
+
+def test_retryable_classification_and_backoff_bounds():
+    assert is_retryable(google_exceptions.ResourceExhausted("quota"))
+    assert is_retryable(HTTPException(status_code=503))
+    assert not is_retryable(HTTPException(status_code=500))
+    assert not is_retryable(ValueError("parse"))
+    assert all(0 <= backoff_delay(a, base=0.5, cap=2) <= 2 for a in range(1, 10))
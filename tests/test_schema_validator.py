@@ -0,0 +1,159 @@
+"""
+Tests for validating model output against the character schema.
+"""
+
+import json
+import os
+import pytest
+from fastapi import HTTPException
+from jsonschema import validate
+from app.services.character.character_service import parse_character_response
+from app.services.character.schema_validator import CharacterValidator, ValidatorRegistry
+
+with open("app/json_schemas/character.json", "r", encoding="utf-8") as f:
+    character_schema = json.load(f)
+
+
+@pytest.fixture
+def validator():
+    return CharacterValidator(character_schema)
+
+
+def test_valid_description_is_unchanged(validator):
+    description = {"meta": {"confidence_overall": 0.9}, "hair": {"length": "short", "dominant_color_hex": "#aabbcc"}}
+
+    cleaned, report = validator.validate(description)
+
+    assert cleaned == description
+    assert report.valid and not report.coerced and not report.stripped
+
+
+def test_invalid_values_are_coerced(validator):
+    description = {
+        "meta": {"confidence_overall": "1.4"},
+        "general": {"body_type": "Athletic", "age_estimate_years": "n/a"},
+        "hair": {"length": "shoulder_length", "dominant_color_hex": "ABC"},
+    }
+
+    cleaned, report = validator.validate(description)
+
+    validate(instance=cleaned, schema=character_schema)
+    assert cleaned["meta"]["confidence_overall"] == 1
+    assert cleaned["general"] == {"body_type": "athletic", "age_estimate_years": None}
+    assert cleaned["hair"] == {"length": "shoulder-length", "dominant_color_hex": "#aabbcc"}
+    assert not report.valid and not report.stripped
+    assert description["meta"]["confidence_overall"] == "1.4"
+
+
+def test_unrepairable_values_are_stripped(validator):
+    description = {
+        "meta": {},
+        "general": {"view": "sideways"},
+        "hair": {"secondary_color_hex": "red"},
+        "head": "oval",
+        "annotations": [{"confidence": 0.5}, {"confidence": "high"}],
+    }
+
+    cleaned, report = validator.validate(description)
+
+    validate(instance=cleaned, schema=character_schema)
+    assert cleaned["meta"] == {"confidence_overall": 0}
+    assert cleaned["general"] == {}
+    assert cleaned["hair"] == {"secondary_color_hex": None}
+    assert "head" not in cleaned
+    assert cleaned["annotations"] == [{"confidence": 0.5}, {}]
+    assert set(report.stripped) == {"general.view", "hair.secondary_color_hex", "head", "annotations.1.confidence"}
+
+
+def test_output_without_character_sections_is_rejected(validator):
+    with pytest.raises(HTTPException) as exc:
+        validator.validate({"unrelated": 1})
+    assert exc.value.status_code == 500
+
+    with pytest.raises(HTTPException):
+        validator.validate(["not", "an", "object"])
+
+
+def test_validate_section(validator):
+    value, report = validator.validate_section("hair", {"length": "Short"})
+    assert value == {"length": "short"}
+    assert report.coerced == ["hair.length"]
+
+    value, _ = validator.validate_section("head", "oval")
+    assert value is None
+
+    value, _ = validator.validate_section("unknown", {})
+    assert value is None
+
+
+def test_metrics(validator):
+    validator.validate({"meta": {"confidence_overall": 0.5}})
+    validator.validate({"meta": {"confidence_overall": 2}})
+
+    assert validator.stats["validations"] == 2
+    assert validator.stats["invalid"] == 1
+    assert validator.stats["coerced"] == 1
+    assert validator.stats["total_ms"] >= validator.stats["max_ms"] > 0
+
+
+def test_registry_compiles_once_per_schema_version(tmp_path):
+    schema_path = tmp_path / "character.json"
+    schema_path.write_text(json.dumps(character_schema))
+    registry = ValidatorRegistry(str(schema_path))
+
+    first = registry.load()
+    assert registry.load() is first
+    assert registry.get() is first
+
+    changed = dict(character_schema, title="changed")
+    schema_path.write_text(json.dumps(changed))
+    second = registry.load()
+    assert second is not first and second.version != first.version
+
+    assert registry.stats()["version"] == second.version
+
+
+def test_refresh_reloads_only_when_the_schema_file_changes(tmp_path):
+    schema_path = tmp_path / "character.json"
+    schema_path.write_text(json.dumps(character_schema))
+    registry = ValidatorRegistry(str(schema_path))
+    first = registry.load()
+
+    assert registry.refresh() is False
+
+    schema_path.write_text(json.dumps(dict(character_schema, title="changed")))
+    os.utime(schema_path, ns=(0, 1))
+
+    assert registry.refresh() is True
+    assert registry.get() is not first
+
+
+def test_current_schema_is_archived():
+    """Stored characters record their schema version; every version must stay readable."""
+    registry = ValidatorRegistry(archive_dir=str(os.path.join("app", "json_schemas", "archive")))
+    version = registry.load().version
+
+    assert os.path.exists(registry.archive_path(version)), (
+        f"copy app/json_schemas/character.json to {registry.archive_path(version)}"
+    )
+    assert ValidatorRegistry(archive_dir=registry.archive_dir).schema(version) == character_schema
+
+
+def test_parse_character_response_validates_toon():
+    text = 'meta: {"confidence_overall": "0.7"}\nhair: {"length": "Short"}\n'
+
+    assert parse_character_response(text) == {"meta": {"confidence_overall": 0.7}, "hair": {"length": "short"}}
+
+
+def test_validation_counters_are_reported_by_healthz():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.character.schema_validator import validate_character
+
+    before = TestClient(app).get("/healthz").json()["character_validation"]
+    validate_character({"meta": {"confidence_overall": "1.4"}})
+    after = TestClient(app).get("/healthz").json()["character_validation"]
+
+    assert after["version"] == before["version"]
+    assert after["validations"] == before["validations"] + 1
+    assert after["coerced"] > before["coerced"]
@@ -4,87 +4,116 @@ Tests for the signup service.
 
 import pytest
 from fastapi import HTTPException
-from app.models.user_schema import User
+from app.models.user_schema import SignupRequest
+from pymongo.errors import AutoReconnect
 from app.services.auth.signup_service import create_user
-from unittest.mock import MagicMock
+from app.services.repository.indexes import unique_keys
+from app.services.repository.memory import InMemoryCollection
+from app.services.repository.repositories import UserRepository
 
 
 @pytest.fixture
-def mock_collection():
-    """Return a fresh MagicMock for the MongoDB collection per test."""
-    return MagicMock()
+def users():
+    """Return a fresh in-memory users collection with the declared unique indexes."""
+    return InMemoryCollection(unique=unique_keys("users"))
+
+
+@pytest.fixture(autouse=True)
+def _repository(monkeypatch, users):
+    # Patch the symbol where it's used (inside signup_service), not the source module
+    monkeypatch.setattr(
+        "app.services.auth.signup_service.user_repository",
+        UserRepository(users),
+        raising=True,
+    )
+
 
 @pytest.fixture
 def mock_user():
-    """Return a sample User model instance for tests.
+    """Return a sample signup payload for tests.
 
-    The fixture provides a pre-filled `User` instance suitable for unit tests
+    The fixture provides a pre-filled `SignupRequest` suitable for unit tests
     that exercise signup and storage behaviour.
     """
-    return User(
-        id="12345",
+    return SignupRequest(
         email="test@example.com",
         hashed_password="plaintextpassword",
-        oauth_provider="google",
-        oauth_id="google_id",
         full_name="Test User"
     )
 
-def test_create_user_success(mock_user, monkeypatch, mock_collection):
+@pytest.mark.asyncio
+async def test_create_user_success(mock_user, users):
     """
     Test successful user creation.
     """
-    # Patch the symbol where it's used (inside signup_service), not the source module
-    monkeypatch.setattr(
-        "app.services.auth.signup_service.users_collection",
-        mock_collection,
-        raising=True,
-    )
-    mock_collection.find_one.return_value = None
-    mock_collection.insert_one.return_value.inserted_id = "12345"
+    user = await create_user(mock_user)
+
+    assert user.id == str(users.documents[0]["_id"])
+    assert users.documents[0]["email"] == mock_user.email
+    assert users.documents[0]["hashed_password"] != "plaintextpassword"
+    assert "id" not in users.documents[0]
+
+
+def test_signup_cannot_claim_an_oauth_identity_or_id():
+    signup = SignupRequest(email="a@example.com", id="x", oauth_provider="google", oauth_id="victim")
+
+    assert set(signup.model_dump()) == {"email", "hashed_password", "full_name"}
+
+
+@pytest.mark.asyncio
+async def test_create_user_removes_the_account_when_hashing_fails(mock_user, users, monkeypatch):
+    async def _hash(password):
+        raise HTTPException(status_code=503, detail="busy")
 
-    user = create_user(mock_user)
+    monkeypatch.setattr("app.services.auth.signup_service.password_hasher.hash", _hash)
 
-    assert user.id == "12345"
-    # Ensure the mock is correctly called
-    mock_collection.find_one.assert_called_once_with({"email": mock_user.email})
-    mock_collection.insert_one.assert_called_once()
+    with pytest.raises(HTTPException) as exc_info:
+        await create_user(mock_user)
+
+    assert exc_info.value.status_code == 503
+    assert users.documents == []
 
-def test_create_user_email_already_registered(mock_user, monkeypatch, mock_collection):
+@pytest.mark.asyncio
+async def test_create_user_email_already_registered(mock_user, users):
     """
     Test user creation with an already registered email.
     """
-    # Patch the symbol where it's used (inside signup_service)
-    monkeypatch.setattr(
-        "app.services.auth.signup_service.users_collection",
-        mock_collection,
-        raising=True,
-    )
-    mock_collection.find_one.return_value = {"email": mock_user.email}
+    users.documents.append({"email": mock_user.email})
 
     with pytest.raises(HTTPException) as exc_info:
-        create_user(mock_user)
+        await create_user(mock_user)
 
     assert exc_info.value.status_code == 400
     assert exc_info.value.detail == "Email already registered"
-    # Ensure the mock is correctly called
-    mock_collection.find_one.assert_called_once_with({"email": mock_user.email})
+    assert len(users.documents) == 1
 
 
-def test_create_user_db_insert_failure(mock_user, monkeypatch, mock_collection):
-    """If the database insert fails, the exception should propagate."""
-    monkeypatch.setattr(
-        "app.services.auth.signup_service.users_collection",
-        mock_collection,
-        raising=True,
-    )
-    mock_collection.find_one.return_value = None
-    mock_collection.insert_one.side_effect = Exception("DB insert failed")
+@pytest.mark.asyncio
+async def test_create_user_taken_email_skips_hashing(mock_user, users, monkeypatch):
+    """A repeat signup is rejected before any bcrypt work is queued."""
+    users.documents.append({"email": mock_user.email})
+
+    async def _hash(password):
+        raise AssertionError("hash should not run for a taken email")
 
-    with pytest.raises(Exception) as exc_info:
-        create_user(mock_user)
+    monkeypatch.setattr("app.services.auth.signup_service.password_hasher.hash", _hash)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await create_user(mock_user)
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_user_db_insert_failure(mock_user, users):
+    """If the database insert fails, the error is mapped to an HTTP error."""
+    users.fail_with = AutoReconnect("DB insert failed")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await create_user(mock_user)
 
-    assert "DB insert failed" in str(exc_info.value)
+    assert exc_info.value.status_code == 503
+    assert "DB insert failed" in exc_info.value.detail
 
 
 def test_signup_integration_run_app_and_signup():
@@ -0,0 +1,177 @@
+"""
+Tests for access tokens and the cached Google key material.
+"""
+
+import time
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from authlib.integrations.starlette_client import OAuth
+from app.routers import auth as auth_router
+from app.services.auth.oauth import CachedOpenIDApp
+from app.services.auth.tokens import TokenService, _b64encode, _dumps
+
+
+def test_issue_and_verify_round_trip():
+    service = TokenService(secret="s3cret", ttl_seconds=60)
+
+    claims = service.verify(service.issue("u1", "a@example.com", name="A"))
+
+    assert claims["sub"] == "u1"
+    assert claims["email"] == "a@example.com"
+    assert claims["name"] == "A"
+    assert claims["exp"] - claims["iat"] == 60
+
+
+@pytest.mark.parametrize("mangle", [
+    lambda t: t[:-2] + ("AA" if not t.endswith("AA") else "BB"),
+    lambda t: t.replace(t.split(".")[0], _b64encode(_dumps({"alg": "none", "typ": "JWT"}))),
+    lambda t: t.split(".")[0] + "." + _b64encode(_dumps({"sub": "admin", "email": "x", "iss": "kid_book_generator", "exp": 2**40})) + "." + t.split(".")[2],
+    lambda t: "not-a-token",
+    lambda t: t[:-1] + "\u00e9",
+    lambda t: "\u00e9" + t,
+])
+def test_verify_rejects_tampered_tokens(mangle):
+    service = TokenService(secret="s3cret")
+
+    with pytest.raises(HTTPException) as exc_info:
+        service.verify(mangle(service.issue("u1", "a@example.com")))
+
+    assert exc_info.value.status_code == 401
+
+
+def test_verify_rejects_expired_and_foreign_tokens():
+    expired = TokenService(secret="s3cret", ttl_seconds=-120, leeway_seconds=0).issue("u1", "a@example.com")
+    foreign = TokenService(secret="other").issue("u1", "a@example.com")
+    service = TokenService(secret="s3cret")
+
+    for token in (expired, foreign):
+        with pytest.raises(HTTPException) as exc_info:
+            service.verify(token)
+        assert exc_info.value.status_code == 401
+
+
+def test_previous_secret_still_verifies_after_rotation():
+    old_token = TokenService(secret="old").issue("u1", "a@example.com")
+
+    rotated = TokenService(secret="new", previous_secrets=["old"])
+
+    assert rotated.verify(old_token)["sub"] == "u1"
+
+
+def test_session_drops_password_hash():
+    service = TokenService(secret="s3cret")
+
+    body = service.session({"id": "u1", "email": "a@example.com", "hashed_password": "$2b$..."})
+
+    assert "hashed_password" not in body
+    assert body["token_type"] == "bearer"
+    assert service.verify(body["access_token"])["sub"] == "u1"
+
+
+def test_me_endpoint_verifies_without_database(monkeypatch):
+    service = TokenService(secret="s3cret")
+    monkeypatch.setattr("app.services.auth.tokens.token_service", service)
+    app = FastAPI()
+    app.include_router(auth_router.router, prefix="/auth")
+    client = TestClient(app)
+
+    ok = client.get("/auth/me", headers={"Authorization": f"Bearer {service.issue('u1', 'a@example.com')}"})
+    missing = client.get("/auth/me")
+    bad = client.get("/auth/me", headers={"Authorization": "Bearer nope"})
+
+    assert ok.status_code == 200
+    assert ok.json()["id"] == "u1"
+    assert missing.status_code == 401
+    assert bad.status_code == 401
+
+
+def test_auth_routes_are_mounted_on_the_app():
+    from app.main import app
+
+    assert TestClient(app).get("/auth/me").status_code == 401
+
+
+class _Response:
+    def __init__(self, body):
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return dict(self._body)
+
+
+class _Session:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append(url)
+        if url.endswith("openid-configuration"):
+            return _Response({"issuer": "https://accounts.example", "jwks_uri": "https://example/jwks"})
+        return _Response({"keys": [{"kid": str(len(self.calls))}]})
+
+
+@pytest.fixture
+def google(monkeypatch):
+    registry = OAuth()
+    registry.register(
+        name="google", client_id="x", client_secret="y",
+        client_cls=CachedOpenIDApp,
+        server_metadata_url="https://example/.well-known/openid-configuration",
+    )
+    client = registry.create_client("google")
+    calls = []
+    monkeypatch.setattr(client, "_get_session", lambda: _Session(calls))
+    return client, calls
+
+
+@pytest.mark.asyncio
+async def test_discovery_and_jwks_are_cached(google):
+    client, calls = google
+
+    first = await client.fetch_jwk_set()
+    second = await client.fetch_jwk_set()
+    await client.load_server_metadata()
+
+    assert first == second
+    assert len(calls) == 2
+    assert client.cache_stats["discovery_fetches"] == 1
+    assert client.cache_stats["jwks_fetches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_entries_expire(google):
+    client, calls = google
+    await client.fetch_jwk_set()
+
+    client.server_metadata["_loaded_at"] -= client.discovery_ttl + 1
+    client.server_metadata["_jwks_loaded_at"] -= client.jwks_ttl + 1
+    await client.fetch_jwk_set()
+
+    assert client.cache_stats["discovery_fetches"] == 2
+    assert client.cache_stats["jwks_fetches"] == 2
+
+
+@pytest.mark.asyncio
+async def test_key_miss_refresh_is_rate_limited(google):
+    client, calls = google
+    await client.fetch_jwk_set()
+
+    await client.fetch_jwk_set(force=True)
+    assert client.cache_stats["key_miss_throttled"] == 1
+
+    client.server_metadata["_jwks_loaded_at"] = time.time() - client.min_refresh_interval - 1
+    refreshed = await client.fetch_jwk_set(force=True)
+
+    assert client.cache_stats["key_miss_refreshes"] == 1
+    assert refreshed == client.server_metadata["jwks"]
+    assert len(calls) == 3
@@ -0,0 +1,234 @@
+"""
+Tests for the TOON service and the streaming character parser.
+"""
+
+import pytest
+from fastapi import HTTPException
+import json
+from app.services.toon.toon_service import (
+    TOON_VERBOSITY_FULL,
+    TOON_VERBOSITY_MINIMAL,
+    ToonSectionAssembler,
+    ToonStreamParser,
+    encode_toon,
+    json_to_toon,
+    schema_to_toon,
+    toon_to_json,
+)
+from app.services.vision.provider import VisionProvider, set_vision_provider
+from app.services.vision.stub_provider import StubProvider, encode_response
+
+
+def test_round_trip_of_flat_mapping():
+    obj = {"a": 1, "b": {"c": [1, 2]}, "d": "text"}
+    assert toon_to_json(json_to_toon(obj)) == obj
+
+
+def test_encode_toon_writes_dotted_paths_and_bare_lists():
+    obj = {"general": {"view": "front", "type": ["string", "null"], "n": 3}, "top": "1"}
+
+    text = encode_toon(obj, relative=False)
+
+    assert text.splitlines() == [
+        "general.view=front",
+        "general.type=string,null",
+        "general.n=3",
+        'top="1"',
+    ]
+    assert toon_to_json(text) == obj
+
+
+def test_encode_toon_relative_keys():
+    obj = {"alpha": {"beta": {"c": 1, "d": 2}, "x": 3}}
+
+    assert encode_toon(obj) == "alpha.beta.c=1\n.d=2\n..x=3"
+    assert toon_to_json(encode_toon(obj, separator="|")) == obj
+
+
+@pytest.mark.parametrize("value", [
+    "", " padded", "a,b", "true", "null", "12", "1e3", "x|y", "line\nbreak", '"q"', "{", ["one"],
+    ["a", "b,c"], ["1", "2"], [], {}, {"a.b": 1}, {"": 1}, {".x": 1}, 1.5, None, False,
+])
+def test_encode_toon_round_trips_awkward_values(value):
+    obj = {"k": value, "after": {"z": 1}}
+    assert toon_to_json(encode_toon(obj)) == obj
+
+
+def test_schema_to_toon_round_trips_character_schema():
+    with open("app/json_schemas/character.json") as f:
+        schema = json.load(f)
+
+    assert toon_to_json(encode_toon(schema)) == schema
+    assert toon_to_json(schema_to_toon(schema, TOON_VERBOSITY_FULL)) == schema
+    assert len(schema_to_toon(schema)) < len(json.dumps(schema, separators=(",", ":")))
+
+
+def test_schema_to_toon_elides_annotations_but_not_properties():
+    schema = {
+        "title": "T",
+        "type": "object",
+        "properties": {
+            "description": {"type": "string", "description": "a field called description"},
+            "size": {"enum": ["s", "m"], "title": "Size"},
+        },
+    }
+
+    assert toon_to_json(schema_to_toon(schema, TOON_VERBOSITY_MINIMAL)) == {
+        "type": "object",
+        "properties": {"description": {"type": "string"}, "size": {"enum": ["s", "m"]}},
+    }
+    assert "..size.enum=s,m" in schema_to_toon(schema, TOON_VERBOSITY_MINIMAL)
+    assert "description=a field called description" in schema_to_toon(schema)
+
+
+def test_pipe_inside_nested_json_is_preserved():
+    """Nested compact JSON may contain pipes and newlines."""
+    text = 'meta={"note":"a|b"}|face={"notes":"line1\\nline2","x":[1,2]}|n=3'
+    assert toon_to_json(text) == {
+        "meta": {"note": "a|b"},
+        "face": {"notes": "line1\nline2", "x": [1, 2]},
+        "n": 3,
+    }
+
+
+def test_fences_and_keyless_lines_are_ignored():
+    text = "```toon\nHere you go\nmeta={\"confidence_overall\":0.9}\nannotations=[]\n```"
+    assert toon_to_json(text) == {"meta": {"confidence_overall": 0.9}, "annotations": []}
+
+
+def test_stream_emits_each_key_when_complete():
+    parser = ToonStreamParser()
+
+    assert parser.feed('meta={"confidence_overall":0.') == []
+    assert parser.feed('9}') == [("meta", {"confidence_overall": 0.9})]
+    assert parser.feed("|hair=") == []
+    assert parser.feed('{"length":"short"}|view=fr') == [("hair", {"length": "short"})]
+    assert parser.close() == [("view", "fr")]
+
+
+def test_stream_skips_preface_until_an_expected_key():
+    parser = ToonStreamParser(expected_keys={"meta", "hair"})
+
+    items = parser.feed("```toon\nNote: values are estimates\nmeta.confidence_overall=0.9\n.view=front\nmood: calm\n")
+
+    assert items == [("meta.confidence_overall", 0.9), ("meta.view", "front"), ("mood", "calm")]
+    assert parser.skipped == 2
+
+
+def test_chunking_does_not_change_the_result():
+    provider = StubProvider()
+    text = encode_response(provider.describe(b"image"))
+    expected = toon_to_json(text)
+
+    for size in (1, 3, 7, 64, len(text)):
+        parser = ToonStreamParser()
+        items = []
+        for i in range(0, len(text), size):
+            items += parser.feed(text[i:i + size])
+        items += parser.close()
+        assert dict(items) == expected
+
+
+class _ChunkProvider(VisionProvider):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.yielded = 0
+
+    async def generate(self, prompt, image, system_message=None, timeout=None):
+        return "".join(self.chunks)
+
+    async def generate_stream(self, prompt, image, system_message=None, timeout=None):
+        for chunk in self.chunks:
+            self.yielded += 1
+            yield chunk
+
+
+@pytest.fixture
+def chunk_provider():
+    def _install(chunks):
+        provider = _ChunkProvider(chunks)
+        set_vision_provider(provider)
+        return provider
+    yield _install
+    set_vision_provider(None)
+
+
+def _png():
+    with open("tests/assets/test_person.png", "rb") as f:
+        return f.read()
+
+
+@pytest.mark.asyncio
+async def test_stream_character_description_yields_sections(chunk_provider):
+    from app.services.character.character_service import stream_character_description
+
+    chunk_provider(['meta={"confidence_', 'overall":0.8}|head={"head_shape":"oval"}', "|annotations=[]"])
+
+    sections = [key async for key, _ in stream_character_description(_png())]
+
+    assert sections == ["meta", "head", "annotations"]
+
+
+def test_sections_are_regrouped_from_dotted_paths():
+    provider = StubProvider()
+    description = provider.describe(b"image")
+    text = encode_toon(description)
+    parser = ToonStreamParser()
+    sections = ToonSectionAssembler()
+
+    items = []
+    for i in range(0, len(text), 5):
+        items += sections.add(parser.feed(text[i:i + 5]))
+    items += sections.add(parser.close()) + sections.close()
+
+    assert [k for k, _ in items] == list(description)
+    assert dict(items) == description
+
+
+@pytest.mark.asyncio
+async def test_stream_character_description_accepts_path_encoded_output(chunk_provider):
+    from app.services.character.character_service import stream_character_description
+
+    description = StubProvider().describe(b"image")
+    text = encode_toon(description)
+    chunk_provider([text[i:i + 40] for i in range(0, len(text), 40)])
+
+    result = {key: value async for key, value in stream_character_description(_png())}
+
+    assert result == description
+
+
+@pytest.mark.asyncio
+async def test_stream_character_description_skips_a_preface(chunk_provider):
+    from app.services.character.character_service import stream_character_description
+
+    chunk_provider(["Sure! Here is the description:\n", "I think: this person", " is smiling\n", "meta={}", "|annotations=[]"])
+
+    sections = [key async for key, _ in stream_character_description(_png())]
+
+    assert sections == ["meta", "annotations"]
+
+
+@pytest.mark.asyncio
+async def test_stream_character_description_aborts_off_format_output(chunk_provider):
+    from app.services.character.character_service import stream_character_description
+
+    provider = chunk_provider(["I think: this person", " is smiling\n", "mood: happy\n", "age: 30\n", "height: tall\n", "meta={}", "|more=1"])
+
+    with pytest.raises(HTTPException) as exc_info:
+        async for _ in stream_character_description(_png()):
+            pass
+
+    assert exc_info.value.status_code == 502
+    assert provider.yielded < 6
+
+
+@pytest.mark.asyncio
+async def test_stream_character_description_handles_json_output(chunk_provider):
+    from app.services.character.character_service import stream_character_description
+
+    chunk_provider(["```json\n", '{"meta": {"confidence_overall": 1},', ' "annotations": []}', "\n```"])
+
+    result = {key: value async for key, value in stream_character_description(_png())}
+
+    assert result == {"meta": {"confidence_overall": 1}, "annotations": []}
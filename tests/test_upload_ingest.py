@@ -0,0 +1,103 @@
+"""
+Tests for streaming upload ingestion.
+"""
+
+import hashlib
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.services.upload.ingest import ingest_form, ingest_upload, sniff_image_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+app = FastAPI()
+
+
+@app.post("/upload")
+async def upload_route(request: Request):
+    upload = await ingest_upload(request, max_bytes=1024, spool_bytes=16)
+    try:
+        return {
+            "size": upload.size,
+            "sha256": upload.sha256,
+            "mime_type": upload.mime_type,
+            "rolled_to_disk": upload.file._rolled,
+            "content_ok": upload.read() == PNG,
+        }
+    finally:
+        upload.close()
+
+
+@app.post("/form")
+async def form_route(request: Request):
+    form = await ingest_form(request, max_files=2, max_bytes=1024, max_fields=3, max_text_bytes=64)
+    try:
+        return {"fields": form.fields, "files": [u.field_name for u in form.files]}
+    finally:
+        form.close()
+
+
+client = TestClient(app)
+
+
+def test_sniff_image_type():
+    assert sniff_image_type(PNG[:12]) == "image/png"
+    assert sniff_image_type(b"\xff\xd8\xff\xe0" + b"\x00" * 8) == "image/jpeg"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBP") == "image/webp"
+    assert sniff_image_type(b"%PDF-1.7....") is None
+
+
+def test_upload_is_hashed_and_spooled():
+    """The hash is computed while streaming and large parts roll to disk."""
+    response = client.post("/upload", files={"file": ("a.png", PNG, "image/png")})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["size"] == len(PNG)
+    assert body["sha256"] == hashlib.sha256(PNG).hexdigest()
+    assert body["mime_type"] == "image/png"
+    assert body["rolled_to_disk"] is True
+    assert body["content_ok"] is True
+
+
+def test_oversized_upload_is_rejected():
+    response = client.post("/upload", files={"file": ("a.png", PNG + b"\x00" * 2048, "image/png")})
+    assert response.status_code == 413
+
+
+def test_non_image_is_rejected():
+    response = client.post("/upload", files={"file": ("a.pdf", b"%PDF-1.7" + b"\x00" * 50, "application/pdf")})
+    assert response.status_code == 415
+
+
+def test_missing_file_field():
+    response = client.post("/upload", files={"other": ("a.png", PNG, "image/png")})
+    assert response.status_code == 400
+
+
+def test_form_fields_and_file_limit():
+    files = [("a", ("a.png", PNG, "image/png")), ("b", ("b.png", PNG, "image/png"))]
+    response = client.post("/form", data={"name": "Ana"}, files=files)
+    assert response.status_code == 200
+    assert response.json() == {"fields": {"name": "Ana"}, "files": ["a", "b"]}
+
+    files.append(("c", ("c.png", PNG, "image/png")))
+    assert client.post("/form", files=files).status_code == 413
+
+
+def test_text_fields_are_capped_in_number_and_total_size():
+    files = [("a", ("a.png", PNG, "image/png"))]
+
+    assert client.post("/form", data={"a": "1", "b": "2", "c": "3"}, files=files).status_code == 200
+    assert client.post("/form", data={f"f{i}": "1" for i in range(4)}, files=files).status_code == 413
+    assert client.post("/form", data={"a": "x" * 40, "b": "y" * 40}, files=files).status_code == 413
+
+
+def test_part_headers_are_capped():
+    boundary = "b0undary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"a\"\r\nX-Pad: {'x' * 10_000}\r\n\r\n1\r\n--{boundary}--\r\n"
+    ).encode()
+
+    response = client.post("/form", content=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+    assert response.status_code == 413
@@ -0,0 +1,84 @@
+"""
+Tests for the local vision providers.
+"""
+
+import json
+import pytest
+from jsonschema import validate
+from app.services.character.character_service import parse_character_response
+from app.services.vision.provider import VisionProvider, build_vision_provider
+from app.services.vision.replay_provider import RecordingProvider, ReplayProvider
+from app.services.vision.stub_provider import StubProvider
+
+with open("app/json_schemas/character.json", "r") as schema_file:
+    character_schema = json.load(schema_file)
+
+
+class _FixedProvider(VisionProvider):
+    name = "fixed"
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    async def generate(self, prompt, image, system_message=None, timeout=None):
+        self.calls += 1
+        return self.text
+
+
+@pytest.mark.asyncio
+async def test_stub_response_is_schema_valid_and_deterministic():
+    """The stub's output goes through the normal parser and matches the schema."""
+    provider = StubProvider()
+    provider.startup()
+
+    first = await provider.generate("p", b"image")
+    second = await provider.generate("p", b"image")
+
+    assert first == second
+    validate(instance=parse_character_response(first), schema=character_schema)
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay(tmp_path):
+    inner = _FixedProvider("meta={\"confidence_overall\":0.7}")
+    recorder = RecordingProvider(inner, directory=str(tmp_path))
+    recorder.startup()
+
+    recorded = await recorder.generate("prompt", b"image", system_message="sys")
+    replayed = await ReplayProvider(directory=str(tmp_path)).generate("prompt", b"image", system_message="sys")
+
+    assert replayed == recorded
+    assert inner.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_illustrations(tmp_path):
+    from fastapi import HTTPException
+
+    recorder = RecordingProvider(StubProvider(), directory=str(tmp_path))
+    recorder.startup()
+
+    recorded = await recorder.illustrate("a dinosaur picnic", 64)
+    replay = ReplayProvider(directory=str(tmp_path))
+
+    assert await replay.illustrate("a dinosaur picnic", 64) == recorded
+    assert recorded[1] == "image/png"
+    with pytest.raises(HTTPException) as exc_info:
+        await replay.illustrate("a dinosaur picnic", 128)
+    assert exc_info.value.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_replay_miss_raises(tmp_path):
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as exc_info:
+        await ReplayProvider(directory=str(tmp_path)).generate("prompt", b"image")
+
+    assert exc_info.value.status_code == 503
+
+
+def test_unknown_provider_is_rejected():
+    with pytest.raises(ValueError):
+        build_vision_provider("nope")